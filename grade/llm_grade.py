@@ -4,9 +4,15 @@ import os
 import numpy as np
 from openai import OpenAI
 import re
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from utils.keystore import auth_litellm, get_any_from_env
+from model.batch import run_batch
+from model.http_client import configure_http_clients, connections_for_workers, get_http_client
+from model.response_cache import DEFAULT_MAX_SIZE_MB, get_response_cache
+from model.retry_policy import RetryPolicy, provider_of
+from model.usage import STAGE_GRADING, get_usage_tracker, usage_scope
 import jsonlines
 import pandas as pd
 
@@ -112,21 +118,84 @@ def is_number(s):
     except ValueError:
         return False
     
-def complete(input, client):
-    max_tries = 3
-    while max_tries > 0:
+GRADER_MODEL = "openai/o1"
+GRADER_PARAMS = {"model": GRADER_MODEL, "stop": ["[ENDOFGRADE]"]}
+
+def complete(input, client, response_cache=None):
+    with usage_scope(task=input[0], stage=STAGE_GRADING):
+        return _complete(input, client, response_cache)
+
+def _complete(input, client, response_cache=None):
+    call_started = time.monotonic()
+    if response_cache is not None:
+        cached = response_cache.get(input[1], GRADER_PARAMS)
+        if cached is not None:
+            get_usage_tracker().record(GRADER_MODEL, latency=time.monotonic() - call_started, cache_hit=True)
+            return input[0], cached
+    retry_policy = RetryPolicy(
+        provider_of(GRADER_MODEL),
+        max_retries_rate_limit=10,
+        max_retries_other=3,
+        base_delay=5,
+        other_delay=0,
+        name="Grader",
+    )
+    retry_state = retry_policy.new_state()
+    while True:
+        retry_policy.cooldown.wait()
         try:
             response = client.chat.completions.create(
-                model="openai/o1",
                 messages=input[1],
-                stop=["[ENDOFGRADE]"],
+                **GRADER_PARAMS,
             )
-            return input[0], response.choices[0].message.content
+            content = response.choices[0].message.content
+            if response_cache is not None:
+                response_cache.set(input[1], GRADER_PARAMS, content)
+            get_usage_tracker().record(
+                GRADER_MODEL,
+                response=response,
+                latency=time.monotonic() - call_started,
+                retries=retry_state["rate_limit"] + retry_state["other"],
+            )
+            return input[0], content
         except Exception as e:
-            print(e)
-            error=str(e)
-            max_tries -= 1
-    return input[0], error
+            delay = retry_policy.next_delay(e, retry_state)
+            if delay is None:
+                break
+            retry_policy.sleep(delay)
+    get_usage_tracker().record(
+        GRADER_MODEL,
+        latency=time.monotonic() - call_started,
+        retries=retry_state["rate_limit"] + retry_state["other"],
+        error=retry_state["error"],
+    )
+    return input[0], str(retry_state["error"])
+
+def batch_complete(inputs, client, response_cache=None, poll_interval=30):
+    """Grade every input as one provider batch job, see model/batch.py. Grades the batch could not
+    produce are retried with ``complete``."""
+    outputs = []
+    pending = []
+    for input in inputs:
+        cached = response_cache.get(input[1], GRADER_PARAMS) if response_cache is not None else None
+        if cached is None:
+            pending.append(input)
+            continue
+        with usage_scope(task=input[0], stage=STAGE_GRADING):
+            get_usage_tracker().record(GRADER_MODEL, cache_hit=True)
+        outputs.append((input[0], cached))
+
+    if pending:
+        with usage_scope(stage=STAGE_GRADING):
+            results = run_batch(pending, GRADER_PARAMS, poll_interval=poll_interval)
+        for input, result in zip(pending, results):
+            if result["content"] is None:
+                outputs.append(complete(input, client, response_cache))
+                continue
+            if response_cache is not None:
+                response_cache.set(input[1], GRADER_PARAMS, result["content"])
+            outputs.append((input[0], result["content"]))
+    return outputs
 
 def extract_student_answer(response):
     """Extract the student answer of the form ```json\n{\"final_answer\": student_answer}\n``` from the response"""
@@ -153,8 +222,11 @@ def extract_student_answer(response):
 def grade(args):
 
     api_key, base_url = auth_litellm()
-    client = OpenAI(api_key=api_key, base_url=base_url)
+    configure_http_clients(connections_for_workers(args.num_workers))
+    client = OpenAI(api_key=api_key, base_url=base_url, http_client=get_http_client())
     data = json.load(open(args.input_file, "r"))
+    # o1 takes no temperature, so a cached grade is replayed for any identical grading request
+    response_cache = get_response_cache(args.llm_cache_path, max_size_mb=args.llm_cache_max_size_mb, any_temperature=True)
     all_prompts = []
 
     for i, entry in enumerate(data):
@@ -166,15 +238,21 @@ def grade(args):
         all_prompts.append((i, messages))
     
        
-    with tqdm(total=len(all_prompts)) as pbar:
-        with ThreadPoolExecutor(max_workers=args.num_workers) as executor:
-            futures = [executor.submit(complete, input, client) for input in all_prompts]
-            for future in as_completed(futures):
-                i, response = future.result()
-                data[i]['gpt_grader_out'] = response
-                data[i]['gpt_grader_reasoning'] = response.split('Reasoning: ')[-1].split('Final Grade: ')[0].strip()
-                data[i]['gpt_grader_grade'] = response.split('Final Grade: ')[-1].strip()
-                pbar.update(1)
+    def add_grade(i, response):
+        data[i]['gpt_grader_out'] = response
+        data[i]['gpt_grader_reasoning'] = response.split('Reasoning: ')[-1].split('Final Grade: ')[0].strip()
+        data[i]['gpt_grader_grade'] = response.split('Final Grade: ')[-1].strip()
+
+    if args.batch_mode:
+        for i, response in batch_complete(all_prompts, client, response_cache, args.batch_poll_interval):
+            add_grade(i, response)
+    else:
+        with tqdm(total=len(all_prompts)) as pbar:
+            with ThreadPoolExecutor(max_workers=args.num_workers) as executor:
+                futures = [executor.submit(complete, input, client, response_cache) for input in all_prompts]
+                for future in as_completed(futures):
+                    add_grade(*future.result())
+                    pbar.update(1)
 
     chat_data = [entry for entry in data if len(entry['tools']) == 2]
     enterprise_data = [entry for entry in data if len(entry['tools']) > 2]
@@ -212,10 +290,16 @@ def grade(args):
     with open(os.path.join(args.output_dir, 'llm_grader_metrics.json'), 'w') as f:
         json.dump({'chat': chat_metrics, 'enterprise': enterprise_metrics}, f)
 
+    get_usage_tracker().save(args.output_dir, prefix='llm_grader_')
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input_file", type=str, required=True)
     parser.add_argument("--output_dir", type=str, required=True)
     parser.add_argument("--num_workers", type=int, default=30)
+    parser.add_argument("--llm_cache_path", type=str, default=None)
+    parser.add_argument("--llm_cache_max_size_mb", type=int, default=DEFAULT_MAX_SIZE_MB)
+    parser.add_argument("--batch_mode", action="store_true", help="Grade through the provider batch API")
+    parser.add_argument("--batch_poll_interval", type=float, default=30)
     args = parser.parse_args()
     grade(args)
\ No newline at end of file
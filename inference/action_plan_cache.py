@@ -0,0 +1,100 @@
+import hashlib
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+from utils.disk_cache import DiskCache
+
+
+class ActionPlanCache:
+    """Action plans keyed by model, query, tools and historical date, shared by the native and ReAct retry loops.
+
+    A full retry reuses the plan its task already has instead of asking the model for a new one. With
+    ``regenerate_after`` set, a plan is dropped once that many executions with it have failed, so the next
+    attempt plans again. Plans are kept in memory, or in a sqlite file (see DiskCache) if ``path`` is given,
+    which lets native and ReAct runs of the same model share them.
+    """
+
+    def __init__(self, path: Optional[str] = None, regenerate_after: Optional[int] = None):
+        self.path = path
+        self.regenerate_after = regenerate_after
+        self._store = DiskCache(path) if path else None
+        self._plans: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_regenerations = 0
+
+    @staticmethod
+    def make_key(model: str, query: str, tools: List[str], historical_date: Optional[str] = None) -> str:
+        payload = json.dumps(
+            {"model": model, "query": query, "tools": tools, "historical_date": historical_date or None},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._store.get(key) if self._store is not None else self._plans.get(key)
+
+    def _write(self, key: str, entry: Dict[str, Any]):
+        if self._store is not None:
+            self._store.set(key, entry)
+        else:
+            self._plans[key] = entry
+
+    def get(self, key: str) -> Optional[str]:
+        """The plan to use for the next attempt, or None if one has to be generated."""
+        with self._lock:
+            entry = self._read(key)
+            if entry is None or entry["plan"] is None:
+                self.num_misses += 1
+                return None
+            self.num_hits += 1
+            return entry["plan"]
+
+    def set(self, key: str, plan: str):
+        with self._lock:
+            self._write(key, {"plan": plan, "failures": 0})
+
+    def record_failure(self, key: str) -> bool:
+        """Count a failed execution with the cached plan. Returns whether the plan was dropped, which happens once it
+        has failed ``regenerate_after`` times."""
+        with self._lock:
+            entry = self._read(key)
+            if entry is None or entry["plan"] is None:
+                return False
+            entry["failures"] += 1
+            dropped = self.regenerate_after is not None and entry["failures"] >= self.regenerate_after
+            if dropped:
+                entry = {"plan": None, "failures": 0}
+                self.num_regenerations += 1
+            self._write(key, entry)
+            return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.num_hits,
+                "misses": self.num_misses,
+                "regenerations": self.num_regenerations,
+                "regenerate_after": self.regenerate_after,
+            }
+
+
+_cache = ActionPlanCache()
+_cache_lock = threading.Lock()
+
+
+def configure_action_plan_cache(path: Optional[str] = None, regenerate_after: Optional[int] = None) -> ActionPlanCache:
+    """Replace the process-wide plan cache; call once at startup, before any task runs."""
+    global _cache
+    with _cache_lock:
+        _cache = ActionPlanCache(path, regenerate_after=regenerate_after)
+        return _cache
+
+
+def get_action_plan_cache() -> ActionPlanCache:
+    with _cache_lock:
+        return _cache
@@ -1,10 +1,11 @@
 from collections import deque
-from typing import Type, List
+from typing import List, Tuple, Type
 from tree.react_tree import (ReActStep, ReActNode, ReActTreeManager, get_observation_step)
 from prompts.action_plan import get_prompt as get_action_plan_prompt
-from prompts.react import get_prompt as get_react_prompt
+from prompts.react import get_multi_turn_prompt, get_prompt as get_react_prompt, get_step_turns
 from tree.react_tree import ReActTreeManager
 from model.models import GenerationWrapper
+from model.usage import STAGE_ACTION_PLAN, usage_scope
 
 
 def pre_process(task_batch: List[dict]):
@@ -20,6 +21,8 @@ def pre_process(task_batch: List[dict]):
         query = task["prompt"]
         tool = task["tools"]
         manager = ReActTreeManager(query, tool)
+        # generation continues from the last step of the history, if any
+        last_node = manager.root
         if 'history' in task:
             history = task["history"]
             for node in history:
@@ -32,8 +35,9 @@ def pre_process(task_batch: List[dict]):
                     observation, _ = get_observation_step(action, action_input)
                 new_node=ReActNode(thought, action, action_input, observation)
                 new_node.mgr=manager
-                manager.roots[-1].add_child(new_node)
-                manager.roots.append(new_node)
+                new_node.journal_id=node.get("journal_id")
+                last_node.add_child(new_node)
+                last_node=new_node
 
         if 'action_plan' in task:
             if task['action_plan']:
@@ -42,6 +46,7 @@ def pre_process(task_batch: List[dict]):
             tree_list.append(manager)
         else:
             tree_list.append(manager)
+        queue.append(last_node)
 
         for k,v in task.items():
             if k not in ["prompt", "tools", "history", "action_plan", "ground_truth"]:
@@ -49,37 +54,98 @@ def pre_process(task_batch: List[dict]):
 
         if "answer" in task:
             manager.ground_truth=task["answer"]
-            
-    for tree in tree_list:
-        queue.append(tree.root)
-        
+
     return queue, tree_list
 
-def generate_action_plan(tree_list: Type[ReActTreeManager], model: Type[GenerationWrapper]):
+def get_action_plan_prompts(tree_list: List[ReActTreeManager]):
     """
-    Generates an action plan for each tree in the batch.
+    Retrieve the action plan prompt for each tree in the batch.
 
     Args:
         tree_list: List of ReActTreeManager objects.
-        model: Model to generate the action plan.
     """
     batch = tree_list
     queries = [tree.query for tree in batch]
     tools = [tree.tools_available for tree in batch]
     hist_dates=[tree.metadata['historical_date'].replace('\\','') if ('historical_data' in tree.metadata and tree.metadata['historical_date']) else None for tree in batch]
-    prompts = [get_action_plan_prompt(query, tool, hist_date) for query, tool, hist_date in zip(queries, tools, hist_dates)]
-    action_plans = [model.generate(prompt)[0] for prompt in prompts]
-    for i, tree in enumerate(batch):
-        tree.add_action_plan(action_plans[i])
+    return [get_action_plan_prompt(query, tool, hist_date) for query, tool, hist_date in zip(queries, tools, hist_dates)]
+
+def generate_plan(model: Type[GenerationWrapper], prompt) -> Tuple[str, bool]:
+    """
+    Generate one action plan. Returns the plan and whether it was generated: a call that failed gives its error
+    text instead, which the attempt at hand still runs with but which must not go into the ActionPlanCache.
+
+    Args:
+        model: Model to generate the action plan.
+        prompt: Action plan prompt.
+    """
+    try:
+        return model.generate(prompt, raise_errors=True)[0], True
+    except Exception as e:
+        print(f"Error in action plan generation: {e}")
+        return str(e), False
+
+async def agenerate_plan(model: Type[GenerationWrapper], prompt) -> Tuple[str, bool]:
+    """asyncio counterpart of ``generate_plan``."""
+    try:
+        return (await model.agenerate(prompt, raise_errors=True))[0], True
+    except Exception as e:
+        print(f"Error in action plan generation: {e}")
+        return str(e), False
+
+def generate_action_plan(tree_list: Type[ReActTreeManager], model: Type[GenerationWrapper]) -> List[bool]:
+    """
+    Generates an action plan for each tree in the batch. Returns whether each plan was generated, see generate_plan.
+
+    Args:
+        tree_list: List of ReActTreeManager objects.
+        model: Model to generate the action plan.
+    """
+    batch = tree_list
+    prompts = get_action_plan_prompts(batch)
+    with usage_scope(stage=STAGE_ACTION_PLAN):
+        results = [generate_plan(model, prompt) for prompt in prompts]
+    for tree, (action_plan, _) in zip(batch, results):
+        tree.add_action_plan(action_plan)
+    return [generated for _, generated in results]
+
+REACT_PROMPT_MODES = ["history", "multi_turn"]
 
-def get_react_prompts(nodes: List[ReActNode]):
+def get_react_messages(node: ReActNode):
+    """
+    Retrieve the multi-turn prompt for the step after ``node``. Each node keeps only its own two turns (the
+    pseudo-root keeps the opening messages), so a step is rendered once and the prompt is assembled per call.
+
+    Args:
+        node: ReActNode to continue from.
+    """
+    chain = []
+    curr = node
+    while not curr.is_pseudo_root:
+        if curr.messages is None:
+            curr.messages = get_step_turns(curr)
+        chain.append(curr)
+        curr = curr.parent
+    if curr.messages is None:
+        action_plan = curr.mgr.action_plan if curr.mgr.revised_action_plan is None else curr.mgr.revised_action_plan
+        curr.messages = get_multi_turn_prompt(curr.mgr.query, curr.mgr.tools_available, action_plan)
+    messages = list(curr.messages)
+    for step in reversed(chain):
+        messages.extend(step.messages)
+    return messages
+
+def get_react_prompts(nodes: List[ReActNode], prompt_mode: str = "history"):
     """
     Retreive the model prompts to get ReAct style generation.
 
     Args:
         nodes: List of ReActNode objects.
+        prompt_mode: "history" renders past steps into one History string, "multi_turn" gives each past step its own turns.
     """
 
+    if prompt_mode == "multi_turn":
+        return [get_react_messages(node) for node in nodes]
+
     prompts = []
     for node in nodes:
         action_plan = node.mgr.action_plan if node.mgr.revised_action_plan is None else node.mgr.revised_action_plan
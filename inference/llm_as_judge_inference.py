@@ -12,11 +12,18 @@ from tqdm import tqdm
 import traceback
 import litellm
 from utils.keystore import auth_litellm
+from model.batch import run_batch
+from model.http_client import configure_http_clients, connections_for_workers
+from model.response_cache import DEFAULT_MAX_SIZE_MB, LLMResponseCache, get_response_cache
+from model.retry_policy import RetryPolicy, provider_of
+from model.usage import STAGE_JUDGING, get_usage_tracker, usage_scope
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 import random
 
-from prompts.llm_as_judge import get_pairwise_judge_react_prompt
+from model.prompt_caching import supports_cache_control, text_blocks
+from model.responses_api import build_request
+from prompts.llm_as_judge import get_pairwise_judge_react_prompt, split_static_prefix
 
 
 def _safe_json_loads(line: str) -> Dict[str, Any]:
@@ -97,6 +104,14 @@ def _score_pair(l1: str, l2: str) -> Tuple[float, str]:
     return 0.5, "tie"
 
 
+def _normalize_history(entry: Dict[str, Any]) -> None:
+    # Normalize fields expected by the prompt builder
+    if "history" not in entry or entry["history"] is None:
+        entry["history"] = ""
+    elif isinstance(entry["history"], (list, dict)):
+        entry["history"] = json.dumps(entry["history"], ensure_ascii=False)
+
+
 def _history_is_empty(entry: Dict[str, Any]) -> bool:
     hist = json.loads(entry.get("history"))
     if hist is None:
@@ -133,6 +148,10 @@ def run_inference(
     max_samples: int = None,
     max_workers: int = 8,
     sampling_config: Dict[str, Any] = None,
+    response_cache: LLMResponseCache = None,
+    prompt_caching: bool = False,
+    batch_mode: bool = False,
+    batch_poll_interval: float = 30,
 ) -> Dict[str, Any]:
     data = load_dataset(dataset_path, limit=max_samples)
 
@@ -149,17 +168,49 @@ def run_inference(
     react_count = 0
 
     # Configure API client once for all threads
+    configure_http_clients(connections_for_workers(max_workers))
     api_key, api_base = auth_litellm()
     litellm.api_base = api_base
     litellm.api_key = api_key
 
+    # OpenAI caches the shared preamble automatically, Anthropic needs it marked
+    mark_static_prefix = prompt_caching and supports_cache_control(sampling_config["model"])
+
+    def judge_messages(prompt: str) -> List[Dict[str, Any]]:
+        static, dynamic = split_static_prefix(prompt)
+        if mark_static_prefix and static:
+            return [{"role": "user", "content": text_blocks(static, dynamic)}]
+        return [{"role": "user", "content": prompt}]
+
+    # judgements answered by a batch job up front, by prompt; see model/batch.py
+    batched: Dict[str, str] = {}
+    if batch_mode:
+        pending: Dict[str, int] = {}
+        for i, entry in enumerate(data):
+            _normalize_history(entry)
+            try:
+                prompts = get_pairwise_judge_react_prompt(entry)
+            except Exception:
+                # process_one logs the failure
+                continue
+            for prompt in prompts:
+                if response_cache is None or response_cache.get(judge_messages(prompt), sampling_config) is None:
+                    pending.setdefault(prompt, i)
+        with usage_scope(stage=STAGE_JUDGING):
+            results = run_batch(
+                [(i, judge_messages(prompt)) for prompt, i in pending.items()],
+                sampling_config,
+                poll_interval=batch_poll_interval,
+            )
+        for prompt, result in zip(pending, results):
+            if result["content"] is not None:
+                batched[prompt] = result["content"]
+                if response_cache is not None:
+                    response_cache.set(judge_messages(prompt), sampling_config, result["content"])
+
     def process_one(i: int, entry: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            # Normalize fields expected by the prompt builder
-            if "history" not in entry or entry["history"] is None:
-                entry["history"] = ""
-            elif isinstance(entry["history"], (list, dict)):
-                entry["history"] = json.dumps(entry["history"], ensure_ascii=False)
+            _normalize_history(entry)
 
             try:
                 preferred_first, dispreferred_first = get_pairwise_judge_react_prompt(entry)
@@ -173,45 +224,59 @@ def run_inference(
                     },
                 }
 
-            max_retries = 10
-            base_delay = 10
-            retry_count_rate_limit = 0
-
-            
-            use_responses_api = "o3" or "o1" in sampling_config["model"]
-            for i in range(max_retries):
-                try:
-                    if use_responses_api:
-                        # use responses api
-                        # handle dict fields in sampling_config
-                        out1 = litellm.responses(
-                            input=preferred_first,
-                            **sampling_config,
+            retry_policy = RetryPolicy(
+                provider_of(sampling_config["model"]),
+                max_retries_rate_limit=10,
+                max_retries_other=10,
+                base_delay=10,
+                other_delay=10,
+                name="Judge",
+            )
+            retry_state = retry_policy.new_state()
+
+            def request(prompt: str) -> str:
+                if prompt in batched:
+                    # already recorded in the usage log by run_batch
+                    return batched[prompt]
+                call_started = time.monotonic()
+                messages = judge_messages(prompt)
+                if response_cache is not None:
+                    cached = response_cache.get(messages, sampling_config)
+                    if cached is not None:
+                        get_usage_tracker().record(
+                            sampling_config["model"], latency=time.monotonic() - call_started, cache_hit=True
                         )
-                        out2 = litellm.responses(
-                            input=dispreferred_first,
-                            **sampling_config
-                        )
-                        break
-                    else:
-                        out1 = litellm.completion(
-                            messages=[{"role": "user", "content": preferred_first}],
-                            **sampling_config,
-                            thinking=sampling_config.get("thinking", None),
-                            
-                        )
-                        out2 = litellm.completion(
-                            messages=[{"role": "user", "content": dispreferred_first}],
-                            **sampling_config,
-                            thinking=sampling_config.get("thinking", None),
+                        return cached
+                api, kwargs = build_request(messages, sampling_config)
+                out = getattr(litellm, api)(**kwargs)
+                if api == "responses":
+                    text = out.output[-1].content[0].text
+                else:
+                    text = out.choices[0].message.content
+                if response_cache is not None:
+                    response_cache.set(messages, sampling_config, text)
+                get_usage_tracker().record(
+                    sampling_config["model"],
+                    response=out,
+                    latency=time.monotonic() - call_started,
+                    retries=retry_state["rate_limit"] + retry_state["other"],
+                )
+                return text
+
+            while True:
+                retry_policy.cooldown.wait()
+                try:
+                    pred1_raw = request(preferred_first)
+                    pred2_raw = request(dispreferred_first)
+                    break
+                except Exception as e:
+                    delay = retry_policy.next_delay(e, retry_state)
+                    if delay is None:
+                        get_usage_tracker().record(
+                            sampling_config["model"],
+                            retries=retry_state["rate_limit"] + retry_state["other"],
+                            error=e,
                         )
-                        break
-                except Exception:
-                    # exponential backoff
-                    delay = base_delay * (2 ** (retry_count_rate_limit - 1))  # exponential increase
-                    delay = delay * (0.5 + random.random())  # add jitter (50-150% of delay)
-                    retry_count_rate_limit += 1
-                    if i == max_retries - 1:
                         return {
                             "valid": False,
                             "log": {
@@ -220,14 +285,7 @@ def run_inference(
                                 "entry_keys": list(entry.keys()),
                             },
                         }
-                    time.sleep(delay)
-
-            if use_responses_api:
-                pred1_raw = out1.output[-1].content[0].text
-                pred2_raw = out2.output[-1].content[0].text
-            else:
-                pred1_raw = out1.choices[0].message.content
-                pred2_raw = out2.choices[0].message.content
+                    retry_policy.sleep(delay)
 
             print(pred1_raw)
             print(pred2_raw)
@@ -264,8 +322,12 @@ def run_inference(
                 },
             }
 
+    def process_one_scoped(i: int, entry: Dict[str, Any]) -> Dict[str, Any]:
+        with usage_scope(task=i, stage=STAGE_JUDGING):
+            return process_one(i, entry)
+
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(process_one, i, entry) for i, entry in enumerate(data)]
+        futures = [executor.submit(process_one_scoped, i, entry) for i, entry in enumerate(data)]
         for fut in tqdm(as_completed(futures), total=len(futures), desc="Processing samples"):
             res = fut.result()
             log_f.write(json.dumps(res["log"], ensure_ascii=False) + "\n")
@@ -287,6 +349,8 @@ def run_inference(
 
     log_f.close()
 
+    usage = get_usage_tracker().summary()["run"]
+
     def ratio(s: float, n: int) -> float:
         return (s / n) if n > 0 else 0.0
 
@@ -298,6 +362,7 @@ def run_inference(
         "react_steps_accuracy": ratio(react_score, react_count),
         "react_steps_count": react_count,
         "log_path": out_log_path,
+        "usage": usage,
     }
 
 
@@ -318,6 +383,12 @@ def main():
     parser.add_argument("--out", type=str, default=None, help="Output log path (jsonl). If omitted, auto-generated.")
     parser.add_argument("--limit", type=int, default=None, help="Limit the number of samples")
     parser.add_argument("--max_workers", type=int, default=8, help="Number of concurrent worker threads")
+    parser.add_argument("--prompt_caching", action="store_true", help="Mark the shared judge preamble for provider prompt caching")
+    parser.add_argument("--llm_cache_path", type=str, default=None, help="Persistent judge response cache (sqlite). Disabled if omitted.")
+    parser.add_argument("--llm_cache_max_size_mb", type=int, default=DEFAULT_MAX_SIZE_MB, help="Size budget of the response cache")
+    parser.add_argument("--llm_cache_any_temperature", action="store_true", help="Also cache judgements sampled with temperature > 0")
+    parser.add_argument("--batch_mode", action="store_true", help="Submit all judgements as one provider batch job before scoring")
+    parser.add_argument("--batch_poll_interval", type=float, default=30, help="Seconds between batch job status checks")
 
     args = parser.parse_args()
 
@@ -342,7 +413,15 @@ def main():
         out_log_path=out_log_path,
         max_samples=args.limit,
         max_workers=args.max_workers,
-        sampling_config=sampling_config
+        sampling_config=sampling_config,
+        response_cache=get_response_cache(
+            args.llm_cache_path,
+            max_size_mb=args.llm_cache_max_size_mb,
+            any_temperature=args.llm_cache_any_temperature,
+        ),
+        prompt_caching=args.prompt_caching,
+        batch_mode=args.batch_mode,
+        batch_poll_interval=args.batch_poll_interval,
     )
 
     # Print concise metrics
@@ -350,6 +429,7 @@ def main():
     # save metrics to a json file
     with open(os.path.join(args.out, "metrics.json"), "w") as f:
         json.dump(results, f)
+    get_usage_tracker().save(args.out)
 
 
 if __name__ == "__main__":
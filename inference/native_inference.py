@@ -1,50 +1,147 @@
 from prompts.action_plan import get_prompt as get_action_plan_prompt
 from prompts.native import get_prompt as get_func_calling_prompt
 import json
+from inference.action_plan_cache import get_action_plan_cache
+from inference.inference_utils import agenerate_plan, generate_plan
+from model.usage import STAGE_ACTION_PLAN, STAGE_NATIVE_TURN, usage_scope
+from utils.journal import get_journal
+
+
+def journal_attempt(query, action_plan, function_calling_prompts, recovered=None):
+    """
+    Log a new attempt at a task to the run journal, or continue the one recovered from it.
+
+    Returns the prompt to generate from, followed by the recovered tool turns if any, and the ``on_turn``
+    callback that logs each new turn (None when journaling is off).
+    """
+    journal = get_journal()
+    if journal is None:
+        return function_calling_prompts, None
+    if recovered is not None:
+        plan_id = recovered["plan_id"]
+        prompt = function_calling_prompts + recovered["messages"]
+    else:
+        plan_id = journal.log_plan(query, "native", action_plan)
+        prompt = function_calling_prompts
+
+    def on_turn(start, messages):
+        # offsets count from the end of the prompt, so recovered turns keep theirs
+        journal.log_turn(query, plan_id, start - len(function_calling_prompts), messages)
+
+    return prompt, on_turn
+
+def _start_task(input_data, policy_model, action_plan=None):
+    """
+    The task, its action plan cache and key, and the attempt recovered from the run journal if any. A plan made
+    ahead of time (e.g. by a batch job) or by the recovered attempt goes into the cache, so the first attempt uses it.
+    """
+    plan_cache = get_action_plan_cache()
+    task = input_data[0]
+    plan_key = plan_cache.make_key(policy_model.model, task['prompt'], task['tools'], task['historical_date'])
+    if action_plan is not None:
+        plan_cache.set(plan_key, action_plan)
+    journal = get_journal()
+    recovered = journal.recover(task['prompt'], "native") if journal is not None else None
+    if recovered is not None:
+        # continue the attempt an earlier run was killed in, after its last completed tool turn
+        plan_cache.set(plan_key, recovered["action_plan"])
+    return task, plan_cache, plan_key, recovered
+
+def _start_attempt(task, action_plan, apply_chat_template, recovered=None):
+    """Record the attempt's plan on the task and return its function calling prompt and ``on_turn``, see journal_attempt."""
+    task.update({'action_plan': action_plan})
+    function_calling_prompts = get_func_calling_prompt(
+        task['prompt'],
+        task['tools'],
+        action_plan,
+        task['historical_date'],
+        apply_chat_template
+    )
+    return journal_attempt(task['prompt'], action_plan, function_calling_prompts, recovered)
+
+def _found_final_answer(generation):
+    return bool(generation) and '{"final_answer":' in generation
 
 def generate(
     input_data,
     policy_model,
     num_full_retries,
     index,
-    apply_chat_template
+    apply_chat_template,
+    action_plan=None
+):
+
+    task, plan_cache, plan_key, recovered = _start_task(input_data, policy_model, action_plan)
+
+    for _ in range(num_full_retries):
+        # a retry keeps the plan unless it has failed too often, see ActionPlanCache
+        action_plan = plan_cache.get(plan_key)
+        if action_plan is None:
+            action_plan_prompts = get_action_plan_prompt(task['prompt'], task['tools'], task['historical_date'], apply_chat_template)
+            with usage_scope(task=index, stage=STAGE_ACTION_PLAN):
+                action_plan, generated = generate_plan(policy_model, action_plan_prompts)
+            # a plan call that failed gives its error text, which is used for this attempt only
+            if generated:
+                plan_cache.set(plan_key, action_plan)
+
+        function_calling_prompts, on_turn = _start_attempt(task, action_plan, apply_chat_template, recovered)
+        recovered = None
+
+        with usage_scope(task=index, stage=STAGE_NATIVE_TURN):
+            function_calling_generations, full_message_history = policy_model.generate(
+                function_calling_prompts,
+                task['tools'],
+                task['historical_date'],
+                on_turn=on_turn,
+            )
+
+        if _found_final_answer(function_calling_generations):
+            break
+        plan_cache.record_failure(plan_key)
+
+    task.update({'policy_answer': function_calling_generations, 'full_message_history': full_message_history})
+
+    return task, index
+
+
+async def agenerate(
+    input_data,
+    policy_model,
+    num_full_retries,
+    index,
+    apply_chat_template,
+    action_plan=None
 ):
+    """asyncio counterpart of ``generate`` for wrappers that implement ``agenerate``."""
+
+    task, plan_cache, plan_key, recovered = _start_task(input_data, policy_model, action_plan)
+
+    for _ in range(num_full_retries):
+        # a retry keeps the plan unless it has failed too often, see ActionPlanCache
+        action_plan = plan_cache.get(plan_key)
+        if action_plan is None:
+            action_plan_prompts = get_action_plan_prompt(task['prompt'], task['tools'], task['historical_date'], apply_chat_template)
+            with usage_scope(task=index, stage=STAGE_ACTION_PLAN):
+                action_plan, generated = await agenerate_plan(policy_model, action_plan_prompts)
+            # a plan call that failed gives its error text, which is used for this attempt only
+            if generated:
+                plan_cache.set(plan_key, action_plan)
+
+        function_calling_prompts, on_turn = _start_attempt(task, action_plan, apply_chat_template, recovered)
+        recovered = None
+
+        with usage_scope(task=index, stage=STAGE_NATIVE_TURN):
+            function_calling_generations, full_message_history = await policy_model.agenerate(
+                function_calling_prompts,
+                task['tools'],
+                task['historical_date'],
+                on_turn=on_turn,
+            )
+
+        if _found_final_answer(function_calling_generations):
+            break
+        plan_cache.record_failure(plan_key)
+
+    task.update({'policy_answer': function_calling_generations, 'full_message_history': full_message_history})
 
-    full_retries=0
-    
-    while full_retries < num_full_retries:
-        task_batch = input_data[0]
-       
-        action_plan_prompts=get_action_plan_prompt(
-            task_batch['prompt'], 
-            task_batch['tools'], 
-            task_batch['historical_date'], 
-            apply_chat_template
-        )
-            
-        action_plan_generations, _ = policy_model.generate(action_plan_prompts)
-        task_batch.update({'action_plan': action_plan_generations})
-        
-        function_calling_prompts=get_func_calling_prompt(
-            task_batch['prompt'],
-            task_batch['tools'], 
-            task_batch['action_plan'], 
-            task_batch['historical_date'], 
-            apply_chat_template
-        )
-        
-        function_calling_generations, full_message_history = policy_model.generate(
-            function_calling_prompts, 
-            task_batch['tools'], 
-            task_batch['historical_date']
-        )
-        
-        if function_calling_generations:
-            if '{"final_answer":' in function_calling_generations:
-                break
-        
-        full_retries+=1
-
-    task_batch.update({'policy_answer': function_calling_generations, 'full_message_history': full_message_history})
-
-    return task_batch, index
+    return task, index
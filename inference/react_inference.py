@@ -1,10 +1,48 @@
+import threading
 from collections import deque
-from typing import List, Optional, Type
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Type
+from inference.action_plan_cache import get_action_plan_cache
 from inference.inference_utils import generate_action_plan, get_react_prompts, pre_process
-from tree.react_tree import ReActNode, process_policy_output
+from tree.react_tree import ReActNode, ReActTreeManager, process_policy_output
+from tree.react_stream import ReActStreamParser
 from model.models import GenerationWrapper
+from model.usage import STAGE_REACT_STEP, usage_scope
+from utils.journal import get_journal
 
-def post_process(prompts: List[str], generations: List[str], curr_nodes: List[ReActNode], num_retries: int, max_depth: int, propogate_final_answer_found: bool = False):
+def run_step(generation: str, node: ReActNode, tool_results=None):
+    """
+    Parse ``generation`` as the step after ``node`` and run its tool, without adding it to the tree. Returns the new
+    node and whether it found the final answer.
+
+    Raises:
+        Exception: If the generation is not a valid step.
+    """
+    historical_date = None
+    if 'historical_date' in node.mgr.metadata and node.mgr.metadata['historical_date']:
+        historical_date = node.mgr.metadata['historical_date'].replace('\\','')
+    return process_policy_output(generation, historical_date, tool_results)
+
+def attach_step(prompt: str, node: ReActNode, react_node: ReActNode, found_answer: bool, num_retries: int, max_depth: int, propogate_final_answer_found: bool = False) -> List[ReActNode]:
+    """
+    Add a step made by run_step as a child of ``node``. Returns it if it is to be generated from, see post_process.
+    """
+    react_node.add_metadata("prompt", prompt)
+    node.add_child(react_node)
+    journal = get_journal()
+    if journal is not None:
+        journal.log_step(react_node)
+
+    if found_answer:
+        if propogate_final_answer_found:
+            return [react_node]
+        react_node.mgr.policy_final_answer = react_node.observation.value
+        return []
+    if react_node.num_retries >= num_retries or react_node.depth >= max_depth:
+        return []
+    return [react_node]
+
+def post_process(prompts: List[str], generations: List[str], curr_nodes: List[ReActNode], num_retries: int, max_depth: int, propogate_final_answer_found: bool = False, tool_results=None):
     """
     Post processes the output of the model.
 
@@ -15,33 +53,23 @@ def post_process(prompts: List[str], generations: List[str], curr_nodes: List[Re
         num_retries: Number of retries for each node.
         max_depth: Maximum depth of the chain.
         propogate_final_answer_found: Whether to propogate the final answer found in the chain. This is to allow policy model to generate a final answer step and judge model to still judge the final answer step.
+        tool_results: Optional ToolResultCache shared by the nodes, so identical actions run their tool once.
     """
 
     add_to_queue = []
-    for i, generation in enumerate(generations):
-
+    for prompt, generation, node in zip(prompts, generations, curr_nodes):
         try:
-            historical_date = None
-            if 'historical_date' in curr_nodes[i].mgr.metadata and  curr_nodes[i].mgr.metadata['historical_date']:
-                historical_date = curr_nodes[i].mgr.metadata['historical_date'].replace('\\','')
-            react_node, found_answer = process_policy_output('Thought:'+generation.strip('Thought:').strip('End Action').strip() +'\nEnd Action', historical_date)
-            react_node.add_metadata("prompt", prompts[i])
-            curr_nodes[i].add_child(react_node)
+            react_node, found_answer = run_step(generation, node, tool_results)
         except Exception as e:
-            curr_nodes[i].update_errors(str(e))
-            found_answer = False
-            react_node = curr_nodes[i]
-
-        if not (found_answer or react_node.num_retries >= num_retries or react_node.depth >= max_depth):
-            add_to_queue.append(react_node)
-        if propogate_final_answer_found and found_answer:
-            add_to_queue.append(react_node)
-        if not propogate_final_answer_found and found_answer:
-            react_node.mgr.policy_final_answer = react_node.observation.value
+            node.update_errors(str(e))
+            if not (node.num_retries >= num_retries or node.depth >= max_depth):
+                add_to_queue.append(node)
+            continue
+        add_to_queue.extend(attach_step(prompt, node, react_node, found_answer, num_retries, max_depth, propogate_final_answer_found))
 
     return add_to_queue
 
-def _generate(nodes: Type[ReActNode], model: Type[GenerationWrapper], num_retries: int, max_depth: int, propogate_final_answer_found: bool = False):
+def _generate(nodes: Type[ReActNode], model: Type[GenerationWrapper], num_retries: int, max_depth: int, propogate_final_answer_found: bool = False, prompt_mode: str = "history", num_samples: int = 1, branch_depth: Optional[int] = None, stream: bool = False):
     """
     Generates the next nodes in the chain given the current nodes and the model.
 
@@ -52,13 +80,186 @@ def _generate(nodes: Type[ReActNode], model: Type[GenerationWrapper], num_retrie
         max_depth: Maximum depth of the chain.
         propogate_final_answer_found: Whether to propogate the final answer found in the chain. 
             This is to allow policy model to generate a final answer step and judge model to still judge the final answer step.
+        prompt_mode: ReAct prompt layout, see get_react_prompts.
+        num_samples: Number of children to sample for each node, all from one request where the provider supports it.
+        branch_depth: Only nodes above this depth get num_samples children, deeper nodes get one. None branches at every depth.
+        stream: Stream each step and stop reading once its Action Input is complete, see ReActStreamParser.
+            A node's tool call then runs while the next node's step is still streaming. Ignored when sampling several children.
     """
 
-    prompts = get_react_prompts(nodes)
-    generations = [model.generate(prompt)[0] for prompt in prompts]
-    next_nodes = post_process(prompts, generations, nodes, num_retries, max_depth, propogate_final_answer_found=propogate_final_answer_found)
-    
-    return next_nodes
+    prompts = get_react_prompts(nodes, prompt_mode)
+    if num_samples == 1 and stream:
+        with usage_scope(stage=STAGE_REACT_STEP), ThreadPoolExecutor(max_workers=len(nodes)) as executor:
+            futures = []
+            for prompt, node in zip(prompts, nodes):
+                generation = model.generate_stream(prompt, ReActStreamParser)[0]
+                futures.append(executor.submit(post_process, [prompt], [generation], [node], num_retries, max_depth, propogate_final_answer_found))
+            return [next_node for future in futures for next_node in future.result()]
+
+    if num_samples == 1:
+        with usage_scope(stage=STAGE_REACT_STEP):
+            generations = [model.generate(prompt)[0] for prompt in prompts]
+        next_nodes = post_process(prompts, generations, nodes, num_retries, max_depth, propogate_final_answer_found=propogate_final_answer_found)
+        return next_nodes
+
+    num_children = [len(node.children) for node in nodes]
+    sampled_prompts, sampled_nodes, generations = [], [], []
+    with usage_scope(stage=STAGE_REACT_STEP):
+        for node, prompt in zip(nodes, prompts):
+            n = num_samples if branch_depth is None or node.depth < branch_depth else 1
+            samples = model.generate_n(prompt, n)
+            sampled_prompts.extend([prompt] * len(samples))
+            sampled_nodes.extend([node] * len(samples))
+            generations.extend(samples)
+    next_nodes = post_process(sampled_prompts, generations, sampled_nodes, num_retries, max_depth, propogate_final_answer_found=propogate_final_answer_found)
+
+    return dedupe_sampled_next_nodes(nodes, num_children, next_nodes)
+
+def dedupe_sampled_next_nodes(nodes: List[ReActNode], num_children: List[int], next_nodes: List[ReActNode]):
+    """
+    A failed sample queues its parent again. Only retry parents where every sample failed, and only once.
+
+    Args:
+        nodes: Nodes that were expanded.
+        num_children: Number of children each node had before it was expanded.
+        next_nodes: Nodes returned by post_process for all samples.
+    """
+    expanded = {id(node) for node, before in zip(nodes, num_children) if len(node.children) > before}
+    queued, unique_next_nodes = set(), []
+    for node in next_nodes:
+        if id(node) in expanded or id(node) in queued:
+            continue
+        queued.add(id(node))
+        unique_next_nodes.append(node)
+    return unique_next_nodes
+
+def find_resume_node(tree: ReActTreeManager, max_depth: int) -> Optional[ReActNode]:
+    """
+    The node a chain that ended without a final answer should continue from, or None if it has to start over.
+
+    Such a chain stopped at its deepest node, whose next step kept failing until it ran out of retries. That node's
+    own step was valid, so the chain resumes from it with a fresh retry budget. If it was already resumed once and
+    still got no further, it is pruned and the chain backs off to its parent. Chains that reached max_depth, or that
+    never produced a first step, have nothing to resume from.
+
+    Args:
+        tree: Tree of the chain that ended.
+        max_depth: Maximum depth of the chain.
+    """
+    stuck = None
+    stack = [tree.root]
+    while stack:
+        node = stack.pop()
+        children = [child for child in node.children if not child.pruned]
+        if children:
+            stack.extend(reversed(children))
+        elif not node.is_pseudo_root and not node.answer_found and node.depth < max_depth:
+            if stuck is None or node.depth > stuck.depth:
+                stuck = node
+    if stuck is None:
+        return None
+    if stuck.resumed:
+        stuck.prune(f"no valid next step after being resumed, {stuck.num_retries} retries")
+        journal = get_journal()
+        if journal is not None:
+            journal.log_prune(stuck)
+        stuck = stuck.parent
+    stuck.resumed = True
+    stuck.num_retries = 0
+    return stuck
+
+
+def recover_task(task: dict) -> Tuple[dict, Optional[Dict[str, Any]]]:
+    """
+    The task to start from, and the attempt at it recovered from the run journal if an earlier run was killed
+    during one. The returned task then carries the attempt's steps as its history, so pre_process rebuilds them
+    and generation continues from the last one.
+
+    Args:
+        task: Task to generate tool calls for.
+    """
+    journal = get_journal()
+    recovered = journal.recover(task['prompt'], "react") if journal is not None else None
+    if recovered is None:
+        return task, None
+    return {**task, "history": recovered["history"]}, recovered
+
+
+def journal_attempt(tree: ReActTreeManager, recovered: Optional[Dict[str, Any]] = None):
+    """
+    Log a new attempt at a tree to the run journal, so post_process can log its steps under it.
+
+    Args:
+        tree: Tree of the attempt, with its action plan set.
+        recovered: The journaled attempt the tree was rebuilt from, see recover_task. It is continued, not logged again.
+    """
+    journal = get_journal()
+    if journal is None:
+        return
+    if recovered is not None:
+        tree.root.journal_id = recovered["plan_id"]
+    else:
+        tree.root.journal_id = journal.log_plan(tree.query, "react", tree.action_plan)
+
+
+def count_generations(tree: ReActTreeManager) -> int:
+    """Number of ReAct steps generated for a tree, successful or not; each sample of a multi-sample request counts."""
+    generations = 0
+    stack = [tree.root]
+    while stack:
+        node = stack.pop()
+        generations += len(node.errors) + (not node.is_pseudo_root)
+        stack.extend(node.children)
+    return generations
+
+
+_chain_attempts_lock = threading.Lock()
+_chain_attempts: Dict[Any, Dict[str, Any]] = {}
+
+
+def record_chain_attempts(index: Any, attempts: List[Tuple[ReActTreeManager, bool]], num_resumed: int):
+    """
+    Record how a task's chain was retried and how many generations did not end up in the answer.
+
+    Args:
+        index: Global index of the task.
+        attempts: Every tree generated for the task, in order, with whether its action plan was generated for it
+            rather than reused.
+        num_resumed: Number of times a failed chain was resumed instead of started over.
+    """
+    tree, _ = attempts[-1]
+    useful = 0
+    if tree.policy_final_answer is not None:
+        answers = [leaf for leaf in tree.root.iter_leaves() if leaf.answer_found]
+        if tree.best_leaf is not None and tree.best_leaf.answer_found:
+            answers = [tree.best_leaf]
+        # the answering chain may reuse a plan generated for an earlier attempt
+        plan_generated = any(planned and other.action_plan == tree.action_plan for other, planned in attempts)
+        useful = len(answers[0]._get_chain()) + plan_generated if answers else 0
+    generations = sum(count_generations(tree) + planned for tree, planned in attempts)
+    with _chain_attempts_lock:
+        _chain_attempts[index] = {
+            "answered": tree.policy_final_answer is not None,
+            "chain_runs": len(attempts) + num_resumed,
+            "resumed": num_resumed,
+            "restarted": len(attempts) - 1,
+            "generations": generations,
+            "wasted_generations": generations - useful,
+        }
+
+
+def get_retry_report() -> Dict[str, Any]:
+    """Totals over every task recorded by record_chain_attempts, plus the per-task records."""
+    with _chain_attempts_lock:
+        per_task = dict(_chain_attempts)
+    if not per_task:
+        return {}
+    run = {"tasks": len(per_task)}
+    for counter in ["answered", "chain_runs", "resumed", "restarted", "generations", "wasted_generations"]:
+        run[counter] = sum(task[counter] for task in per_task.values())
+    run["wasted_fraction"] = round(run["wasted_generations"] / run["generations"], 4) if run["generations"] else 0.0
+    return {"run": run, "per_task": {str(index): task for index, task in per_task.items()}}
+
 
 def generate(
     input_data: List[dict],
@@ -66,7 +267,12 @@ def generate(
     num_retries: int,
     num_full_retries: int,
     max_depth: int,
-    index: int
+    index: int,
+    prompt_mode: str = "history",
+    action_plan: Optional[str] = None,
+    num_samples: int = 1,
+    branch_depth: Optional[int] = 1,
+    stream: bool = False
 ):
     """
     Generated a single chain of tool calls for each task in the input data. Optionally, the chain can be judged by a critic model.
@@ -77,29 +283,63 @@ def generate(
         input_data: List of tasks to generate tool calls for.
         policy_model: Model to generate tool calls.
         num_retries: Number of retries for each node in the chain.
-        num_full_retries: Number of retries for the entire chain.
+        num_full_retries: Number of attempts at the chain. Stops at the first one that finds a final answer; a failed chain
+            is resumed from its last valid step where possible, see find_resume_node.
         max_depth: Maximum depth of the chain.
         should_judge: Whether to judge the generated chain.
         index: Global index of the task.
+        prompt_mode: ReAct prompt layout, "history" (default) or "multi_turn".
+        action_plan: Action plan generated ahead of time (e.g. by a batch job), used instead of generating one.
+        num_samples: Number of children sampled for each node above branch_depth, see _generate.
+        branch_depth: Depth above which nodes are branched. The default of 1 samples several first steps and continues each greedily.
+        stream: Stream each step and dispatch its tool as soon as the Action Input is complete.
     """
-    full_retries = 0
+    with usage_scope(task=index):
+        plan_cache = get_action_plan_cache()
+        task = input_data[0]
+        plan_key = plan_cache.make_key(policy_model.model, task['prompt'], task['tools'], task.get('historical_date'))
+        if action_plan is not None:
+            # planned ahead of time, e.g. by a batch job
+            plan_cache.set(plan_key, action_plan)
+        start_task, recovered = recover_task(task)
+        if recovered is not None:
+            plan_cache.set(plan_key, recovered["action_plan"])
+
+        attempts = []
+        resume_node = None
+        num_resumed = 0
 
-    while full_retries < num_full_retries:
-        task_batch = input_data
-        generation_queue, tree_list = pre_process(task_batch)
+        for full_retries in range(num_full_retries):
+            if resume_node is None:
+                generation_queue, tree_list = pre_process([start_task])
 
-        generate_action_plan(tree_list, policy_model)
+                # a new chain keeps the plan unless it has failed too often, see ActionPlanCache
+                cached_plan = plan_cache.get(plan_key)
+                if cached_plan is None:
+                    if generate_action_plan(tree_list, policy_model)[0]:
+                        plan_cache.set(plan_key, tree_list[0].action_plan)
+                else:
+                    tree_list[0].add_action_plan(cached_plan)
+                attempts.append((tree_list[0], cached_plan is None))
+                journal_attempt(tree_list[0], recovered)
+                # later attempts start over from the task itself
+                start_task, recovered = task, None
+            else:
+                # keep every good step of the failed chain and only regenerate from where it got stuck
+                generation_queue = deque([resume_node])
+                num_resumed += 1
 
-        # generate policy model full chain
-        while generation_queue:
-            curr_nodes: List[Type[ReActNode]] = [generation_queue.popleft() for _ in range(len(generation_queue))]
-            next_nodes = _generate(curr_nodes, policy_model, num_retries, max_depth)
-            generation_queue.extend(next_nodes)
+            # generate policy model full chain
+            while generation_queue:
+                curr_nodes: List[Type[ReActNode]] = [generation_queue.popleft() for _ in range(len(generation_queue))]
+                next_nodes = _generate(curr_nodes, policy_model, num_retries, max_depth, prompt_mode=prompt_mode, num_samples=num_samples, branch_depth=branch_depth, stream=stream)
+                generation_queue.extend(next_nodes)
 
-        for tree in tree_list:
-            if tree.policy_final_answer is not None:
+            if tree_list[0].policy_final_answer is not None:
                 break
-    
-        full_retries += 1
+            # once its plan is dropped a failed chain starts over with a new one instead of resuming
+            resume_node = None if plan_cache.record_failure(plan_key) else find_resume_node(tree_list[0], max_depth)
+
+        record_chain_attempts(index, attempts, num_resumed)
 
     return tree_list[0].get_all_flattened_history()[0], index
@@ -0,0 +1,207 @@
+import asyncio
+import itertools
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from inference.action_plan_cache import get_action_plan_cache
+from inference.inference_utils import agenerate_plan, get_action_plan_prompts, get_react_prompts, pre_process
+from inference.react_inference import (
+    dedupe_sampled_next_nodes, find_resume_node, journal_attempt, post_process, record_chain_attempts, recover_task,
+)
+from model.usage import STAGE_ACTION_PLAN, STAGE_REACT_STEP, usage_scope
+from tree.react_stream import ReActStreamParser
+from tree.react_tree import ReActNode, ReActTreeManager
+
+
+class ReActScheduler:
+    """Advance the ReAct trees of many tasks from one frontier queue on a single event loop.
+
+    Every ready node of every task sits in one frontier. Workers take nodes from it, await the policy
+    model's next step, run the tool call on a thread pool and push the resulting nodes back. Deeper
+    nodes go first, so started tasks finish before new ones take up the workers. At most
+    ``max_in_flight`` LLM calls (action plans and steps) and ``max_tool_calls`` tool calls run at once,
+    so throughput is bounded by rate limits and tool latency rather than by a thread per task. A step
+    that raises is queued again until its node runs out of retries.
+
+    ``policy_model`` must implement ``agenerate`` (see AsyncLiteLLMWrapper), and ``agenerate_stream``
+    when ``stream`` is set. Create the scheduler and call ``start``, ``generate`` and finally ``stop``
+    on the event loop that runs it.
+    """
+
+    def __init__(
+        self,
+        policy_model,
+        num_retries: int,
+        max_depth: int,
+        num_full_retries: int = 1,
+        prompt_mode: str = "history",
+        max_in_flight: int = 64,
+        max_tool_calls: Optional[int] = None,
+        num_samples: int = 1,
+        branch_depth: Optional[int] = 1,
+        stream: bool = False,
+    ):
+        self.policy_model = policy_model
+        self.num_retries = num_retries
+        self.max_depth = max_depth
+        self.num_full_retries = num_full_retries
+        self.prompt_mode = prompt_mode
+        self.max_in_flight = max_in_flight
+        self.max_tool_calls = max_tool_calls or max_in_flight
+        self.num_samples = num_samples
+        self.branch_depth = branch_depth
+        # stream single-sample steps and stop reading once the Action Input is complete, see ReActStreamParser
+        self.stream = stream
+
+        self.frontier: Optional[asyncio.PriorityQueue] = None
+        self._llm_slots: Optional[asyncio.Semaphore] = None
+        self._tool_executor = ThreadPoolExecutor(max_workers=self.max_tool_calls, thread_name_prefix="react-tool")
+        self._workers: List[asyncio.Task] = []
+        # ties in the frontier are broken by arrival order
+        self._sequence = itertools.count()
+        # nodes of each tree that are queued or being expanded, and the future its task waits on
+        self._pending: Dict[int, List] = {}
+
+        self.num_steps = 0
+        self.num_step_errors = 0
+
+    async def start(self):
+        """Create the frontier and its workers on the running event loop."""
+        self.frontier = asyncio.PriorityQueue()
+        self._llm_slots = asyncio.Semaphore(self.max_in_flight)
+        # a worker waiting on a tool does not hold an LLM slot, so both limits can be saturated at once
+        self._workers = [
+            asyncio.ensure_future(self._worker()) for _ in range(self.max_in_flight + self.max_tool_calls)
+        ]
+
+    async def stop(self):
+        """Cancel the workers and release the tool threads."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._tool_executor.shutdown(wait=False)
+
+    async def generate(self, input_sample: dict, index: int, action_plan: Optional[str] = None) -> Tuple[dict, int]:
+        """
+        Run one task to completion through the frontier. Returns the same ``(generation, index)`` pair as
+        ``react_inference.generate``.
+
+        Args:
+            input_sample: The task.
+            index: Global index of the task.
+            action_plan: Action plan generated ahead of time (e.g. by a batch job), used instead of generating one.
+        """
+        with usage_scope(task=index):
+            plan_cache = get_action_plan_cache()
+            plan_key = plan_cache.make_key(
+                self.policy_model.model, input_sample['prompt'], input_sample['tools'], input_sample.get('historical_date')
+            )
+            if action_plan is not None:
+                plan_cache.set(plan_key, action_plan)
+            start_task, recovered = recover_task(input_sample)
+            if recovered is not None:
+                plan_cache.set(plan_key, recovered["action_plan"])
+
+            attempts = []
+            resume_node = None
+            num_resumed = 0
+
+            for _ in range(self.num_full_retries):
+                if resume_node is None:
+                    queue, tree_list = pre_process([start_task])
+                    tree = tree_list[0]
+
+                    cached_plan = plan_cache.get(plan_key)
+                    if cached_plan is None:
+                        prompt = get_action_plan_prompts(tree_list)[0]
+                        async with self._llm_slots:
+                            with usage_scope(stage=STAGE_ACTION_PLAN):
+                                plan, generated = await agenerate_plan(self.policy_model, prompt)
+                        tree.add_action_plan(plan)
+                        if generated:
+                            plan_cache.set(plan_key, plan)
+                    else:
+                        tree.add_action_plan(cached_plan)
+                    attempts.append((tree, cached_plan is None))
+                    journal_attempt(tree, recovered)
+                    start_task, recovered = input_sample, None
+                    resume_node = queue[0]
+                else:
+                    num_resumed += 1
+
+                await self._run_tree(tree, index, resume_node)
+                if tree.policy_final_answer is not None:
+                    break
+                resume_node = None if plan_cache.record_failure(plan_key) else find_resume_node(tree, self.max_depth)
+
+            record_chain_attempts(index, attempts, num_resumed)
+
+        return tree.get_all_flattened_history()[0], index
+
+    async def _run_tree(self, tree: ReActTreeManager, index: int, start_node: ReActNode):
+        done = asyncio.get_running_loop().create_future()
+        self._pending[id(tree)] = [0, done]
+        self._push(start_node, tree, index)
+        try:
+            await done
+        finally:
+            del self._pending[id(tree)]
+
+    def _push(self, node: ReActNode, tree: ReActTreeManager, index: int):
+        self._pending[id(tree)][0] += 1
+        self.frontier.put_nowait((-node.depth, next(self._sequence), node, tree, index))
+
+    def _finish(self, tree: ReActTreeManager):
+        pending = self._pending.get(id(tree))
+        if pending is None:
+            # the task was cancelled while this node was being expanded
+            return
+        pending[0] -= 1
+        if pending[0] == 0 and not pending[1].done():
+            pending[1].set_result(None)
+
+    async def _worker(self):
+        while True:
+            _, _, node, tree, index = await self.frontier.get()
+            try:
+                for next_node in await self._step(node, index):
+                    self._push(next_node, tree, index)
+            except Exception:
+                # a broken step is retried like an invalid one, and ends only its own branch once out of retries
+                self.num_step_errors += 1
+                node.update_errors(f"scheduler_error: {traceback.format_exc()}")
+                if node.num_retries < self.num_retries and node.depth < self.max_depth:
+                    self._push(node, tree, index)
+            finally:
+                self._finish(tree)
+                self.frontier.task_done()
+
+    async def _step(self, node: ReActNode, index: int) -> List[ReActNode]:
+        """Expand one node: sample its next step(s), then run the tools off the event loop."""
+        prompt = get_react_prompts([node], self.prompt_mode)[0]
+        n = self.num_samples if self.branch_depth is None or node.depth < self.branch_depth else 1
+        num_children = [len(node.children)]
+
+        async with self._llm_slots:
+            with usage_scope(task=index, stage=STAGE_REACT_STEP):
+                if n == 1 and self.stream:
+                    generations = [(await self.policy_model.agenerate_stream(prompt, ReActStreamParser))[0]]
+                elif n == 1:
+                    generations = [(await self.policy_model.agenerate(prompt))[0]]
+                else:
+                    generations = await self.policy_model.agenerate_n(prompt, n)
+        self.num_steps += 1
+
+        next_nodes = await asyncio.get_running_loop().run_in_executor(
+            self._tool_executor,
+            post_process,
+            [prompt] * len(generations),
+            generations,
+            [node] * len(generations),
+            self.num_retries,
+            self.max_depth,
+        )
+        if n == 1:
+            return next_nodes
+        return dedupe_sampled_next_nodes([node], num_children, next_nodes)
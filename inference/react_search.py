@@ -0,0 +1,253 @@
+import contextvars
+import json
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from inference.action_plan_cache import get_action_plan_cache
+from inference.inference_utils import generate_action_plan, get_react_prompts, pre_process
+from inference.react_inference import attach_step, journal_attempt, record_chain_attempts, recover_task, run_step
+from model.usage import STAGE_REACT_STEP, usage_scope
+from tree.react_tree import ReActNode, ReActTreeManager
+from utils.journal import get_journal
+
+SEARCH_STRATEGIES = ["beam", "best_first"]
+
+
+class ToolResultCache:
+    """Tool results of one search, keyed by tool and arguments.
+
+    Sibling steps that pick the same action share one tool call: the first caller runs it and the others
+    wait for its result. Failed calls are not kept, so a later step can try again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results: Dict[str, Future] = {}
+        self.num_calls = 0
+        self.num_shared = 0
+
+    def call(self, tool_name: str, args: Dict[str, Any], fn: Callable[[Dict[str, Any]], Any]) -> Any:
+        key = json.dumps([tool_name, args], sort_keys=True, default=str)
+        with self._lock:
+            future = self._results.get(key)
+            owner = future is None
+            if owner:
+                future = self._results[key] = Future()
+                self.num_calls += 1
+            else:
+                self.num_shared += 1
+        if owner:
+            try:
+                future.set_result(fn(args))
+            except BaseException as e:
+                with self._lock:
+                    del self._results[key]
+                future.set_exception(e)
+        return future.result()
+
+
+def action_key(node: ReActNode) -> Tuple[str, str]:
+    """The action a step takes, with its JSON input normalized so formatting differences do not matter."""
+    action_input = node.action_input.value
+    try:
+        action_input = json.dumps(json.loads(action_input), sort_keys=True)
+    except (TypeError, ValueError):
+        pass
+    return node.action.value, action_input
+
+
+class ReActTreeSearch:
+    """Search over ReAct steps, expanding several candidate steps per node instead of following one chain.
+
+    Each expansion samples ``width`` next steps of a node from one request where the provider supports it,
+    and runs their tools in parallel. A step's ``llm_score`` is the share of its parent's samples that chose
+    the same action, so the model's own agreement serves as the value estimate. A node's ``Q`` is the mean
+    ``llm_score`` along its path and ``N`` counts the samples drawn from it. Siblings with the same action
+    share one tool call, and all but the first of them are pruned.
+
+    Each round expands ``beam_size`` frontier nodes with the highest ``Q`` in parallel, so a round takes
+    one LLM call and one tool call of wall time, just like a step of a single chain. ``beam`` keeps only the
+    new nodes as the next frontier, while ``best_first`` keeps every unexpanded node. The search stops at the
+    first round that finds an answer, at ``max_depth``, or once ``budget`` steps have been generated.
+    """
+
+    def __init__(
+        self,
+        policy_model,
+        num_retries: int,
+        max_depth: int,
+        strategy: str = "best_first",
+        width: int = 4,
+        beam_size: int = 2,
+        budget: Optional[int] = None,
+        prompt_mode: str = "history",
+    ):
+        if strategy not in SEARCH_STRATEGIES:
+            raise ValueError(f"Unknown search strategy {strategy}, expected one of {SEARCH_STRATEGIES}")
+        self.policy_model = policy_model
+        self.num_retries = num_retries
+        self.max_depth = max_depth
+        self.strategy = strategy
+        self.width = width
+        self.beam_size = beam_size
+        # by default enough for the beam to reach max_depth
+        self.budget = budget or width * beam_size * max_depth
+        self.prompt_mode = prompt_mode
+
+    def run(self, tree: ReActTreeManager, start: Optional[ReActNode] = None) -> Optional[ReActNode]:
+        """Search ``tree`` from ``start`` (its root by default), set its best leaf and final answer, and return the best leaf."""
+        tool_results = ToolResultCache()
+        frontier = [start or tree.root]
+        answers = []
+        num_generations = 0
+
+        with ThreadPoolExecutor(max_workers=self.width * self.beam_size) as executor:
+            while frontier and not answers and num_generations < self.budget:
+                # sorted is stable, so ties go to the node that joined the frontier first
+                frontier = sorted(frontier, key=lambda node: node.Q, reverse=True)
+                selected, rest = frontier[: self.beam_size], frontier[self.beam_size :]
+
+                samples = []
+                for node in selected:
+                    n = min(self.width, self.budget - num_generations)
+                    if n > 0:
+                        samples.append((node, n))
+                        num_generations += n
+
+                next_nodes = self._expand(samples, executor, tool_results)
+                answers = [node for node in next_nodes if node.answer_found]
+                frontier = [node for node in next_nodes if not node.answer_found]
+                if self.strategy == "best_first":
+                    frontier += rest
+
+        leaves = [leaf for leaf in tree.root.iter_leaves() if not leaf.is_pseudo_root and not leaf.pruned]
+        candidates = answers or leaves
+        if not candidates:
+            return None
+        best = max(candidates, key=lambda node: node.Q)
+        tree.best_leaf = best
+        tree.policy_final_answer = best.final_answer if best.answer_found else None
+        return best
+
+    def _expand(
+        self, samples: List[Tuple[ReActNode, int]], executor: ThreadPoolExecutor, tool_results: ToolResultCache
+    ) -> List[ReActNode]:
+        """Sample the next steps of every node in parallel, run their tools in parallel and score the new steps.
+
+        Returns the new steps, answers included, plus nodes whose samples all failed but that have retries left.
+        Such a node spends one retry per round however many samples failed. The tree is only changed once every
+        step has run, so sibling samples never update a node at the same time.
+        """
+        nodes = [node for node, _ in samples]
+        prompts = get_react_prompts(nodes, self.prompt_mode)
+        num_children = [len(node.children) for node in nodes]
+
+        with usage_scope(stage=STAGE_REACT_STEP):
+            # pool threads do not inherit the task's usage scope, so each call runs in a copy of it
+            generation_futures = [
+                executor.submit(contextvars.copy_context().run, self.policy_model.generate_n, prompt, n)
+                for prompt, (_, n) in zip(prompts, samples)
+            ]
+        step_futures = [
+            [executor.submit(run_step, generation, node, tool_results) for generation in future.result()]
+            for node, future in zip(nodes, generation_futures)
+        ]
+
+        next_nodes = []
+        for prompt, node, before, futures in zip(prompts, nodes, num_children, step_futures):
+            for future in futures:
+                if future.exception() is not None:
+                    node.update_errors(str(future.exception()), count_retry=False)
+                    continue
+                react_node, found_answer = future.result()
+                next_nodes += attach_step(
+                    prompt, node, react_node, found_answer, self.num_retries, self.max_depth,
+                    propogate_final_answer_found=True,
+                )
+            # one retry per round, and only when every sample failed
+            if len(node.children) == before:
+                node.num_retries += 1
+                if node.num_retries < self.num_retries and node.depth < self.max_depth:
+                    next_nodes.append(node)
+
+        for (node, n), before in zip(samples, num_children):
+            node.expanded = True
+            node.N += n
+            self._score(node, node.children[before:], n)
+        return [node for node in next_nodes if not node.pruned]
+
+    @staticmethod
+    def _score(parent: ReActNode, children: List[ReActNode], num_samples: int):
+        votes = Counter(action_key(child) for child in children)
+        seen = set()
+        for child in children:
+            key = action_key(child)
+            child.llm_score = votes[key] / num_samples
+            child.Q = (parent.Q * parent.depth + child.llm_score) / child.depth
+            if key in seen:
+                child.prune("same action as a sibling")
+                journal = get_journal()
+                if journal is not None:
+                    journal.log_prune(child)
+            seen.add(key)
+
+
+def generate(
+    input_data: List[dict],
+    policy_model,
+    num_retries: int,
+    max_depth: int,
+    index: int,
+    prompt_mode: str = "history",
+    action_plan: Optional[str] = None,
+    strategy: str = "best_first",
+    width: int = 4,
+    beam_size: int = 2,
+    budget: Optional[int] = None,
+):
+    """
+    Search a tree of tool calls for a single task, see ReActTreeSearch. Returns the same ``(generation, index)``
+    pair as ``react_inference.generate``, with the best trajectory under ``best_trajectory``.
+
+    Args:
+        input_data: List holding the task.
+        policy_model: Model to generate tool calls, must implement ``generate_n``.
+        num_retries: Number of retries for each node whose samples all fail.
+        max_depth: Maximum depth of the tree.
+        index: Global index of the task.
+        prompt_mode: ReAct prompt layout, "history" (default) or "multi_turn".
+        action_plan: Action plan generated ahead of time (e.g. by a batch job), used instead of generating one.
+        strategy: "best_first" or "beam".
+        width: Number of steps sampled per expanded node.
+        beam_size: Number of nodes expanded per round.
+        budget: Maximum number of steps generated for the task. Defaults to enough for the beam to reach max_depth.
+    """
+    with usage_scope(task=index):
+        plan_cache = get_action_plan_cache()
+        task = input_data[0]
+        plan_key = plan_cache.make_key(policy_model.model, task['prompt'], task['tools'], task.get('historical_date'))
+        if action_plan is not None:
+            plan_cache.set(plan_key, action_plan)
+        start_task, recovered = recover_task(task)
+        if recovered is not None:
+            plan_cache.set(plan_key, recovered["action_plan"])
+
+        queue, tree_list = pre_process([start_task])
+        tree = tree_list[0]
+        cached_plan = plan_cache.get(plan_key)
+        if cached_plan is None:
+            if generate_action_plan(tree_list, policy_model)[0]:
+                plan_cache.set(plan_key, tree.action_plan)
+        else:
+            tree.add_action_plan(cached_plan)
+        journal_attempt(tree, recovered)
+
+        ReActTreeSearch(
+            policy_model, num_retries, max_depth,
+            strategy=strategy, width=width, beam_size=beam_size, budget=budget, prompt_mode=prompt_mode,
+        ).run(tree, queue[0])
+        record_chain_attempts(index, [(tree, cached_plan is None)], 0)
+
+    return tree.get_all_flattened_history()[0], index
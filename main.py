@@ -7,9 +7,13 @@ import json
 import os
 import pandas as pd
 
+from inference.inference_utils import REACT_PROMPT_MODES
+from inference.react_search import SEARCH_STRATEGIES
 from pipeline.generate import GenerationPipeline
+from model.response_cache import DEFAULT_MAX_SIZE_MB
 from model.types import GENERATION_STRATEGY
 from model.utils import load_sampling_params
+from utils.journal import configure_journal
 from utils.keystore import auth_tools, auth_litellm
 
 def load_data(args):
@@ -26,8 +30,23 @@ def load_data(args):
     if os.path.exists(path):
         with open(path) as f:
             react_trees = json.load(f)
-        queries=[data['prompt'] for data in react_trees]
-        input_data = [data for data in input_data if data['prompt'] not in queries]
+    # react generations name their task "query", native ones keep the input's "prompt"
+    queries = {data.get('prompt', data.get('query')) for data in react_trees}
+
+    journal = None if args.disable_journal else configure_journal(os.path.join(args.output_dir, "journal.jsonl"))
+    unsaved = set()
+    if journal is not None:
+        # tasks that finished after the last save of a killed run
+        for query, generation in journal.finished().items():
+            if query not in queries:
+                react_trees.append(generation)
+                unsaved.add(query)
+    queries |= unsaved
+    input_data = [data for data in input_data if data['prompt'] not in queries]
+
+    if journal is not None:
+        # unfinished tasks resume from the journal, see RunJournal.recover
+        journal.compact({data['prompt'] for data in input_data} | unsaved)
 
     return react_trees, input_data
 
@@ -111,6 +130,144 @@ if __name__ == "__main__":
         default=10,
         help="The maximum number of tool invocations to use for generation",
     )
+    parser.add_argument(
+        "--adaptive_concurrency",
+        action="store_true",
+        help="Share an AIMD limit on in-flight LLM requests across workers, driven by rate limit errors",
+    )
+    parser.add_argument(
+        "--http_max_connections",
+        type=int,
+        default=None,
+        help="Size of the shared LLM connection pool (default: 2 per worker)",
+    )
+    parser.add_argument(
+        "--http_timeout",
+        type=float,
+        default=600,
+        help="Read timeout in seconds for LLM requests on the shared connection pool",
+    )
+    parser.add_argument(
+        "--disable_http2",
+        action="store_true",
+        help="Keep the shared connection pool on HTTP/1.1 even when h2 is installed",
+    )
+    parser.add_argument(
+        "--stream_react_steps",
+        action="store_true",
+        help="Stream ReAct steps and stop generating as soon as the Action Input JSON is complete, then dispatch the tool",
+    )
+    parser.add_argument(
+        "--num_samples",
+        type=int,
+        default=1,
+        help="ReAct children sampled per node above --branch_depth, from one request where the provider supports n",
+    )
+    parser.add_argument(
+        "--branch_depth",
+        type=int,
+        default=1,
+        help="Depth above which ReAct nodes get --num_samples children (1 branches only the first step)",
+    )
+    parser.add_argument(
+        "--react_search",
+        type=str,
+        default=None,
+        choices=SEARCH_STRATEGIES,
+        help="Search a tree of ReAct steps (best_first or beam) instead of generating one chain per attempt",
+    )
+    parser.add_argument(
+        "--search_width",
+        type=int,
+        default=4,
+        help="Steps sampled per node expanded by --react_search",
+    )
+    parser.add_argument(
+        "--search_beam_size",
+        type=int,
+        default=2,
+        help="Nodes expanded in parallel per round of --react_search",
+    )
+    parser.add_argument(
+        "--search_budget",
+        type=int,
+        default=None,
+        help="Maximum ReAct steps generated per task by --react_search (default: width * beam size * max depth)",
+    )
+    parser.add_argument(
+        "--batch_mode",
+        action="store_true",
+        help="Generate all action plans up front as one provider batch job (OpenAI Batch or Anthropic Message Batches) at the batch discount",
+    )
+    parser.add_argument(
+        "--batch_poll_interval",
+        type=float,
+        default=30,
+        help="Seconds between batch job status checks",
+    )
+    parser.add_argument(
+        "--hedge_requests",
+        action="store_true",
+        help="Send a duplicate of any LLM call that runs past the tracked latency percentile for its model and stage; the first response wins",
+    )
+    parser.add_argument(
+        "--hedge_percentile",
+        type=float,
+        default=95,
+        help="Latency percentile after which a call is hedged",
+    )
+    parser.add_argument(
+        "--hedge_max_extra_fraction",
+        type=float,
+        default=0.1,
+        help="Cap on hedged calls as a fraction of all calls",
+    )
+    parser.add_argument(
+        "--react_prompt_mode",
+        type=str,
+        default="history",
+        choices=REACT_PROMPT_MODES,
+        help="ReAct prompt layout: one growing History message, or one assistant/user turn pair per past step (append-only, prefix-cache friendly)",
+    )
+    parser.add_argument(
+        "--prompt_caching",
+        action="store_true",
+        help="Mark static prompt prefixes with cache_control for providers that need it (Anthropic)",
+    )
+    parser.add_argument(
+        "--regenerate_plan_after",
+        type=int,
+        default=None,
+        help="Generate a new action plan after this many failed full retries with the current one. By default retries always reuse it",
+    )
+    parser.add_argument(
+        "--action_plan_cache_path",
+        type=str,
+        default=None,
+        help="Keep action plans in this sqlite file, shared between runs and between native and react mode. In memory if omitted",
+    )
+    parser.add_argument(
+        "--disable_journal",
+        action="store_true",
+        help="Do not log completed steps to journal.jsonl in the output dir. Without it a killed run cannot resume unfinished tasks mid-chain",
+    )
+    parser.add_argument(
+        "--llm_cache_path",
+        type=str,
+        default=None,
+        help="Persistent LLM response cache (sqlite file). Disabled if omitted",
+    )
+    parser.add_argument(
+        "--llm_cache_max_size_mb",
+        type=int,
+        default=DEFAULT_MAX_SIZE_MB,
+        help="Size budget of the LLM response cache, least recently used entries are evicted past it",
+    )
+    parser.add_argument(
+        "--llm_cache_any_temperature",
+        action="store_true",
+        help="Also cache responses sampled with temperature > 0 (replays the first sample)",
+    )
     parser.add_argument(
         "--apply_chat_template",
         action="store_true",
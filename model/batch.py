@@ -0,0 +1,254 @@
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from openai import OpenAI
+
+from model.http_client import get_http_client
+from model.retry_policy import provider_of
+from model.usage import get_usage_tracker, usage_scope
+from utils.keystore import get_from_env
+
+# sampling config keys that only mean something to litellm or this repo
+NON_PROVIDER_PARAMS = {"model", "endpoints", "drop_params", "custom_llm_provider"}
+
+# Anthropic-only params that the Chat Completions API rejects
+OPENAI_UNSUPPORTED_PARAMS = {"thinking", "top_k"}
+
+# params the Messages API accepts, after the mapping in AnthropicBatchBackend.to_anthropic
+ANTHROPIC_PARAMS = {"max_tokens", "stop_sequences", "temperature", "top_p", "top_k", "thinking", "metadata"}
+
+# thinking budgets litellm sends for ``reasoning_effort`` on Anthropic models
+REASONING_EFFORT_BUDGETS = {"low": 1024, "medium": 2048, "high": 4096}
+
+OPENAI_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+ANTHROPIC_VERSION = "2023-06-01"
+
+
+def _result(content: Optional[str] = None, error: Optional[str] = None, usage: Optional[Dict] = None) -> Dict[str, Any]:
+    return {"content": content, "error": error, "usage": usage}
+
+
+def _provider_params(sampling_params: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in sampling_params.items() if k not in NON_PROVIDER_PARAMS and v is not None}
+
+
+def _model_name(model: str) -> str:
+    """``"openai/gpt-4o"`` -> ``"gpt-4o"``; the provider APIs do not know litellm's prefixes."""
+    return model.split("/", 1)[1] if "/" in model else model
+
+
+def _text(content: Any) -> str:
+    """Flatten message content that may be a list of (cache-marked) text blocks."""
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return content or ""
+
+
+class OpenAIBatchBackend:
+    """OpenAI Batch API: upload a JSONL file of chat completion requests, poll the batch, download results."""
+
+    def __init__(self, api_base: Optional[str] = None, api_key: Optional[str] = None):
+        self.client = OpenAI(
+            base_url=api_base or get_from_env("OPENAI_BATCH_API_BASE", "https://api.openai.com/v1"),
+            api_key=api_key or get_from_env("OPENAI_API_KEY", "batch"),
+            http_client=get_http_client(),
+        )
+
+    def submit(self, requests: List[Tuple[str, List[Dict]]], sampling_params: Dict[str, Any]) -> str:
+        params = {k: v for k, v in _provider_params(sampling_params).items() if k not in OPENAI_UNSUPPORTED_PARAMS}
+        lines = []
+        for custom_id, messages in requests:
+            # OpenAI caches shared prefixes automatically, so cache markers are flattened away
+            messages = [{**message, "content": _text(message.get("content"))} for message in messages]
+            body = {"model": _model_name(sampling_params["model"]), "messages": messages, **params}
+            lines.append(json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}))
+        input_file = self.client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Return results by custom id once the batch has finished, else None."""
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status not in OPENAI_FINAL_STATUSES:
+            return None
+
+        results = {}
+        for file_id in [batch.output_file_id, batch.error_file_id]:
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                response = row.get("response") or {}
+                body = response.get("body") or {}
+                if row.get("error") or response.get("status_code") != 200:
+                    results[row["custom_id"]] = _result(error=json.dumps(row.get("error") or body))
+                else:
+                    results[row["custom_id"]] = _result(
+                        content=body["choices"][0]["message"]["content"], usage=body.get("usage")
+                    )
+        return results
+
+    def cancel(self, batch_id: str):
+        self.client.batches.cancel(batch_id)
+
+
+class AnthropicBatchBackend:
+    """Anthropic Message Batches API over plain HTTP."""
+
+    def __init__(self, api_base: Optional[str] = None, api_key: Optional[str] = None):
+        self.api_base = (api_base or get_from_env("ANTHROPIC_BATCH_API_BASE", "https://api.anthropic.com/v1")).rstrip("/")
+        self.client = get_http_client()
+        self.headers = {
+            "x-api-key": api_key or get_from_env("ANTHROPIC_API_KEY", "batch"),
+            "anthropic-version": ANTHROPIC_VERSION,
+            "content-type": "application/json",
+        }
+
+    @staticmethod
+    def to_anthropic(messages: List[Dict], sampling_params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert OpenAI style messages and sampling params to a Messages API request.
+
+        ``stop`` and ``max_completion_tokens`` are renamed, ``reasoning_effort`` becomes a ``thinking`` budget
+        the way litellm maps it, and params the Messages API does not accept are dropped, as litellm's
+        ``drop_params`` would for an interactive call.
+        """
+        params = _provider_params(sampling_params)
+        if "stop" in params:
+            stop = params.pop("stop")
+            params["stop_sequences"] = [stop] if isinstance(stop, str) else stop
+        if "max_completion_tokens" in params:
+            params.setdefault("max_tokens", params.pop("max_completion_tokens"))
+        effort = params.pop("reasoning_effort", None)
+        if effort in REASONING_EFFORT_BUDGETS and "thinking" not in params:
+            params["thinking"] = {"type": "enabled", "budget_tokens": REASONING_EFFORT_BUDGETS[effort]}
+        params = {k: v for k, v in params.items() if k in ANTHROPIC_PARAMS}
+        params.setdefault("max_tokens", 4096)
+        if params.get("thinking"):
+            # extended thinking needs room beyond its budget
+            params["max_tokens"] = max(params["max_tokens"], params["thinking"].get("budget_tokens", 0) + 1024)
+            # and does not allow sampling changes other than top_p
+            params.pop("top_k", None)
+            if params.get("temperature") != 1:
+                params.pop("temperature", None)
+
+        system = [message["content"] for message in messages if message["role"] == "system"]
+        request = {
+            "model": _model_name(sampling_params["model"]),
+            "messages": [message for message in messages if message["role"] != "system"],
+            **params,
+        }
+        if system:
+            request["system"] = system[0] if len(system) == 1 else "\n\n".join(_text(content) for content in system)
+        return request
+
+    def submit(self, requests: List[Tuple[str, List[Dict]]], sampling_params: Dict[str, Any]) -> str:
+        payload = {
+            "requests": [
+                {"custom_id": custom_id, "params": self.to_anthropic(messages, sampling_params)}
+                for custom_id, messages in requests
+            ]
+        }
+        response = self.client.post(f"{self.api_base}/messages/batches", json=payload, headers=self.headers)
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        response = self.client.get(f"{self.api_base}/messages/batches/{batch_id}", headers=self.headers)
+        response.raise_for_status()
+        batch = response.json()
+        if batch["processing_status"] != "ended":
+            return None
+
+        response = self.client.get(batch["results_url"], headers=self.headers)
+        response.raise_for_status()
+        results = {}
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            result = row["result"]
+            if result["type"] != "succeeded":
+                results[row["custom_id"]] = _result(error=json.dumps(result.get("error") or result["type"]))
+                continue
+            message = result["message"]
+            text = "".join(block.get("text", "") for block in message["content"] if block.get("type") == "text")
+            results[row["custom_id"]] = _result(content=text, usage=message.get("usage"))
+        return results
+
+    def cancel(self, batch_id: str):
+        response = self.client.post(f"{self.api_base}/messages/batches/{batch_id}/cancel", headers=self.headers)
+        response.raise_for_status()
+
+
+BACKENDS = {"openai": OpenAIBatchBackend, "anthropic": AnthropicBatchBackend}
+
+
+def supports_batch(model: str) -> bool:
+    return provider_of(model) in BACKENDS
+
+
+def run_batch(
+    requests: List[Tuple[Any, List[Dict]]],
+    sampling_params: Dict[str, Any],
+    api_base: Optional[str] = None,
+    poll_interval: float = 30,
+    max_requests_per_batch: int = 10000,
+    timeout: float = 24 * 3600,
+) -> List[Dict[str, Any]]:
+    """Run single-shot chat requests as provider batch jobs and return one result per request, in order.
+
+    ``requests`` are ``(task, messages)`` pairs; ``task`` only labels the call in the usage log. Each
+    result has ``content`` (None if the request failed or the batch never finished), ``error`` and
+    ``usage``. Callers are expected to fall back to interactive calls for failed requests. Batches still
+    running after ``timeout`` seconds are cancelled so they are not billed for work nobody will read.
+    """
+    model = sampling_params["model"]
+    if not supports_batch(model):
+        raise ValueError(f"Batch mode supports {sorted(BACKENDS)} models, got {model}")
+    backend = BACKENDS[provider_of(model)](api_base)
+
+    custom_ids = [f"req-{i}" for i in range(len(requests))]
+    pending = {}
+    for start in range(0, len(requests), max_requests_per_batch):
+        chunk = [(custom_ids[i], requests[i][1]) for i in range(start, min(start + max_requests_per_batch, len(requests)))]
+        pending[backend.submit(chunk, sampling_params)] = chunk
+        print(f"Submitted batch of {len(chunk)} {model} requests")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    submitted = time.monotonic()
+    while pending:
+        for batch_id in list(pending):
+            batch_results = backend.poll(batch_id)
+            if batch_results is not None:
+                results.update(batch_results)
+                del pending[batch_id]
+        if not pending or time.monotonic() - submitted > timeout:
+            break
+        time.sleep(poll_interval)
+
+    for batch_id in pending:
+        try:
+            backend.cancel(batch_id)
+            print(f"Cancelled batch {batch_id} after {timeout}s")
+        except Exception as e:
+            print(f"Failed to cancel batch {batch_id}: {e}")
+
+    ordered = []
+    for custom_id, (task, _) in zip(custom_ids, requests):
+        result = results.get(custom_id, _result(error="batch did not return this request"))
+        with usage_scope(task=task):
+            get_usage_tracker().record(
+                model,
+                response={"usage": result["usage"]} if result["usage"] else None,
+                latency=time.monotonic() - submitted,
+                error=RuntimeError(result["error"]) if result["error"] else None,
+            )
+        ordered.append(result)
+    print(f"Batch finished: {sum(r['content'] is not None for r in ordered)}/{len(ordered)} succeeded")
+    return ordered
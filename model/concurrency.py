@@ -0,0 +1,192 @@
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+
+class AIMDConcurrencyController:
+    """Shared additive-increase/multiplicative-decrease limit on in-flight LLM requests.
+
+    Every successful request raises the limit by ``increase / limit`` (roughly +``increase`` per
+    window of requests) and a rate-limited request multiplies it by ``decrease_factor``. Callers over
+    the limit wait in a FIFO queue instead of sleeping on their own, so capacity freed by one
+    request goes straight to the next caller. Both threads (``acquire``) and coroutines
+    (``acquire_async``) can share one controller.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: float = 8,
+        min_limit: float = 1,
+        max_limit: float = 512,
+        increase: float = 1,
+        decrease_factor: float = 0.5,
+        max_backoff: float = 60,
+        stats_window: float = 60,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.max_backoff = max_backoff
+        self.stats_window = stats_window
+
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._in_flight = 0
+        self._last_decrease = 0.0
+
+        # stats
+        self._started = time.monotonic()
+        self._completions = deque()  # (finish time, latency) of recent successful requests
+        self.peak_in_flight = 0
+        self.num_requests = 0
+        self.num_successes = 0
+        self.num_rate_limited = 0
+        self.num_decreases = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _has_capacity(self) -> bool:
+        return self._in_flight < max(self.min_limit, math.floor(self.limit))
+
+    def _take_slot(self):
+        self._in_flight += 1
+        self.num_requests += 1
+        self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+
+    def _wake_waiters(self):
+        """Hand free slots to queued callers. Must be called with the lock held."""
+        while self._waiters and self._has_capacity():
+            kind, waiter = self._waiters.popleft()
+            self._take_slot()
+            if kind == "thread":
+                waiter.set()
+            else:
+                loop, future = waiter
+                loop.call_soon_threadsafe(self._grant_async, future)
+
+    def _grant_async(self, future):
+        if future.cancelled():
+            # the caller gave up after the slot was handed over, give it back
+            self._release_slot()
+        else:
+            future.set_result(None)
+
+    def _release_slot(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._wake_waiters()
+
+    def acquire(self) -> float:
+        """Block until a slot is free and return the request start time."""
+        with self._lock:
+            if not self._waiters and self._has_capacity():
+                self._take_slot()
+                return time.monotonic()
+            event = threading.Event()
+            self._waiters.append(("thread", event))
+        event.wait()
+        return time.monotonic()
+
+    async def acquire_async(self) -> float:
+        """Wait without blocking the event loop until a slot is free and return the request start time."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self._has_capacity():
+                self._take_slot()
+                return time.monotonic()
+            future = loop.create_future()
+            waiter = ("async", (loop, future))
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter not in self._waiters
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted and future.done() and not future.cancelled():
+                self._release_slot()
+            raise
+        return time.monotonic()
+
+    def release(self, started: float, outcome: str = "success"):
+        """Return a slot and adjust the limit based on how the request ended.
+
+        ``outcome`` is ``"success"``, ``"rate_limited"`` or ``"error"``. Other errors leave the limit
+        untouched.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if outcome == "rate_limited":
+                self.num_rate_limited += 1
+                # requests issued before the last decrease saw the old limit, do not punish twice
+                if started >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    self.num_decreases += 1
+            elif outcome == "success":
+                self.num_successes += 1
+                self.limit = min(self.max_limit, self.limit + self.increase / max(self.limit, 1.0))
+                self._completions.append((now, now - started))
+                while self._completions and self._completions[0][0] < now - self.stats_window:
+                    self._completions.popleft()
+            self._in_flight -= 1
+            self._wake_waiters()
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Short capped exponential backoff with jitter, used between rate-limited retries."""
+        delay = min(self.max_backoff, 2 ** (attempt - 1))
+        return delay * (0.5 + random.random())
+
+    def stats(self) -> Dict[str, float]:
+        """Achieved throughput versus what the current limit allows at the observed latency."""
+        with self._lock:
+            now = time.monotonic()
+            window = min(self.stats_window, now - self._started) or 1.0
+            recent = [latency for finish, latency in self._completions if finish >= now - self.stats_window]
+            avg_latency = sum(recent) / len(recent) if recent else 0.0
+            achieved = len(recent) / window
+            allowed = self.limit / avg_latency if avg_latency else 0.0
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self._in_flight,
+                "queued": len(self._waiters),
+                "peak_in_flight": self.peak_in_flight,
+                "num_requests": self.num_requests,
+                "num_successes": self.num_successes,
+                "num_rate_limited": self.num_rate_limited,
+                "num_decreases": self.num_decreases,
+                "avg_latency_s": round(avg_latency, 3),
+                "achieved_throughput_rps": round(achieved, 3),
+                "limit_throughput_rps": round(allowed, 3),
+                "utilization": round(achieved / allowed, 3) if allowed else 0.0,
+            }
+
+
+_controllers: Dict[str, AIMDConcurrencyController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_concurrency_controller(key: str, **kwargs) -> AIMDConcurrencyController:
+    """Return the process-wide controller for a model or provider, creating it on first use."""
+    with _controllers_lock:
+        if key not in _controllers:
+            _controllers[key] = AIMDConcurrencyController(key, **kwargs)
+        return _controllers[key]
+
+
+def get_concurrency_report() -> Dict[str, Dict[str, float]]:
+    with _controllers_lock:
+        controllers = dict(_controllers)
+    return {key: controller.stats() for key, controller in controllers.items()}
+
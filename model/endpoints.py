@@ -0,0 +1,178 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from model.retry_policy import get_provider_cooldown, is_rate_limit_error, provider_of
+from utils.keystore import get_litellm_endpoints
+
+# errors caused by the request itself, which any sibling endpoint would return too
+REQUEST_ERROR_STATUSES = {400, 413, 422}
+
+
+def is_endpoint_failure(e: BaseException) -> bool:
+    """Whether an error says the endpoint is unhealthy (down, timing out, 5xx, bad credentials or routing)."""
+    if is_rate_limit_error(e):
+        return False
+    return getattr(e, "status_code", None) not in REQUEST_ERROR_STATUSES
+
+
+class Endpoint:
+    """One LiteLLM proxy or deployment serving a model, with its circuit breaker state."""
+
+    def __init__(self, api_base: str, api_key: Optional[str] = None, model: Optional[str] = None, provider: str = "default"):
+        self.api_base = api_base
+        self.api_key = api_key
+        self.model = model
+        # Retry-After hints from one endpoint only pause that endpoint
+        self.cooldown = get_provider_cooldown(f"{provider}@{api_base}")
+
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.tripped = False
+        self.open_until = 0.0
+        self.probing = False
+
+        self.num_requests = 0
+        self.num_failures = 0
+        self.num_rate_limited = 0
+        self.num_trips = 0
+
+    def request_params(self) -> Dict[str, Any]:
+        params = {"api_base": self.api_base}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        if self.model:
+            params["model"] = self.model
+        return params
+
+    def state(self, now: float) -> str:
+        if not self.tripped:
+            return "closed"
+        return "open" if now < self.open_until else "half_open"
+
+    def is_available(self, now: float) -> bool:
+        state = self.state(now)
+        if state == "open" or (state == "half_open" and self.probing):
+            return False
+        return self.cooldown.remaining() == 0
+
+
+class EndpointPool:
+    """Least-outstanding-requests routing over several endpoints with circuit breaking.
+
+    After ``failure_threshold`` consecutive endpoint failures an endpoint is ejected for
+    ``ejection_time`` seconds, doubling on every re-trip up to ``max_ejection_time``. Once the ejection
+    ends a single probe request is let through; success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        failure_threshold: int = 3,
+        ejection_time: float = 30,
+        max_ejection_time: float = 600,
+    ):
+        self.endpoints = endpoints
+        self.failure_threshold = failure_threshold
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Endpoint:
+        with self._lock:
+            now = time.monotonic()
+            candidates = [endpoint for endpoint in self.endpoints if endpoint.is_available(now)]
+            if not candidates:
+                # everything is ejected or cooling down: use whichever recovers first rather than stall
+                candidates = [min(self.endpoints, key=lambda e: max(e.open_until, now + e.cooldown.remaining()))]
+            endpoint = min(candidates, key=lambda e: (e.outstanding, e.num_requests))
+            if endpoint.state(now) == "half_open":
+                endpoint.probing = True
+            endpoint.outstanding += 1
+            endpoint.num_requests += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, e: Optional[BaseException] = None) -> bool:
+        """Record the outcome of a request. Returns True if a healthy sibling can take the retry right away."""
+        with self._lock:
+            now = time.monotonic()
+            endpoint.outstanding -= 1
+            endpoint.probing = False
+
+            if e is None:
+                endpoint.consecutive_failures = 0
+                endpoint.tripped = False
+                return False
+
+            if is_rate_limit_error(e):
+                endpoint.num_rate_limited += 1
+            elif is_endpoint_failure(e):
+                endpoint.num_failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.tripped or endpoint.consecutive_failures >= self.failure_threshold:
+                    endpoint.tripped = True
+                    endpoint.num_trips += 1
+                    ejection = min(self.max_ejection_time, self.ejection_time * 2 ** (endpoint.num_trips - 1))
+                    endpoint.open_until = now + ejection
+                    print(f"Ejecting endpoint {endpoint.api_base} for {ejection:.0f}s after {endpoint.consecutive_failures} consecutive failures")
+            else:
+                return False
+
+            return any(other.is_available(now) for other in self.endpoints if other is not endpoint)
+
+    def cancel(self, endpoint: Endpoint):
+        """Forget a request that was abandoned before it finished, without judging the endpoint."""
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.probing = False
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "api_base": endpoint.api_base,
+                    "model": endpoint.model,
+                    "state": endpoint.state(now),
+                    "outstanding": endpoint.outstanding,
+                    "num_requests": endpoint.num_requests,
+                    "num_failures": endpoint.num_failures,
+                    "num_rate_limited": endpoint.num_rate_limited,
+                    "num_trips": endpoint.num_trips,
+                }
+                for endpoint in self.endpoints
+            ]
+
+
+_pools: Dict[str, EndpointPool] = {}
+_pools_lock = threading.Lock()
+
+
+def load_endpoint_pool(model: str, endpoints: Optional[List[Dict[str, Any]]] = None) -> Optional[EndpointPool]:
+    """Return the shared pool for ``model``, or None when no pool is configured.
+
+    ``endpoints`` comes from the ``"endpoints"`` list of a sampling config (each entry has an ``api_base``
+    and optionally an ``api_key`` and a deployment ``model``). Otherwise LITE_LLM_API_BASES is used.
+    """
+    with _pools_lock:
+        if model in _pools:
+            return _pools[model]
+
+        if not endpoints:
+            endpoints = [{"api_base": base, "api_key": key} for base, key in get_litellm_endpoints()]
+            if len(endpoints) < 2:
+                # a single proxy is already covered by LITE_LLM_API_BASE
+                return None
+
+        provider = provider_of(model)
+        _pools[model] = EndpointPool([
+            Endpoint(endpoint["api_base"], endpoint.get("api_key"), endpoint.get("model"), provider)
+            for endpoint in endpoints
+        ])
+        return _pools[model]
+
+
+def get_endpoint_report() -> Dict[str, List[Dict[str, Any]]]:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {model: pool.stats() for model, pool in pools.items()}
@@ -0,0 +1,207 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, Optional
+
+
+def _spawn(fn: Callable[[], Any]) -> Future:
+    """Run ``fn`` on its own daemon thread (in the caller's context) and return a future for it.
+
+    A dedicated thread per attempt means a hedge never queues behind other work in a shared pool.
+    """
+    future = Future()
+    context = contextvars.copy_context()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(fn))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="hedged-request", daemon=True).start()
+    return future
+
+
+class HedgePolicy:
+    """Issue a duplicate of a slow LLM call once it passes a latency percentile; the first response wins.
+
+    Latencies are tracked per key (model and stage) over the last ``window`` primary requests, and no
+    hedging happens until ``min_samples`` of them are in. Hedges are capped at ``max_extra_fraction`` of
+    all calls. With ``acall`` the losing request is cancelled. With ``call`` a losing thread cannot be
+    interrupted, so its result is handed to ``on_discard`` when it finishes, and a primary that is still
+    running when its hedge answers is handed to ``on_abandon`` as a future, e.g. to release what it holds
+    once it is done. ``hedge`` sends the duplicate instead of the primary's own callable, e.g. to take a
+    separate concurrency slot and endpoint for it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float = 95,
+        max_extra_fraction: float = 0.1,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        self.name = name
+        self.percentile = percentile
+        self.max_extra_fraction = max_extra_fraction
+        self.min_samples = min_samples
+        self.window = window
+
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+
+        self.num_calls = 0
+        self.num_hedged = 0
+        self.num_hedge_wins = 0
+        self.num_budget_denied = 0
+
+    def record_latency(self, key: str, latency: float):
+        with self._lock:
+            if key not in self._latencies:
+                self._latencies[key] = deque(maxlen=self.window)
+            self._latencies[key].append(latency)
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """The tracked latency percentile for ``key``, or None while there are too few samples."""
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+    def _start_call(self):
+        with self._lock:
+            self.num_calls += 1
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self.num_hedged + 1 > self.max_extra_fraction * self.num_calls:
+                self.num_budget_denied += 1
+                return False
+            self.num_hedged += 1
+            return True
+
+    def _hedge_won(self):
+        with self._lock:
+            self.num_hedge_wins += 1
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        key: str,
+        on_discard: Optional[Callable[[Any], None]] = None,
+        hedge: Optional[Callable[[], Any]] = None,
+        on_abandon: Optional[Callable[[Future], None]] = None,
+    ) -> Any:
+        """Run ``fn`` with hedging. The duplicate runs ``hedge`` (``fn`` by default) alongside it."""
+        self._start_call()
+        delay = self.hedge_delay(key)
+        started = time.monotonic()
+
+        if delay is None:
+            result = fn()
+            self.record_latency(key, time.monotonic() - started)
+            return result
+
+        primary = _spawn(fn)
+        # the primary's own latency keeps the percentile honest even when a hedge beats it
+        primary.add_done_callback(
+            lambda f: f.exception() is None and self.record_latency(key, time.monotonic() - started)
+        )
+        if wait([primary], timeout=delay).done or not self._take_budget():
+            return primary.result()
+
+        pending = {primary, _spawn(hedge or fn)}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    first_error = first_error or future.exception()
+                    continue
+                if future is not primary:
+                    self._hedge_won()
+                    if primary in pending and on_abandon is not None:
+                        on_abandon(primary)
+                for loser in pending:
+                    if on_discard is not None:
+                        loser.add_done_callback(lambda f: f.exception() is None and on_discard(f.result()))
+                return future.result()
+        raise first_error
+
+    async def acall(self, coro_func: Callable[[], Any], key: str, hedge: Optional[Callable[[], Any]] = None) -> Any:
+        """asyncio counterpart of ``call``; the losing request is cancelled."""
+        self._start_call()
+        delay = self.hedge_delay(key)
+        started = time.monotonic()
+
+        if delay is None:
+            result = await coro_func()
+            self.record_latency(key, time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(coro_func())
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or not self._take_budget():
+                result = await primary
+                self.record_latency(key, time.monotonic() - started)
+                return result
+
+            pending.add(asyncio.ensure_future((hedge or coro_func)()))
+            first_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                        continue
+                    if task is not primary:
+                        self._hedge_won()
+                    # if the hedge won, the cancelled primary took at least this long
+                    self.record_latency(key, time.monotonic() - started)
+                    return task.result()
+            raise first_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = list(self._latencies)
+            stats = {
+                "num_calls": self.num_calls,
+                "num_hedged": self.num_hedged,
+                "num_hedge_wins": self.num_hedge_wins,
+                "num_budget_denied": self.num_budget_denied,
+                "extra_call_fraction": round(self.num_hedged / self.num_calls, 4) if self.num_calls else 0.0,
+                "hedge_win_rate": round(self.num_hedge_wins / self.num_hedged, 4) if self.num_hedged else 0.0,
+            }
+        stats["hedge_delay_s"] = {key: self.hedge_delay(key) for key in keys}
+        return stats
+
+
+_policies: Dict[str, HedgePolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_hedge_policy(key: str, **kwargs) -> HedgePolicy:
+    with _policies_lock:
+        if key not in _policies:
+            _policies[key] = HedgePolicy(key, **kwargs)
+        return _policies[key]
+
+
+def get_hedging_report() -> Dict[str, Dict[str, Any]]:
+    with _policies_lock:
+        policies = dict(_policies)
+    return {key: policy.stats() for key, policy in policies.items()}
@@ -0,0 +1,100 @@
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+
+# HTTP/2 needs the optional h2 package; without it connections stay on HTTP/1.1 keep-alive
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# room per worker for a hedge or a fanned out sample next to its main request
+CONNECTIONS_PER_WORKER = 2
+DEFAULT_MAX_CONNECTIONS = 64
+
+DEFAULT_TIMEOUT = 600
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_KEEPALIVE_EXPIRY = 120
+
+_config: Dict[str, Any] = {
+    "max_connections": DEFAULT_MAX_CONNECTIONS,
+    "http2": True,
+    "timeout": DEFAULT_TIMEOUT,
+    "connect_timeout": DEFAULT_CONNECT_TIMEOUT,
+}
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_lock = threading.Lock()
+
+
+def connections_for_workers(num_workers: int) -> int:
+    return max(1, num_workers) * CONNECTIONS_PER_WORKER
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    return {
+        "http2": _config["http2"] and HTTP2_AVAILABLE,
+        "limits": httpx.Limits(
+            max_connections=_config["max_connections"],
+            max_keepalive_connections=_config["max_connections"],
+            keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+        ),
+        # the pool timeout bounds how long a request queues for a free connection
+        "timeout": httpx.Timeout(_config["timeout"], connect=_config["connect_timeout"]),
+    }
+
+
+def configure_http_clients(
+    max_connections: Optional[int] = None,
+    http2: bool = True,
+    timeout: float = DEFAULT_TIMEOUT,
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+):
+    """Set up the shared LLM HTTP clients and install them in litellm.
+
+    Call once at startup, before any LLM traffic; clients already handed out keep their settings.
+    """
+    global _client, _async_client
+    with _lock:
+        _config.update({
+            "max_connections": max_connections or DEFAULT_MAX_CONNECTIONS,
+            "http2": http2,
+            "timeout": timeout,
+            "connect_timeout": connect_timeout,
+        })
+        _client = httpx.Client(**_client_kwargs())
+        _async_client = httpx.AsyncClient(**_client_kwargs())
+
+    try:
+        import litellm
+
+        # litellm builds its OpenAI-compatible clients (including calls through a LiteLLM proxy) on these
+        litellm.client_session = _client
+        litellm.aclient_session = _async_client
+    except ImportError:
+        pass
+
+
+def get_http_client() -> httpx.Client:
+    """The process-wide keep-alive client for synchronous LLM traffic."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = httpx.Client(**_client_kwargs())
+        return _client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """The process-wide keep-alive client for asyncio LLM traffic; use it from a single event loop."""
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = httpx.AsyncClient(**_client_kwargs())
+        return _async_client
+
+
+def get_http_client_config() -> Dict[str, Any]:
+    with _lock:
+        return {**_config, "http2": _config["http2"] and HTTP2_AVAILABLE}
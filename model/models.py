@@ -1,12 +1,32 @@
+import asyncio
+import contextvars
+import inspect
 import os
 import json
 import litellm
 from utils.keystore import auth_litellm
 from tools.helper import get_all_tools_mapping
+from model.batch import run_batch
+from model.concurrency import get_concurrency_controller
+from model.endpoints import load_endpoint_pool
+from model.hedging import get_hedge_policy
+from model.http_client import get_async_http_client, get_http_client
+from model.prompt_caching import apply_cache_control, supports_cache_control
+from model.retry_policy import RetryPolicy, is_rate_limit_error, provider_of
+from model.usage import current_scope, get_usage_tracker, usage_scope
 import OpenSSL
 import requests
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor
+
+
+def supports_n(model):
+    """Whether the provider can return several choices for one request."""
+    try:
+        return "n" in (litellm.get_supported_openai_params(model=model) or [])
+    except Exception:
+        return False
 
 
 class GenerationWrapper:
@@ -17,20 +37,65 @@ class GenerationWrapper:
         self.sampling_params = sampling_params
         self.tool_mapping = get_all_tools_mapping()
     
-    def generate(self, prompt, tool_list=[], historical_date=None):
-        """Generate text with the model."""
+    def generate(self, prompt, tool_list=[], historical_date=None, on_turn=None, raise_errors=False):
+        """Generate text with the model. ``on_turn(start, messages)`` is called after each tool round with the
+        messages it added to the conversation from index ``start`` on: the assistant's tool calls and their results.
+        A generation that fails returns the error text in place of the response, or raises with ``raise_errors``."""
         pass
 
 
 class LiteLLMWrapper(GenerationWrapper):
     """LiteLLM implementation for tool use."""
+
+    max_retries_rate_limit = 15
+    max_retries_other = 3
+    base_delay = 15  # starting delay in seconds
     
-    def __init__(self, model, sampling_params):
+    def __init__(self, model, sampling_params, adaptive_concurrency=False, response_cache=None, prompt_caching=False, hedging=None):
+        # an "endpoints" list in the config is routing, not a sampling param, see model/endpoints.py
+        endpoints = sampling_params.get("endpoints")
+        sampling_params = {key: value for key, value in sampling_params.items() if key != "endpoints"}
         super().__init__(model, sampling_params)
 
+        # duplicate calls that run past a latency percentile, see model/hedging.py; hedging is a dict of HedgePolicy kwargs
+        self.hedge_policy = (
+            get_hedge_policy(sampling_params.get("model", model), **hedging) if hedging is not None else None
+        )
+
+        # least-outstanding routing with failover over several proxies or deployments, if configured
+        self.endpoint_pool = load_endpoint_pool(sampling_params.get("model", model), endpoints)
+
+        # mark static prompt prefixes for providers that need explicit cache_control, see model/prompt_caching.py
+        self.prompt_caching = prompt_caching and supports_cache_control(sampling_params.get("model", model))
+
+        # optional persistent cache of completions, see model/response_cache.py
+        self.response_cache = response_cache
+
+        # several samples from one request where the provider allows it, see generate_n
+        self.supports_n = supports_n(sampling_params.get("model", model))
+
+        # shared AIMD limit on in-flight requests for this model, see model/concurrency.py
+        self.concurrency_controller = (
+            get_concurrency_controller(sampling_params.get("model", model)) if adaptive_concurrency else None
+        )
+
+        # server Retry-After hints pause every caller of this provider together, see model/retry_policy.py
+        self.retry_policy = RetryPolicy(
+            provider_of(sampling_params.get("model", model)),
+            max_retries_rate_limit=self.max_retries_rate_limit,
+            max_retries_other=self.max_retries_other,
+            base_delay=self.base_delay,
+        )
+
         api_key, api_base = auth_litellm()
         litellm.api_key = api_key
         litellm.api_base = api_base
+
+        # one keep-alive connection pool for all LLM traffic, see model/http_client.py
+        if litellm.client_session is None:
+            litellm.client_session = get_http_client()
+        if litellm.aclient_session is None:
+            litellm.aclient_session = get_async_http_client()
     
     def _parse_functions(self, response_message):
         """Parse function/tool calls from response."""
@@ -39,49 +104,218 @@ class LiteLLMWrapper(GenerationWrapper):
         )
         return tool_calls
     
+    def _sampling_params(self, n=1):
+        """Sampling params of a request for ``n`` choices."""
+        return self.sampling_params if n == 1 else {**self.sampling_params, "n": n}
+
+    def _cache_params(self, n=1, sample=None):
+        """Sampling params a response is cached under. Fan-out samples of one prompt (see generate_n) each
+        get their own entry, so a cache that replays sampled responses does not return one sample n times."""
+        params = self._sampling_params(n)
+        return params if sample is None else {**params, "sample": sample}
+
+    def _get_cached_response(self, messages, tools, n=1, sample=None):
+        if self.response_cache is None:
+            return None
+        cached = self.response_cache.get(messages, self._cache_params(n, sample), tools)
+        if cached is None:
+            return None
+        return litellm.ModelResponse(**cached)
+
+    def _get_cached_message(self, messages, tools):
+        cached_response = self._get_cached_response(messages, tools)
+        return cached_response.choices[0].message if cached_response is not None else None
+
+    def _cache_response(self, messages, tools, response, n=1, sample=None):
+        if self.response_cache is not None:
+            self.response_cache.set(messages, self._cache_params(n, sample), response, tools)
+
+    def _record_usage(self, call_started, retry_state=None, response=None, cache_hit=False):
+        """Log one call (all of its attempts) to the run's usage tracker, see model/usage.py."""
+        retry_state = retry_state or self._new_retry_state()
+        get_usage_tracker().record(
+            self.sampling_params.get("model", self.model),
+            response=response,
+            latency=time.monotonic() - call_started,
+            retries=retry_state["rate_limit"] + retry_state["other"],
+            cache_hit=cache_hit,
+            error=retry_state["error"] if response is None and not cache_hit else None,
+        )
+
+    def _request_messages(self, messages):
+        """The messages actually sent; the conversation itself is left without cache markers."""
+        return apply_cache_control(messages) if self.prompt_caching else messages
+
+    def _release_slot(self, started, e=None):
+        if self.concurrency_controller is None:
+            return
+        if e is None:
+            outcome = "success"
+        elif is_rate_limit_error(e):
+            outcome = "rate_limited"
+        else:
+            outcome = "error"
+        self.concurrency_controller.release(started, outcome)
+
+    def _acquire_endpoint(self):
+        """Pick an endpoint and return it with the cooldown to honor before sending to it."""
+        if self.endpoint_pool is None:
+            return None, self.retry_policy.cooldown
+        endpoint = self.endpoint_pool.acquire()
+        return endpoint, endpoint.cooldown
+
+    def _release_endpoint(self, endpoint, e=None, cancelled=False):
+        """Returns True if the failed request can be retried on a healthy sibling without sleeping."""
+        if endpoint is None:
+            return False
+        if cancelled:
+            self.endpoint_pool.cancel(endpoint)
+            return False
+        return self.endpoint_pool.release(endpoint, e)
+
+    def _request_params(self, endpoint, n=1):
+        if endpoint is None:
+            return self._sampling_params(n)
+        return {**self._sampling_params(n), **endpoint.request_params()}
+
+    def _hedge_key(self):
+        return f"{self.sampling_params.get('model', self.model)}/{current_scope()['stage']}"
+
+    def _discarded_response_recorder(self):
+        """Log the tokens of a hedge that lost but could not be cancelled, under the caller's task and stage."""
+        scope = current_scope()
+
+        def record(response):
+            with usage_scope(**scope):
+                get_usage_tracker().record(self.sampling_params.get("model", self.model), response=response)
+        return record
+
+    def _abandoned_release(self, started, endpoint):
+        """Done callback for a request its hedge beat: it keeps its slot and endpoint until it finishes, then
+        releases them with its own outcome, so a late 429 still reaches the controller."""
+        def release(future):
+            e = future.exception()
+            self._release_slot(started, e)
+            self._release_endpoint(endpoint, e)
+        return release
+
+    def _reserved(self, request):
+        """Wrap ``request(endpoint)`` so that it takes its own concurrency slot and endpoint, as a hedge must."""
+        def run():
+            endpoint, cooldown = self._acquire_endpoint()
+            cooldown.wait()
+            started = self.concurrency_controller.acquire() if self.concurrency_controller else None
+            try:
+                response = request(endpoint)
+            except Exception as e:
+                self._release_slot(started, e)
+                self._release_endpoint(endpoint, e)
+                raise
+            self._release_slot(started)
+            self._release_endpoint(endpoint)
+            return response
+        return run
+
+    def _completion(self, messages, tools, endpoint, n=1, stream_until=None, on_abandon=None):
+        def request(endpoint):
+            if stream_until is not None:
+                return self._stream_completion(messages, endpoint, stream_until())
+            return litellm.completion(
+                messages=self._request_messages(messages),
+                tools=tools if tools else None,
+                **self._request_params(endpoint, n)
+            )
+        if self.hedge_policy is None:
+            return request(endpoint)
+        return self.hedge_policy.call(
+            lambda: request(endpoint),
+            self._hedge_key(),
+            on_discard=self._discarded_response_recorder(),
+            hedge=self._reserved(request),
+            on_abandon=on_abandon,
+        )
+
+    def _stream_completion(self, messages, endpoint, parser):
+        """Stream a completion until ``parser.feed`` reports it complete, then close the stream.
+
+        Returns a response assembled from the chunks read so far, with usage counted locally since the
+        provider's usage chunk never arrives once the stream is cut short.
+        """
+        stream = litellm.completion(
+            messages=self._request_messages(messages),
+            stream=True,
+            **self._request_params(endpoint)
+        )
+        chunks = []
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                if chunk.choices and parser.feed(chunk.choices[0].delta.content or ""):
+                    break
+        finally:
+            close = getattr(getattr(stream, "completion_stream", None), "close", None)
+            if close is not None:
+                close()
+        response = litellm.stream_chunk_builder(chunks, messages=messages)
+        response.choices[0].message.content = parser.step
+        return response
+
+    def _new_retry_state(self):
+        return self.retry_policy.new_state()
+
+    def _next_retry_delay(self, e, retry_state, cooldown=None):
+        """Record a failed attempt and return how long to wait before the next one, or None to give up."""
+        # the AIMD controller already shrank the shared limit, so only a short capped pause is needed
+        backoff_delay = self.concurrency_controller.backoff_delay if self.concurrency_controller is not None else None
+        return self.retry_policy.next_delay(e, retry_state, backoff_delay=backoff_delay, cooldown=cooldown)
+
     def _hit_litellm(self, messages, tools=None, tool_choice='auto'):
         """Make a request to LiteLLM API."""
-        max_retries_rate_limit = 15
-        max_retries_other = 3
-        base_delay = 15  # starting delay in seconds
-        retry_count_rate_limit = 0
-        retry_count_other = 0
-        
-        while retry_count_rate_limit < max_retries_rate_limit or retry_count_other < max_retries_other:
+        return self._hit_litellm_response(messages, tools).choices[0].message
+
+    def _hit_litellm_response(self, messages, tools=None, n=1, stream_until=None, sample=None):
+        """Make a request to LiteLLM API for ``n`` choices and return the whole response.
+
+        With ``stream_until`` (a parser factory, see _stream_completion) the response is streamed and cut
+        off as soon as the parser has what it needs. ``sample`` is the index of a fan-out sample, see _cache_params.
+        """
+        call_started = time.monotonic()
+        cached_response = self._get_cached_response(messages, tools, n, sample)
+        if cached_response is not None:
+            self._record_usage(call_started, cache_hit=True)
+            return cached_response
+
+        retry_state = self._new_retry_state()
+
+        while True:
+            endpoint, cooldown = self._acquire_endpoint()
+            cooldown.wait()
+            started = self.concurrency_controller.acquire() if self.concurrency_controller else None
+            # the request itself if a hedge answered while it was still running
+            abandoned = []
             try:
                 litellm.drop_params = True
-                response = litellm.completion(
-                    messages=messages,
-                    tools=tools if tools else None,
-                    **self.sampling_params
-                )
-                return response.choices[0].message
+                response = self._completion(messages, tools, endpoint, n, stream_until, on_abandon=abandoned.append)
             except Exception as e:
-                error = e
-                
-                # Only apply exponential backoff for rate limit errors
-                if "litellm.RateLimitError" in str(e):
-                    retry_count_rate_limit += 1
-                    if retry_count_rate_limit >= max_retries_rate_limit:
-                        break
-                    # Calculate delay with exponential backoff and jitter
-                    delay = base_delay * (2 ** (retry_count_rate_limit - 1))  # exponential increase
-                    delay = delay * (0.5 + random.random())  # add jitter (50-150% of delay)
-                    if "litellm.RateLimitError" in str(e):
-                        print(f"LiteLLM rate limit error, retrying with backoff in {delay:.2f}s (attempt {retry_count_rate_limit}/{max_retries_rate_limit})")
-
-                else:
-                    print(e)
-                    retry_count_other += 1
-                    if retry_count_other >= max_retries_other:
-                        break
-                    # For other errors, use a simple fixed delay
-                    delay = 15
-                    print(f"LiteLLM request failed, retrying in {delay}s (attempt {retry_count_other}/{max_retries_other})")
-                
-                time.sleep(delay)
-        
-        raise Exception(f"Max retries ({max_retries_rate_limit}) exceeded: {error}")
+                self._release_slot(started, e)
+                failover = self._release_endpoint(endpoint, e)
+                delay = self._next_retry_delay(e, retry_state, cooldown)
+                if delay is None:
+                    break
+                if not failover:
+                    self.retry_policy.sleep(delay, cooldown)
+                continue
+            if abandoned:
+                abandoned[0].add_done_callback(self._abandoned_release(started, endpoint))
+            else:
+                self._release_slot(started)
+                self._release_endpoint(endpoint)
+            self._cache_response(messages, tools, response, n, sample)
+            self._record_usage(call_started, retry_state, response=response)
+            return response
+
+        self._record_usage(call_started, retry_state)
+        raise Exception(f"Max retries ({self.max_retries_rate_limit}) exceeded: {retry_state['error']}")
     
     def _call_tools(self, messages, tool_calls, tool_list, historical_date=None):
         """Call the tools and add responses to messages."""
@@ -113,7 +347,7 @@ class LiteLLMWrapper(GenerationWrapper):
             )
         return messages
 
-    def _generate(self, messages, tool_list=[], historical_date=None):
+    def _generate(self, messages, tool_list=[], historical_date=None, on_turn=None):
         """Generate a response with tool use."""
         tools = [self.tool_mapping[tool].get_gpt_spec() for tool in tool_list if tool in tool_list]
         response_message = self._hit_litellm(messages, tools, tool_choice='auto')
@@ -128,7 +362,10 @@ class LiteLLMWrapper(GenerationWrapper):
         steps = 0
         
         while tool_calls and steps < max_steps:
+            turn_start = len(messages) - 1
             messages = self._call_tools(messages, tool_calls, tool_list, historical_date)
+            if on_turn is not None:
+                on_turn(turn_start, messages[turn_start:])
             response_message = self._hit_litellm(messages, tools, tool_choice='auto')
             tool_calls = self._parse_functions(response_message)
             
@@ -141,18 +378,312 @@ class LiteLLMWrapper(GenerationWrapper):
         
         return messages[-1]["content"], messages
 
-    def generate(self, prompt, tool_list=[], historical_date=None):
+    def generate(self, prompt, tool_list=[], historical_date=None, on_turn=None, raise_errors=False):
         """Generate a response with tool use, with retries."""
         max_retries = 5
         while True:
             try:
                 messages = prompt.copy()
-                final_output_text, full_message_history = self._generate(messages, tool_list, historical_date)
+                final_output_text, full_message_history = self._generate(messages, tool_list, historical_date, on_turn)
                 break
             except Exception as e:
                 max_retries -= 1
                 if max_retries == 0:
+                    if raise_errors:
+                        raise
                     print(f"Error in generation: {e}")
                     return str(e), prompt
         
         return final_output_text, full_message_history
+
+    def generate_stream(self, prompt, stream_until):
+        """Generate a tool-free completion by streaming it and stop reading once it is complete.
+
+        ``stream_until`` builds a parser with ``feed(delta) -> bool`` and a ``step`` property, e.g.
+        ``tree.react_stream.ReActStreamParser``; the returned text is its ``step``. Tokens after that point
+        are not waited for. Returns the same ``(text, messages)`` pair as ``generate``.
+        """
+        try:
+            response = self._hit_litellm_response(prompt.copy(), [], stream_until=stream_until)
+        except Exception as e:
+            print(f"Error in generation: {e}")
+            return str(e), prompt
+        return response.choices[0].message.content, prompt
+
+    def generate_n(self, prompt, n):
+        """Sample ``n`` completions of a tool-free prompt.
+
+        Providers that take an ``n`` parameter return all samples from one request, so the prompt is sent
+        and processed once. Otherwise, or if that request fails, the samples are requested in parallel.
+        """
+        if n == 1:
+            return [self.generate(prompt)[0]]
+        samples = []
+        if self.supports_n:
+            try:
+                response = self._hit_litellm_response(prompt.copy(), [], n)
+                samples = [choice.message.content for choice in response.choices]
+            except Exception as e:
+                print(f"Error in generation with n={n}: {e}")
+        # some providers return fewer choices than asked for
+        missing = n - len(samples)
+        if missing > 0:
+            with ThreadPoolExecutor(max_workers=missing) as executor:
+                futures = [
+                    executor.submit(contextvars.copy_context().run, self._generate_sample, prompt, sample)
+                    for sample in range(len(samples), n)
+                ]
+                samples.extend(future.result() for future in futures)
+        return samples[:n]
+
+    def _generate_sample(self, prompt, sample):
+        """One of the samples ``generate_n`` requests on its own, cached apart from the others."""
+        try:
+            return self._hit_litellm_response(prompt.copy(), [], sample=sample).choices[0].message.content
+        except Exception as e:
+            print(f"Error in generation: {e}")
+            return str(e)
+
+    def batch_generate(self, prompts, tasks=None, poll_interval=30):
+        """Complete tool-free prompts as one provider batch job, see model/batch.py.
+
+        ``tasks`` labels each prompt for usage accounting. Cached prompts are not resubmitted, and
+        prompts the batch could not answer fall back to ``generate``.
+        """
+        tasks = tasks if tasks is not None else [None] * len(prompts)
+        outputs = [None] * len(prompts)
+        pending = []
+        for i, prompt in enumerate(prompts):
+            with usage_scope(task=tasks[i]):
+                cached_message = self._get_cached_message(prompt, [])
+                if cached_message is not None:
+                    self._record_usage(time.monotonic(), cache_hit=True)
+                    outputs[i] = cached_message['content']
+                    continue
+            pending.append(i)
+
+        if pending:
+            results = run_batch(
+                [(tasks[i], self._request_messages(prompts[i])) for i in pending],
+                self.sampling_params,
+                poll_interval=poll_interval,
+            )
+            for i, result in zip(pending, results):
+                if result["content"] is None:
+                    with usage_scope(task=tasks[i]):
+                        outputs[i] = self.generate(prompts[i])[0]
+                    continue
+                outputs[i] = result["content"]
+                self._cache_response(prompts[i], [], {
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": result["content"]}}],
+                })
+        return outputs
+
+
+class AsyncLiteLLMWrapper(LiteLLMWrapper):
+    """asyncio-native LiteLLM implementation built on ``litellm.acompletion``.
+
+    ``agenerate`` has the same retry semantics and return shapes as ``generate``, but waits on
+    network I/O and backoff without holding a thread, so a single event loop can keep hundreds of
+    conversations in flight. Tools are still synchronous and run in the default thread pool.
+    The synchronous ``generate`` is inherited unchanged.
+    """
+
+    async def _ahit_litellm(self, messages, tools=None, tool_choice='auto'):
+        """Make an asynchronous request to LiteLLM API."""
+        return (await self._ahit_litellm_response(messages, tools)).choices[0].message
+
+    async def _ahit_litellm_response(self, messages, tools=None, n=1, stream_until=None, sample=None):
+        """Make an asynchronous request to LiteLLM API for ``n`` choices and return the whole response.
+
+        ``stream_until`` streams the response and cuts it off early, as in ``_hit_litellm_response``.
+        """
+        call_started = time.monotonic()
+        cached_response = self._get_cached_response(messages, tools, n, sample)
+        if cached_response is not None:
+            self._record_usage(call_started, cache_hit=True)
+            return cached_response
+
+        retry_state = self._new_retry_state()
+
+        while True:
+            endpoint, cooldown = self._acquire_endpoint()
+            try:
+                await cooldown.wait_async()
+                started = await self.concurrency_controller.acquire_async() if self.concurrency_controller else None
+            except asyncio.CancelledError:
+                self._release_endpoint(endpoint, cancelled=True)
+                raise
+            try:
+                litellm.drop_params = True
+                response = await self._acompletion(messages, tools, endpoint, n, stream_until)
+            except asyncio.CancelledError as e:
+                self._release_slot(started, e)
+                self._release_endpoint(endpoint, cancelled=True)
+                raise
+            except Exception as e:
+                self._release_slot(started, e)
+                failover = self._release_endpoint(endpoint, e)
+                delay = self._next_retry_delay(e, retry_state, cooldown)
+                if delay is None:
+                    break
+                if not failover:
+                    await self.retry_policy.sleep_async(delay, cooldown)
+                continue
+            self._release_slot(started)
+            self._release_endpoint(endpoint)
+            self._cache_response(messages, tools, response, n, sample)
+            self._record_usage(call_started, retry_state, response=response)
+            return response
+
+        self._record_usage(call_started, retry_state)
+        raise Exception(f"Max retries ({self.max_retries_rate_limit}) exceeded: {retry_state['error']}")
+
+    def _areserved(self, request):
+        """asyncio counterpart of ``_reserved``; a cancelled hedge gives its slot and endpoint back."""
+        async def run():
+            endpoint, cooldown = self._acquire_endpoint()
+            try:
+                await cooldown.wait_async()
+                started = await self.concurrency_controller.acquire_async() if self.concurrency_controller else None
+            except asyncio.CancelledError:
+                self._release_endpoint(endpoint, cancelled=True)
+                raise
+            try:
+                response = await request(endpoint)
+            except asyncio.CancelledError as e:
+                self._release_slot(started, e)
+                self._release_endpoint(endpoint, cancelled=True)
+                raise
+            except Exception as e:
+                self._release_slot(started, e)
+                self._release_endpoint(endpoint, e)
+                raise
+            self._release_slot(started)
+            self._release_endpoint(endpoint)
+            return response
+        return run
+
+    async def _acompletion(self, messages, tools, endpoint, n=1, stream_until=None):
+        def request(endpoint):
+            if stream_until is not None:
+                return self._astream_completion(messages, endpoint, stream_until())
+            return litellm.acompletion(
+                messages=self._request_messages(messages),
+                tools=tools if tools else None,
+                **self._request_params(endpoint, n)
+            )
+        if self.hedge_policy is None:
+            return await request(endpoint)
+        return await self.hedge_policy.acall(lambda: request(endpoint), self._hedge_key(), hedge=self._areserved(request))
+
+    async def _astream_completion(self, messages, endpoint, parser):
+        """asyncio counterpart of ``_stream_completion``."""
+        stream = await litellm.acompletion(
+            messages=self._request_messages(messages),
+            stream=True,
+            **self._request_params(endpoint)
+        )
+        chunks = []
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                if chunk.choices and parser.feed(chunk.choices[0].delta.content or ""):
+                    break
+        finally:
+            completion_stream = getattr(stream, "completion_stream", None)
+            close = getattr(completion_stream, "aclose", None) or getattr(completion_stream, "close", None)
+            if close is not None:
+                closed = close()
+                if inspect.isawaitable(closed):
+                    await closed
+        response = litellm.stream_chunk_builder(chunks, messages=messages)
+        response.choices[0].message.content = parser.step
+        return response
+
+    async def _acall_tools(self, messages, tool_calls, tool_list, historical_date=None):
+        """Call the tools off the event loop and add responses to messages."""
+        return await asyncio.to_thread(self._call_tools, messages, tool_calls, tool_list, historical_date)
+
+    async def _agenerate(self, messages, tool_list=[], historical_date=None, on_turn=None):
+        """Generate a response with tool use without blocking the event loop."""
+        tools = [self.tool_mapping[tool].get_gpt_spec() for tool in tool_list if tool in tool_list]
+        response_message = await self._ahit_litellm(messages, tools, tool_choice='auto')
+
+        if not tools:
+            return response_message['content'], messages
+
+        tool_calls = self._parse_functions(response_message)
+
+        messages.append(response_message)  # extend conversation with assistant's reply
+        max_steps = 100  # limit the number of tool call iterations
+        steps = 0
+
+        while tool_calls and steps < max_steps:
+            turn_start = len(messages) - 1
+            messages = await self._acall_tools(messages, tool_calls, tool_list, historical_date)
+            if on_turn is not None:
+                on_turn(turn_start, messages[turn_start:])
+            response_message = await self._ahit_litellm(messages, tools, tool_choice='auto')
+            tool_calls = self._parse_functions(response_message)
+
+            messages.append(response_message)
+            steps += 1
+
+        messages = [
+            message.dict() if not isinstance(message, dict) else message for message in messages
+        ]
+
+        return messages[-1]["content"], messages
+
+    async def agenerate_stream(self, prompt, stream_until):
+        """asyncio counterpart of ``generate_stream``."""
+        try:
+            response = await self._ahit_litellm_response(prompt.copy(), [], stream_until=stream_until)
+        except Exception as e:
+            print(f"Error in generation: {e}")
+            return str(e), prompt
+        return response.choices[0].message.content, prompt
+
+    async def agenerate_n(self, prompt, n):
+        """asyncio counterpart of ``generate_n``."""
+        if n == 1:
+            return [(await self.agenerate(prompt))[0]]
+        samples = []
+        if self.supports_n:
+            try:
+                response = await self._ahit_litellm_response(prompt.copy(), [], n)
+                samples = [choice.message.content for choice in response.choices]
+            except Exception as e:
+                print(f"Error in generation with n={n}: {e}")
+        missing = n - len(samples)
+        if missing > 0:
+            outputs = await asyncio.gather(*[self._agenerate_sample(prompt, sample) for sample in range(len(samples), n)])
+            samples.extend(outputs)
+        return samples[:n]
+
+    async def _agenerate_sample(self, prompt, sample):
+        """asyncio counterpart of ``_generate_sample``."""
+        try:
+            return (await self._ahit_litellm_response(prompt.copy(), [], sample=sample)).choices[0].message.content
+        except Exception as e:
+            print(f"Error in generation: {e}")
+            return str(e)
+
+    async def agenerate(self, prompt, tool_list=[], historical_date=None, on_turn=None, raise_errors=False):
+        """Generate a response with tool use, with retries."""
+        max_retries = 5
+        while True:
+            try:
+                messages = prompt.copy()
+                final_output_text, full_message_history = await self._agenerate(messages, tool_list, historical_date, on_turn)
+                break
+            except Exception as e:
+                max_retries -= 1
+                if max_retries == 0:
+                    if raise_errors:
+                        raise
+                    print(f"Error in generation: {e}")
+                    return str(e), prompt
+
+        return final_output_text, full_message_history
@@ -0,0 +1,79 @@
+import copy
+from typing import Any, Dict, List
+
+from model.response_cache import to_jsonable
+from model.retry_policy import provider_of
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Anthropic accepts at most four cache breakpoints per request
+MAX_BREAKPOINTS = 4
+
+CACHE_CONTROL_PROVIDERS = {"anthropic", "bedrock", "vertex_ai"}
+
+
+def supports_cache_control(model: str) -> bool:
+    """Whether the model needs explicit ``cache_control`` markers.
+
+    OpenAI, Azure and DeepSeek cache shared prefixes automatically, so for them it is enough that
+    prompt builders keep static content first and nothing needs to be marked.
+    """
+    if not model:
+        return False
+    return "claude" in model.lower() and (provider_of(model) in CACHE_CONTROL_PROVIDERS or "/" not in model)
+
+
+def _has_breakpoint(message: Dict[str, Any]) -> bool:
+    content = message.get("content")
+    if isinstance(content, list):
+        return any(isinstance(block, dict) and "cache_control" in block for block in content)
+    return "cache_control" in message
+
+
+def _mark(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of ``message`` with a breakpoint on its last text block."""
+    message = dict(message)
+    content = message.get("content")
+    if isinstance(content, str) and content:
+        message["content"] = [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+    elif isinstance(content, list) and content:
+        content = copy.deepcopy(content)
+        content[-1]["cache_control"] = CACHE_CONTROL
+        message["content"] = content
+    return message
+
+
+def text_blocks(static: str, dynamic: str) -> List[Dict[str, Any]]:
+    """Message content with a breakpoint after ``static``, for prompts that put both in one message."""
+    return [
+        {"type": "text", "text": static, "cache_control": CACHE_CONTROL},
+        {"type": "text", "text": dynamic},
+    ]
+
+
+def apply_cache_control(messages: List[Any]) -> List[Any]:
+    """Mark the static prefix of a chat request for provider prompt caching.
+
+    Breakpoints go on the system messages (prompt, tool specs) and, for multi-turn requests, on the
+    message just before the newest one, so each turn reads everything the previous turn wrote.
+    Markers the prompt builder already placed are kept. The input list is not modified.
+    """
+    messages = list(messages)
+    breakpoints = sum(1 for message in messages if isinstance(message, dict) and _has_breakpoint(message))
+
+    candidates = [i for i, message in enumerate(messages) if isinstance(message, dict) and message.get("role") == "system"]
+    if len(messages) > 2:
+        candidates.append(len(messages) - 2)
+
+    for i in candidates:
+        message = messages[i]
+        if breakpoints >= MAX_BREAKPOINTS:
+            break
+        if not isinstance(message, dict):
+            # assistant replies are appended as litellm message objects
+            message = to_jsonable(message)
+        if _has_breakpoint(message) or not message.get("content"):
+            continue
+        messages[i] = _mark(message)
+        breakpoints += 1
+    return messages
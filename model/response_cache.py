@@ -0,0 +1,108 @@
+import hashlib
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+from utils.disk_cache import DiskCache
+
+DEFAULT_MAX_SIZE_MB = 2048
+
+
+def to_jsonable(value: Any) -> Any:
+    """Turn litellm/OpenAI message objects into plain JSON so they hash the same as dicts."""
+    if hasattr(value, "model_dump"):
+        value = value.model_dump()
+    elif hasattr(value, "dict") and not isinstance(value, dict):
+        value = value.dict()
+    if isinstance(value, dict):
+        # unset optional fields serialize as None on objects but are missing from dicts
+        return {k: to_jsonable(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    return value
+
+
+class LLMResponseCache:
+    """Persistent cache of LLM responses keyed by model, messages, tools and sampling params.
+
+    Only deterministic requests (``temperature`` 0) are cached unless ``any_temperature`` is set,
+    in which case the first sample drawn for a request is replayed for every identical request. The
+    samples ``generate_n`` requests one by one carry their index in the sampling params, so they are
+    cached as distinct requests.
+    The underlying sqlite file is safe to share between threads and processes and evicts least
+    recently used entries past ``max_size_mb``.
+    """
+
+    def __init__(self, path: str, max_size_mb: int = DEFAULT_MAX_SIZE_MB, any_temperature: bool = False):
+        self.cache = DiskCache(path, max_size_bytes=max_size_mb * 1024 * 1024)
+        self.any_temperature = any_temperature
+
+    def is_cacheable(self, sampling_params: Dict[str, Any]) -> bool:
+        if self.any_temperature:
+            return True
+        temperature = sampling_params.get("temperature")
+        return temperature is not None and float(temperature) == 0.0
+
+    def make_key(
+        self,
+        messages: Any,
+        sampling_params: Dict[str, Any],
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> str:
+        payload = json.dumps(
+            {
+                "model": sampling_params.get("model"),
+                "messages": to_jsonable(messages),
+                "tools": to_jsonable(tools) if tools else None,
+                "sampling_params": to_jsonable(sampling_params),
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(
+        self,
+        messages: Any,
+        sampling_params: Dict[str, Any],
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> Optional[Any]:
+        if not self.is_cacheable(sampling_params):
+            return None
+        return self.cache.get(self.make_key(messages, sampling_params, tools))
+
+    def set(
+        self,
+        messages: Any,
+        sampling_params: Dict[str, Any],
+        value: Any,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ):
+        if not self.is_cacheable(sampling_params):
+            return
+        self.cache.set(self.make_key(messages, sampling_params, tools), to_jsonable(value))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "evictions": self.cache.evictions,
+        }
+
+
+_caches: Dict[str, LLMResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(
+    path: Optional[str],
+    max_size_mb: int = DEFAULT_MAX_SIZE_MB,
+    any_temperature: bool = False,
+) -> Optional[LLMResponseCache]:
+    """Return the process-wide cache for ``path`` (one sqlite connection per file), or None if disabled."""
+    if not path:
+        return None
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = LLMResponseCache(path, max_size_mb=max_size_mb, any_temperature=any_temperature)
+        return _caches[path]
@@ -0,0 +1,23 @@
+from typing import Any, Dict, List, Tuple
+
+# Reasoning models that are called through OpenAI's Responses API rather than Chat Completions
+RESPONSES_API_MODELS = ("o1", "o3")
+
+
+def uses_responses_api(model: str) -> bool:
+    """``"openai/o3-mini"`` -> True; the provider prefix is ignored."""
+    if not model:
+        return False
+    return model.split("/")[-1].startswith(RESPONSES_API_MODELS)
+
+
+def build_request(messages: List[Dict[str, Any]], sampling_config: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    The litellm function to call (``"responses"`` or ``"completion"``) and its keyword arguments.
+
+    Both APIs get the same chat messages, so a system prompt and any ``cache_control`` markers reach the
+    model whichever API serves it.
+    """
+    if uses_responses_api(sampling_config.get("model")):
+        return "responses", {"input": messages, **sampling_config}
+    return "completion", {"messages": messages, "thinking": None, **sampling_config}
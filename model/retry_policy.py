@@ -0,0 +1,236 @@
+import asyncio
+import datetime
+import email.utils
+import random
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+
+RESET_HEADER_PAIRS = [
+    # (reset header, matching remaining header)
+    ("x-ratelimit-reset-requests", "x-ratelimit-remaining-requests"),
+    ("x-ratelimit-reset-tokens", "x-ratelimit-remaining-tokens"),
+    ("anthropic-ratelimit-requests-reset", "anthropic-ratelimit-requests-remaining"),
+    ("anthropic-ratelimit-tokens-reset", "anthropic-ratelimit-tokens-remaining"),
+    ("anthropic-ratelimit-input-tokens-reset", "anthropic-ratelimit-input-tokens-remaining"),
+    ("anthropic-ratelimit-output-tokens-reset", "anthropic-ratelimit-output-tokens-remaining"),
+]
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+MESSAGE_HINT = re.compile(r"(?:try again|retry after|retry in)\s+(?:in\s+)?(\d+(?:\.\d+)?)\s*(ms|milliseconds|s|sec|seconds)?", re.IGNORECASE)
+
+
+def _response_headers(e: BaseException) -> Dict[str, str]:
+    headers = getattr(e, "litellm_response_headers", None) or getattr(e, "headers", None)
+    if not headers:
+        response = getattr(e, "response", None)
+        headers = getattr(response, "headers", None)
+    if not headers:
+        return {}
+    try:
+        return {str(k).lower(): str(v) for k, v in headers.items()}
+    except Exception:
+        return {}
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parse ``"20"``, ``"1.5s"``, ``"120ms"`` or ``"6m0s"`` into seconds."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts or "".join(number + unit for number, unit in parts) != value:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def _parse_timestamp(value: str) -> Optional[float]:
+    """Parse an RFC 3339 or HTTP date into seconds from now."""
+    when = None
+    try:
+        when = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def _parse_reset(value: str) -> Optional[float]:
+    seconds = _parse_duration(value)
+    return seconds if seconds is not None else _parse_timestamp(value)
+
+
+def retry_after_seconds(e: BaseException) -> Optional[float]:
+    """Read how long the server asked us to wait from a litellm or OpenAI exception, if it said."""
+    headers = _response_headers(e)
+
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if "retry-after" in headers:
+        seconds = _parse_reset(headers["retry-after"])
+        if seconds is not None:
+            return seconds
+
+    resets = []
+    for reset_header, remaining_header in RESET_HEADER_PAIRS:
+        if reset_header not in headers:
+            continue
+        # only the exhausted limit matters, the others may reset much sooner or later
+        if headers.get(remaining_header, "0").strip() not in ("0", ""):
+            continue
+        seconds = _parse_reset(headers[reset_header])
+        if seconds is not None:
+            resets.append(seconds)
+    if resets:
+        return max(resets)
+
+    match = MESSAGE_HINT.search(str(e))
+    if match:
+        seconds = float(match.group(1))
+        return seconds / 1000 if (match.group(2) or "").lower().startswith("m") else seconds
+    return None
+
+
+def is_rate_limit_error(e: BaseException) -> bool:
+    if type(e).__name__ == "RateLimitError" or getattr(e, "status_code", None) == 429:
+        return True
+    return "RateLimitError" in str(e)
+
+
+def provider_of(model: Optional[str]) -> str:
+    """``"openai/gpt-4o"`` -> ``"openai"``; bare model names are their own provider."""
+    if not model:
+        return "default"
+    return model.split("/")[0] if "/" in model else model
+
+
+class ProviderCooldown:
+    """A shared "do not send before" time for every caller talking to one provider."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self._until = 0.0
+        self._lock = threading.Lock()
+        self.num_cooldowns = 0
+
+    def extend(self, seconds: float):
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._until:
+                self._until = until
+                self.num_cooldowns += 1
+
+    def remaining(self) -> float:
+        with self._lock:
+            return max(0.0, self._until - time.monotonic())
+
+    def wait(self):
+        remaining = self.remaining()
+        while remaining > 0:
+            time.sleep(remaining)
+            remaining = self.remaining()
+
+    async def wait_async(self):
+        remaining = self.remaining()
+        while remaining > 0:
+            await asyncio.sleep(remaining)
+            remaining = self.remaining()
+
+
+_cooldowns: Dict[str, ProviderCooldown] = {}
+_cooldowns_lock = threading.Lock()
+
+
+def get_provider_cooldown(provider: str) -> ProviderCooldown:
+    with _cooldowns_lock:
+        if provider not in _cooldowns:
+            _cooldowns[provider] = ProviderCooldown(provider)
+        return _cooldowns[provider]
+
+
+class RetryPolicy:
+    """Retry bookkeeping shared by generation, grading and judging.
+
+    Rate limit errors honor ``Retry-After`` and rate limit reset headers when the server sends them.
+    A server hint also opens a cooldown window for the whole provider, so every thread pauses
+    together and resumes together instead of hammering the endpoint. Without a hint, rate limit
+    errors back off exponentially with jitter up to ``max_delay``. Other errors wait ``other_delay``.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        max_retries_rate_limit: int = 15,
+        max_retries_other: int = 3,
+        base_delay: float = 15,
+        max_delay: float = 600,
+        other_delay: float = 15,
+        name: str = "LiteLLM",
+    ):
+        self.cooldown = get_provider_cooldown(provider)
+        self.max_retries_rate_limit = max_retries_rate_limit
+        self.max_retries_other = max_retries_other
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.other_delay = other_delay
+        self.name = name
+
+    def new_state(self) -> Dict:
+        return {"rate_limit": 0, "other": 0, "error": None}
+
+    def backoff_delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))  # exponential increase
+        return delay * (0.5 + random.random())  # add jitter (50-150% of delay)
+
+    def next_delay(self, e: BaseException, state: Dict, backoff_delay=None, cooldown: Optional[ProviderCooldown] = None) -> Optional[float]:
+        """Record a failed attempt and return how long to wait before the next one, or None to give up.
+
+        ``backoff_delay`` replaces the default exponential schedule for rate limit errors that carry
+        no server hint (the AIMD controller passes its own short capped backoff). ``cooldown`` replaces
+        the provider-wide cooldown a server hint extends (endpoint pools keep one per endpoint).
+        """
+        state["error"] = e
+        cooldown = cooldown or self.cooldown
+
+        if is_rate_limit_error(e):
+            state["rate_limit"] += 1
+            if state["rate_limit"] >= self.max_retries_rate_limit:
+                return None
+            hint = retry_after_seconds(e)
+            if hint is not None:
+                delay = min(self.max_delay, hint) * (1 + 0.1 * random.random())
+                cooldown.extend(delay)
+                print(f"{self.name} rate limit error, provider {cooldown.provider} asked to wait, cooling down for {delay:.2f}s (attempt {state['rate_limit']}/{self.max_retries_rate_limit})")
+            else:
+                delay = (backoff_delay or self.backoff_delay)(state["rate_limit"])
+                print(f"{self.name} rate limit error, retrying with backoff in {delay:.2f}s (attempt {state['rate_limit']}/{self.max_retries_rate_limit})")
+        else:
+            print(e)
+            state["other"] += 1
+            if state["other"] >= self.max_retries_other:
+                return None
+            delay = self.other_delay
+            print(f"{self.name} request failed, retrying in {delay}s (attempt {state['other']}/{self.max_retries_other})")
+        return delay
+
+    def sleep(self, delay: float, cooldown: Optional[ProviderCooldown] = None):
+        """Sleep out our own delay, then any cooldown set meanwhile by other callers: the provider-wide one, or
+        ``cooldown`` if given (an endpoint's own, so one endpoint's Retry-After does not pause its siblings)."""
+        time.sleep(delay)
+        (cooldown or self.cooldown).wait()
+
+    async def sleep_async(self, delay: float, cooldown: Optional[ProviderCooldown] = None):
+        await asyncio.sleep(delay)
+        await (cooldown or self.cooldown).wait_async()
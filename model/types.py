@@ -7,3 +7,4 @@ class GENERATION_STRATEGY(Enum):
     """
     OPEN_AI_COMPLETION = 'open_ai_completion'
     LITELLM = 'litellm'
+    LITELLM_ASYNC = 'litellm_async'
@@ -0,0 +1,208 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+STAGE_ACTION_PLAN = "action_plan"
+STAGE_REACT_STEP = "react_step"
+STAGE_NATIVE_TURN = "native_turn"
+STAGE_GRADING = "grading"
+STAGE_JUDGING = "judging"
+
+COUNTERS = [
+    "calls",
+    "failed_calls",
+    "cache_hits",
+    "retries",
+    "prompt_tokens",
+    "completion_tokens",
+    "reasoning_tokens",
+    "cached_tokens",
+    "cache_write_tokens",
+    "latency_s",
+    "cost_usd",
+]
+
+# set by the inference code around each task and stage; contextvars follow both threads and coroutines
+_current_task = contextvars.ContextVar("usage_task", default=None)
+_current_stage = contextvars.ContextVar("usage_stage", default=None)
+
+
+@contextlib.contextmanager
+def usage_scope(task: Any = None, stage: Optional[str] = None):
+    """Attribute every LLM call made inside the block to ``task`` and/or ``stage``."""
+    tokens = []
+    if task is not None:
+        tokens.append((_current_task, _current_task.set(task)))
+    if stage is not None:
+        tokens.append((_current_stage, _current_stage.set(stage)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_scope() -> Dict[str, Any]:
+    """The task and stage in scope, to re-enter with ``usage_scope(**scope)`` from another thread."""
+    return {"task": _current_task.get(), "stage": _current_stage.get()}
+
+
+def _field(obj: Any, name: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def extract_usage(response: Any) -> Dict[str, int]:
+    """Read token counts from a chat completions or responses API result (objects or dicts)."""
+    usage = _field(response, "usage")
+    prompt_tokens = _field(usage, "prompt_tokens")
+    if prompt_tokens is None:
+        prompt_tokens = _field(usage, "input_tokens")
+    completion_tokens = _field(usage, "completion_tokens")
+    if completion_tokens is None:
+        completion_tokens = _field(usage, "output_tokens")
+
+    completion_details = _field(usage, "completion_tokens_details") or _field(usage, "output_tokens_details")
+    prompt_details = _field(usage, "prompt_tokens_details") or _field(usage, "input_tokens_details")
+    cached_tokens = _field(prompt_details, "cached_tokens")
+    if cached_tokens is None:
+        # anthropic reports prompt cache reads separately
+        cached_tokens = _field(usage, "cache_read_input_tokens")
+
+    return {
+        "prompt_tokens": prompt_tokens or 0,
+        "completion_tokens": completion_tokens or 0,
+        "reasoning_tokens": _field(completion_details, "reasoning_tokens") or 0,
+        "cached_tokens": cached_tokens or 0,
+        # anthropic bills prompt cache writes at a premium
+        "cache_write_tokens": _field(usage, "cache_creation_input_tokens") or 0,
+    }
+
+
+def estimate_cost(model: str, usage: Dict[str, int]) -> Optional[float]:
+    """Estimate the dollar cost of a call from litellm's price table, or None if the model is unknown."""
+    try:
+        import litellm
+
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model,
+            prompt_tokens=usage["prompt_tokens"],
+            completion_tokens=usage["completion_tokens"],
+        )
+        return prompt_cost + completion_cost
+    except Exception:
+        return None
+
+
+class UsageTracker:
+    """Thread-safe log of every LLM call with totals per run, per stage and per task."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: List[Dict[str, Any]] = []
+
+    def record(
+        self,
+        model: str,
+        response: Any = None,
+        latency: float = 0.0,
+        retries: int = 0,
+        cache_hit: bool = False,
+        error: Optional[BaseException] = None,
+    ) -> Dict[str, Any]:
+        """Record one logical call. ``latency`` spans all attempts, including backoff."""
+        # replayed responses cost nothing, so only fresh responses contribute tokens
+        usage = extract_usage(response) if response is not None and not cache_hit else extract_usage(None)
+        call = {
+            "task": _current_task.get(),
+            "stage": _current_stage.get(),
+            "model": model,
+            "timestamp": time.time(),
+            "latency_s": latency,
+            "retries": retries,
+            "cache_hit": cache_hit,
+            "error": str(error) if error is not None else None,
+            **usage,
+            "cost_usd": estimate_cost(model, usage) if any(usage.values()) else 0.0,
+        }
+        with self._lock:
+            self.calls.append(call)
+        return call
+
+    @staticmethod
+    def _aggregate(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        totals = {counter: 0 for counter in COUNTERS}
+        unpriced = 0
+        for call in calls:
+            totals["calls"] += 1
+            totals["failed_calls"] += call["error"] is not None
+            totals["cache_hits"] += call["cache_hit"]
+            for counter in ["retries", "prompt_tokens", "completion_tokens", "reasoning_tokens", "cached_tokens", "cache_write_tokens", "latency_s"]:
+                totals[counter] += call[counter]
+            if call["cost_usd"] is None:
+                unpriced += 1
+            else:
+                totals["cost_usd"] += call["cost_usd"]
+        totals["latency_s"] = round(totals["latency_s"], 3)
+        totals["cost_usd"] = round(totals["cost_usd"], 6)
+        totals["mean_latency_s"] = round(totals["latency_s"] / totals["calls"], 3) if totals["calls"] else 0.0
+        totals["cached_token_rate"] = (
+            round(totals["cached_tokens"] / totals["prompt_tokens"], 4) if totals["prompt_tokens"] else 0.0
+        )
+        if unpriced:
+            # calls to models missing from litellm's price table are left out of cost_usd
+            totals["unpriced_calls"] = unpriced
+        return totals
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = list(self.calls)
+
+        by_stage = defaultdict(list)
+        by_task = defaultdict(list)
+        for call in calls:
+            by_stage[str(call["stage"])].append(call)
+            by_task[str(call["task"])].append(call)
+
+        per_task = {}
+        for task, task_calls in by_task.items():
+            task_by_stage = defaultdict(list)
+            for call in task_calls:
+                task_by_stage[str(call["stage"])].append(call)
+            per_task[task] = {
+                **self._aggregate(task_calls),
+                "per_stage": {stage: self._aggregate(stage_calls) for stage, stage_calls in task_by_stage.items()},
+            }
+
+        return {
+            "run": self._aggregate(calls),
+            "per_stage": {stage: self._aggregate(stage_calls) for stage, stage_calls in by_stage.items()},
+            "per_task": per_task,
+        }
+
+    def save(self, output_dir: str, prefix: str = ""):
+        """Write ``{prefix}usage.json`` (aggregates) and ``{prefix}usage_calls.jsonl`` (one line per call)."""
+        os.makedirs(output_dir, exist_ok=True)
+        with self._lock:
+            calls = list(self.calls)
+        with open(os.path.join(output_dir, f"{prefix}usage.json"), "w") as f:
+            json.dump(self.summary(), f, indent=4)
+        with open(os.path.join(output_dir, f"{prefix}usage_calls.jsonl"), "w") as f:
+            for call in calls:
+                f.write(json.dumps(call, default=str) + "\n")
+
+
+_tracker = UsageTracker()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """The process-wide tracker that every wrapper, the grader and the judge record into."""
+    return _tracker
@@ -1,12 +1,14 @@
 
-from model.models import LiteLLMWrapper
+from model.models import AsyncLiteLLMWrapper, LiteLLMWrapper
 from model.types import GENERATION_STRATEGY
 
 
-def load_model(model, generation_strategy, sampling_params):
+def load_model(model, generation_strategy, sampling_params, **wrapper_kwargs):
 
     if generation_strategy == GENERATION_STRATEGY.LITELLM.value:
-        return LiteLLMWrapper(model, sampling_params)
+        return LiteLLMWrapper(model, sampling_params, **wrapper_kwargs)
+    elif generation_strategy == GENERATION_STRATEGY.LITELLM_ASYNC.value:
+        return AsyncLiteLLMWrapper(model, sampling_params, **wrapper_kwargs)
     else:
         raise ValueError(f"Unsupported model strategy: {generation_strategy}")
     
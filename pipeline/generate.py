@@ -1,9 +1,23 @@
+import asyncio
 import os
+import threading
 
-from inference.react_inference import generate as react_generate
-from inference.native_inference import generate as native_generate
+from inference.action_plan_cache import configure_action_plan_cache, get_action_plan_cache
+from inference.inference_utils import get_action_plan_prompts, pre_process
+from inference.react_inference import generate as react_generate, get_retry_report
+from inference.react_scheduler import ReActScheduler
+from inference.react_search import generate as react_search_generate
+from inference.native_inference import agenerate as native_agenerate, generate as native_generate
 from pipeline.utils import save_json
+from prompts.action_plan import get_prompt as get_action_plan_prompt
+from model.concurrency import get_concurrency_report
+from model.endpoints import get_endpoint_report
+from model.hedging import get_hedging_report
+from model.http_client import configure_http_clients, connections_for_workers
+from model.response_cache import get_response_cache
+from model.usage import STAGE_ACTION_PLAN, get_usage_tracker, usage_scope
 from model.utils import load_model
+from utils.journal import get_journal
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor
 import time
@@ -15,8 +29,30 @@ class GenerationPipeline:
         self.args = args
     
     def prepare_inference_func(self, input_data, args):
+
+        configure_http_clients(
+            args.http_max_connections or connections_for_workers(args.num_workers),
+            http2=not args.disable_http2,
+            timeout=args.http_timeout,
+        )
+        configure_action_plan_cache(args.action_plan_cache_path, regenerate_after=args.regenerate_plan_after)
             
-        policy_model = load_model(args.policy_sampling_params['model'], args.policy_generation_strategy, args.policy_sampling_params)
+        policy_model = load_model(
+            args.policy_sampling_params['model'],
+            args.policy_generation_strategy,
+            args.policy_sampling_params,
+            adaptive_concurrency=args.adaptive_concurrency,
+            prompt_caching=args.prompt_caching,
+            hedging={
+                "percentile": args.hedge_percentile,
+                "max_extra_fraction": args.hedge_max_extra_fraction,
+            } if args.hedge_requests else None,
+            response_cache=get_response_cache(
+                args.llm_cache_path,
+                max_size_mb=args.llm_cache_max_size_mb,
+                any_temperature=args.llm_cache_any_temperature,
+            ),
+        )
 
         inference_func = react_generate
         inference_args = {
@@ -29,10 +65,107 @@ class GenerationPipeline:
                 
         return inference_func, inference_args
     
+    def batch_action_plans(self, input_data, policy_model):
+        """Generate every task's action plan up front as one provider batch job, see model/batch.py.
+
+        Action plans do not depend on anything generated later, so they are the part of a run that can
+        wait for a batch at the batch discount.
+        """
+        if self.args.tool_use_strategy == "react":
+            prompts = [get_action_plan_prompts(pre_process([input_sample])[1])[0] for input_sample in input_data]
+        else:
+            prompts = [
+                get_action_plan_prompt(
+                    input_sample['prompt'],
+                    input_sample['tools'],
+                    input_sample['historical_date'],
+                    self.args.apply_chat_template
+                ) for input_sample in input_data
+            ]
+        with usage_scope(stage=STAGE_ACTION_PLAN):
+            return policy_model.batch_generate(
+                prompts, tasks=list(range(len(input_data))), poll_interval=self.args.batch_poll_interval
+            )
+
+    def start_event_loop(self, max_in_flight):
+        """Run an asyncio event loop in a daemon thread so coroutines can be submitted from sync code.
+
+        Returns the loop and a semaphore bound to it that caps the number of coroutines in flight.
+        """
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name="generation-event-loop", daemon=True).start()
+
+        async def make_semaphore():
+            return asyncio.Semaphore(max_in_flight)
+
+        semaphore = asyncio.run_coroutine_threadsafe(make_semaphore(), loop).result()
+        return loop, semaphore
+
+    def start_react_scheduler(self, loop, policy_model):
+        """Start a ReActScheduler on ``loop``; its frontier takes every task instead of a thread each."""
+        args = self.args
+
+        async def start():
+            scheduler = ReActScheduler(
+                policy_model,
+                args.num_retries,
+                args.max_depth,
+                num_full_retries=args.num_full_retries,
+                prompt_mode=args.react_prompt_mode,
+                max_in_flight=args.num_workers,
+                num_samples=args.num_samples,
+                branch_depth=args.branch_depth,
+                stream=args.stream_react_steps,
+            )
+            await scheduler.start()
+            return scheduler
+
+        return asyncio.run_coroutine_threadsafe(start(), loop).result()
+
+    def submit_async(self, loop, semaphore, coro_func, *coro_args):
+        """Schedule a coroutine on ``loop`` and return a concurrent future for ``iter_save_data``."""
+        async def run():
+            async with semaphore:
+                return await coro_func(*coro_args)
+        return asyncio.run_coroutine_threadsafe(run(), loop)
+
+    @staticmethod
+    def journal_generation(future):
+        """Log a finished task's generation to the run journal, so a restart does not generate it again."""
+        if future.cancelled() or future.exception() is not None:
+            return
+        generation, _ = future.result()
+        get_journal().log_done(generation.get('prompt', generation.get('query')), generation)
+
     def save_data(self, react_trees):
         generations_file_path = os.path.join(self.args.output_dir, f"generations.json")
         os.makedirs(self.args.output_dir, exist_ok=True)
         save_json(react_trees, generations_file_path)
+
+        # token, latency and cost per call, aggregated per task, per stage and for the run
+        get_usage_tracker().save(self.args.output_dir)
+
+        concurrency_report = get_concurrency_report()
+        if concurrency_report:
+            save_json(concurrency_report, os.path.join(self.args.output_dir, "concurrency.json"))
+
+        endpoint_report = get_endpoint_report()
+        if endpoint_report:
+            save_json(endpoint_report, os.path.join(self.args.output_dir, "endpoints.json"))
+
+        hedging_report = get_hedging_report()
+        if hedging_report:
+            save_json(hedging_report, os.path.join(self.args.output_dir, "hedging.json"))
+
+        save_json(get_action_plan_cache().stats(), os.path.join(self.args.output_dir, "action_plan_cache.json"))
+
+        retry_report = get_retry_report()
+        if retry_report:
+            save_json(retry_report, os.path.join(self.args.output_dir, "retries.json"))
+
+        response_cache = get_response_cache(self.args.llm_cache_path)
+        if response_cache is not None:
+            save_json(response_cache.stats(), os.path.join(self.args.output_dir, "llm_cache.json"))
        
     def iter_save_data(self, running_futures, react_trees, n_samples):
          with tqdm(total=n_samples) as pbar:
@@ -62,9 +195,41 @@ class GenerationPipeline:
         args = self.args
 
         inference_func, inference_args = self.prepare_inference_func(input_data, args)
+        action_plans = (
+            self.batch_action_plans(input_data, inference_args['policy_model'])
+            if args.batch_mode else [None] * n_samples
+        )
         executor=ThreadPoolExecutor(max_workers=args.num_workers)
+        scheduler = None
         
-        if self.args.tool_use_strategy == "react":
+        if self.args.tool_use_strategy == "react" and args.react_search:
+
+            # each task searches its own tree; expansions within a task run in parallel on top of num_workers
+            futures = [executor.submit(
+                react_search_generate,
+                [input_sample],
+                inference_args['policy_model'],
+                inference_args['num_retries'],
+                inference_args['max_depth'],
+                index,
+                args.react_prompt_mode,
+                action_plans[index],
+                args.react_search,
+                args.search_width,
+                args.search_beam_size,
+                args.search_budget) for index, input_sample in enumerate(input_data)]
+
+        elif self.args.tool_use_strategy == "react" and hasattr(inference_args['policy_model'], 'agenerate'):
+
+            # one frontier of ReAct nodes across all tasks, advanced by up to num_workers concurrent LLM calls
+            loop, _ = self.start_event_loop(args.num_workers)
+            scheduler = self.start_react_scheduler(loop, inference_args['policy_model'])
+            futures = [asyncio.run_coroutine_threadsafe(
+                scheduler.generate(input_sample, index, action_plans[index]),
+                loop
+                ) for index, input_sample in enumerate(input_data)]
+
+        elif self.args.tool_use_strategy == "react":
             
             futures = [executor.submit(
                 inference_func, 
@@ -73,8 +238,28 @@ class GenerationPipeline:
                 inference_args['num_retries'], 
                 inference_args['num_full_retries'], 
                 inference_args['max_depth'], 
-                index) for index, input_sample in enumerate(input_data)]
+                index,
+                args.react_prompt_mode,
+                action_plans[index],
+                args.num_samples,
+                args.branch_depth,
+                args.stream_react_steps) for index, input_sample in enumerate(input_data)]
                 
+        elif self.args.tool_use_strategy == "native" and hasattr(inference_args['policy_model'], 'agenerate'):
+
+            # a single event loop keeps up to num_workers conversations in flight without a thread each
+            loop, semaphore = self.start_event_loop(args.num_workers)
+            futures = [self.submit_async(
+                loop,
+                semaphore,
+                native_agenerate,
+                [input_sample],
+                inference_args['policy_model'],
+                inference_args['num_full_retries'],
+                index, args.apply_chat_template,
+                action_plans[index]
+                ) for index, input_sample in enumerate(input_data)]
+
         elif self.args.tool_use_strategy == "native":
             
             futures = [executor.submit(
@@ -82,11 +267,20 @@ class GenerationPipeline:
                 [input_sample], 
                 inference_args['policy_model'], 
                 inference_args['num_full_retries'], 
-                index, args.apply_chat_template
+                index, args.apply_chat_template,
+                action_plans[index]
                 ) for index, input_sample in enumerate(input_data)]
         else:
             raise ValueError(f"Unsupported tool call format: {args.tool_call_format}")
 
         executor.shutdown(wait=False)
+        if get_journal() is not None:
+            # logged as soon as they finish, since saves only happen once a minute
+            for future in futures:
+                future.add_done_callback(self.journal_generation)
         running_futures = futures.copy()
-        react_trees=self.iter_save_data(running_futures, react_trees, n_samples)
+        try:
+            react_trees=self.iter_save_data(running_futures, react_trees, n_samples)
+        finally:
+            if scheduler is not None:
+                asyncio.run_coroutine_threadsafe(scheduler.stop(), loop).result()
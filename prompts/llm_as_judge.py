@@ -1,4 +1,5 @@
 import json
+from typing import Tuple
 from prompts.utils import get_function_spec
 
 PAIRWISE_LLM_AS_JUDGE_ACTION_PLAN_INSTRUCTIONS = """
@@ -119,6 +120,23 @@ Label: ```json{{"better_step": <"tie"/1/2>}}```
 Reasoning:
 """
 
+# Everything before these markers depends only on the tools and date, so it is shared by both orderings
+# of a pair and by every step of the same task, and can be cached by the provider.
+DYNAMIC_SECTION_MARKERS = [
+    "Now do this for the following question and action plans:",
+    "Now do the this for the following:",
+]
+
+
+def split_static_prefix(prompt: str) -> Tuple[str, str]:
+    """Split a formatted judge prompt into its cacheable preamble and the sample-specific rest."""
+    for marker in DYNAMIC_SECTION_MARKERS:
+        index = prompt.find(marker)
+        if index != -1:
+            return prompt[:index], prompt[index:]
+    return "", prompt
+
+
 def get_pairwise_judge_react_prompt(entry: dict):
 
     tools = entry['tools']
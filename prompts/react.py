@@ -32,6 +32,35 @@ Given a user provided question and action plan Question and Action Plan, as well
 
 REACT_USER_PROMPT = '''Question: {question}\n\nAction Plan: {action_plan}\n\nHistory: {history}'''
 
+# Multi-turn layout: every prior step is an assistant turn followed by a user turn with its observation,
+# so each step's messages strictly extend the previous step's and providers can reuse the cached prefix.
+REACT_MULTI_TURN_INSTRUCTION = "Given a user provided question and action plan Question and Action Plan, as well as your previous actions and the observations that follow them, take your next action."
+
+REACT_MULTI_TURN_USER_PROMPT = '''Question: {question}\n\nAction Plan: {action_plan}'''
+
+# The multi-turn layout is the one meant for prompt caching, so its system prompt puts everything that is
+# identical across tasks first and the current date last, making the instructions and function specs a
+# shared prefix (see model/prompt_caching.py). The history layout keeps the original prompt text.
+_REACT_DATE_SENTENCE = " Please use the actions to provide information accurate up to current date and time: {current_date}."
+_REACT_HISTORY_INSTRUCTION = "Given a user provided question and action plan Question and Action Plan, as well as your previous actions and observations under History, take your next action."
+
+
+def _replace_once(prompt: str, old: str, new: str) -> str:
+    """Replace ``old`` in ``prompt``, failing at import time rather than silently if an edit to the prompt removed it."""
+    if old not in prompt:
+        raise ValueError(f"REACT_SYSTEM_PROMPT no longer contains {old!r}; update the multi-turn layout to match")
+    return prompt.replace(old, new, 1)
+
+
+REACT_MULTI_TURN_SYSTEM_PROMPT = (
+    _replace_once(
+        _replace_once(REACT_SYSTEM_PROMPT, _REACT_DATE_SENTENCE, ""),
+        _REACT_HISTORY_INSTRUCTION,
+        REACT_MULTI_TURN_INSTRUCTION,
+    )
+    + "\n\n" + _REACT_DATE_SENTENCE.strip()
+)
+
 
 def get_prompt(
     query: str, 
@@ -58,3 +87,42 @@ def get_prompt(
     ]
 
     return output
+
+
+def get_multi_turn_prompt(
+    query: str,
+    tools: List[str],
+    action_plan: str = None,
+    historical_date: str = None,
+    ):
+    """Opening messages of the multi-turn ReAct layout, before any step has been taken."""
+
+    func_spec, func_list = get_function_spec(tools)
+
+    if historical_date:
+        current_date = historical_date
+    else:
+        current_date = 'Tuesday, September 03, 2024'
+
+    system_prompt = REACT_MULTI_TURN_SYSTEM_PROMPT.format(func_list=func_list, current_date=current_date, func_spec=func_spec)
+    user_prompt = REACT_MULTI_TURN_USER_PROMPT.format(question=query, action_plan=action_plan)
+
+    output = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+    return output
+
+
+def get_step_turns(node):
+    """The assistant turn (Thought/Action/Action Input) and user turn (Observation) for one ReAct step."""
+
+    if node.rewrite_node is not None:
+        node = node.rewrite_node
+
+    step = "\n".join([node.thought.print(), node.action.print(), node.action_input.print()])
+    return [
+        {"role": "assistant", "content": step},
+        {"role": "user", "content": node.observation.print().strip()},
+    ]
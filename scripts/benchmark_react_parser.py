@@ -0,0 +1,99 @@
+"""
+Benchmark ReAct step parsing on a corpus of policy outputs.
+
+Compares tree/react_parser.py with the parsing it replaced: post_process's "Thought:"/"End Action" repair,
+process_policy_output's marker scans and get_observation_step's JSON parse. Reports the parse-error rate,
+how many outputs each parser gets wrong (valid steps it rejects, which cost a retried LLM call, or parses
+to a different step than expected), and the mean parse time over the whole corpus and over its valid steps.
+
+    python -m scripts.benchmark_react_parser --corpus tests/data/react_policy_outputs.jsonl
+"""
+
+import argparse
+import json
+import time
+
+from tree.react_parser import parse_react_step
+
+
+def legacy_parse(generation):
+    """The parsing done before tree/react_parser.py, kept here as the baseline."""
+    raw_string = ('Thought:' + generation.strip('Thought:').strip('End Action').strip() + '\nEnd Action').strip()
+    thought_idx = raw_string.find("Thought:")
+    action_idx = raw_string.find("Action:")
+    action_input_idx = raw_string.find("Action Input:")
+    end_action_idx = raw_string.find("End Action")
+    if -1 in (thought_idx, action_idx, action_input_idx, end_action_idx):
+        raise ValueError("missing marker")
+
+    thought = raw_string[thought_idx + len("Thought:") : action_idx].strip().replace("\n", " ")
+    action = raw_string[action_idx + len("Action:") : action_input_idx].strip().replace("\n", " ")
+    action_input = raw_string[action_input_idx + len("Action Input:") : end_action_idx].strip().replace("\n", " ")
+    action_input = action_input.strip('```').strip('json').strip('python')
+
+    if "python_interpreter" in action:
+        args = json.loads(action_input.replace('\n', '~!`>!~'))
+        args["code"] = args["code"].replace('~!`>!~', '\n')
+    else:
+        args = json.loads(action_input)
+    return thought, action, args
+
+
+def single_pass_parse(generation):
+    step = parse_react_step(generation)
+    return step.thought, step.action, step.action_input
+
+
+def benchmark(parse, corpus, repeat):
+    errors, wrong = 0, 0
+    for case in corpus:
+        try:
+            thought, action, args = parse(case["output"])
+        except Exception:
+            errors += 1
+            wrong += "expected" in case
+            continue
+        expected = case.get("expected")
+        wrong += expected is None or expected != {"thought": thought, "action": action, "action_input": args}
+
+    valid = [case for case in corpus if "expected" in case]
+    return {
+        "outputs": len(corpus),
+        "parse_errors": errors,
+        "parse_error_rate": round(errors / len(corpus), 4),
+        "wrong": wrong,
+        "us_per_output": time_per_output(parse, corpus, repeat),
+        # well-formed steps are what a run mostly sees
+        "us_per_valid_step": time_per_output(parse, valid, repeat),
+    }
+
+
+def time_per_output(parse, corpus, repeat):
+    """Mean parse time in microseconds over ``repeat`` passes of the corpus."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for case in corpus:
+            try:
+                parse(case["output"])
+            except Exception:
+                pass
+    return round((time.perf_counter() - start) / (repeat * len(corpus)) * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ReAct step parsing")
+    parser.add_argument("--corpus", default="tests/data/react_policy_outputs.jsonl", help="JSONL file of policy outputs")
+    parser.add_argument("--repeat", type=int, default=500, help="Passes over the corpus for the throughput measurement")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f]
+    malformed = sum("expected" not in case for case in corpus)
+    print(f"{len(corpus)} outputs, {malformed} of them not valid steps")
+
+    for name, parse in [("legacy", legacy_parse), ("single_pass", single_pass_parse)]:
+        print(name, json.dumps(benchmark(parse, corpus, args.repeat)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for reusing action plans across full retries.
+"""
+
+import os
+import tempfile
+import unittest
+
+from inference.action_plan_cache import ActionPlanCache
+
+
+class ActionPlanCacheTests(unittest.TestCase):
+    """Tests for plan reuse, the regeneration policy and sharing plans through a file."""
+
+    def setUp(self):
+        self.key = ActionPlanCache.make_key("openai/gpt-4o", "What is 2+2?", ["calculator"], "")
+
+    def test_reuses_plan_by_default(self):
+        """Test that a plan survives any number of failed executions when no policy is set."""
+        cache = ActionPlanCache()
+        self.assertIsNone(cache.get(self.key))
+        cache.set(self.key, "plan")
+        for _ in range(5):
+            self.assertFalse(cache.record_failure(self.key))
+            self.assertEqual(cache.get(self.key), "plan")
+        self.assertEqual(cache.stats()["regenerations"], 0)
+
+    def test_regenerates_after_k_failures(self):
+        """Test that a plan is dropped after regenerate_after failures and that a new plan starts a fresh count."""
+        cache = ActionPlanCache(regenerate_after=2)
+        cache.set(self.key, "plan")
+        self.assertFalse(cache.record_failure(self.key))
+        self.assertTrue(cache.record_failure(self.key))
+        self.assertIsNone(cache.get(self.key))
+        cache.set(self.key, "new plan")
+        self.assertFalse(cache.record_failure(self.key))
+        self.assertEqual(cache.get(self.key), "new plan")
+
+    def test_key_ignores_missing_date_format(self):
+        """Test that a missing historical date keys the same in native (empty string) and ReAct (None) tasks."""
+        other = ActionPlanCache.make_key("openai/gpt-4o", "What is 2+2?", ["calculator"], None)
+        self.assertEqual(self.key, other)
+        self.assertNotEqual(self.key, ActionPlanCache.make_key("openai/gpt-4o-mini", "What is 2+2?", ["calculator"], None))
+
+    def test_shared_through_file(self):
+        """Test that plans and failure counts written by one cache are seen by another on the same file."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "plans.sqlite")
+            ActionPlanCache(path).set(self.key, "plan")
+            cache = ActionPlanCache(path, regenerate_after=1)
+            self.assertEqual(cache.get(self.key), "plan")
+            self.assertTrue(cache.record_failure(self.key))
+            self.assertIsNone(ActionPlanCache(path).get(self.key))
+
+
+if __name__ == "__main__":
+    unittest.main()
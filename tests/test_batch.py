@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for provider batch jobs, run against the local stand-in server.
+"""
+
+import json
+import unittest
+
+from model.batch import AnthropicBatchBackend, run_batch
+from utils.batch_stub_server import BatchStubServer
+
+
+def responder(request):
+    text = str(request["messages"][-1]["content"])
+    return None if "reject" in text else text.upper()
+
+
+def make_requests(texts):
+    return [(i, [{"role": "system", "content": "Be loud."}, {"role": "user", "content": text}]) for i, text in enumerate(texts)]
+
+
+class BatchTests(unittest.TestCase):
+    """Tests for submitting, polling and joining batch results."""
+
+    def setUp(self):
+        self.server = BatchStubServer(responder=responder, polls_before_done=2).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def run_batch(self, model, texts, **kwargs):
+        return self.run_batch_with_params({"model": model, "temperature": 0}, texts, **kwargs)
+
+    def run_batch_with_params(self, sampling_params, texts, **kwargs):
+        return run_batch(make_requests(texts), sampling_params, api_base=self.server.url, poll_interval=0.01, **kwargs)
+
+    def test_openai_results_in_order(self):
+        """Test that results come back in request order even when split over several batches."""
+        results = self.run_batch("openai/gpt-4o-mini", ["a", "b", "c"], max_requests_per_batch=2)
+        self.assertEqual([result["content"] for result in results], ["A", "B", "C"])
+        self.assertEqual(len(self.server.batches), 2)
+        self.assertEqual(results[0]["usage"]["completion_tokens"], 1)
+
+    def test_anthropic_results_in_order(self):
+        """Test the Message Batches round trip."""
+        results = self.run_batch("anthropic/claude-3-5-sonnet-20241022", ["a", "b"])
+        self.assertEqual([result["content"] for result in results], ["A", "B"])
+        self.assertEqual(results[1]["usage"]["output_tokens"], 1)
+
+    def test_failed_requests_are_reported(self):
+        """Test that a rejected request has no content and an error, without failing its neighbours."""
+        for model in ["openai/gpt-4o-mini", "anthropic/claude-3-5-sonnet-20241022"]:
+            results = self.run_batch(model, ["a", "reject me"])
+            self.assertEqual(results[0]["content"], "A")
+            self.assertIsNone(results[1]["content"])
+            self.assertIn("rejected by stub", results[1]["error"])
+
+    def test_anthropic_request_conversion(self):
+        """Test that the system prompt, stop sequences and max_tokens are mapped to the Messages API."""
+        request = AnthropicBatchBackend.to_anthropic(
+            make_requests(["a"])[0][1],
+            {"model": "anthropic/claude-3-5-sonnet-20241022", "stop": "[END]", "temperature": None},
+        )
+        self.assertEqual(request["model"], "claude-3-5-sonnet-20241022")
+        self.assertEqual(request["system"], "Be loud.")
+        self.assertEqual(request["messages"], [{"role": "user", "content": "a"}])
+        self.assertEqual(request["stop_sequences"], ["[END]"])
+        self.assertIn("max_tokens", request)
+        self.assertNotIn("temperature", request)
+
+    def test_anthropic_reasoning_effort(self):
+        """Test that reasoning_effort becomes a thinking budget and OpenAI-only params are not sent to Anthropic."""
+        request = AnthropicBatchBackend.to_anthropic(
+            make_requests(["a"])[0][1],
+            {"model": "anthropic/claude-sonnet-4-20250514", "reasoning_effort": "high", "temperature": 0, "seed": 1,
+             "max_completion_tokens": 2000, "custom_llm_provider": "anthropic"},
+        )
+        self.assertEqual(request["thinking"], {"type": "enabled", "budget_tokens": 4096})
+        self.assertEqual(request["max_tokens"], 4096 + 1024)
+        for key in ["reasoning_effort", "temperature", "seed", "max_completion_tokens", "custom_llm_provider"]:
+            self.assertNotIn(key, request)
+
+    def test_openai_drops_anthropic_params(self):
+        """Test that an OpenAI batch body keeps reasoning_effort but not Anthropic's thinking."""
+        self.run_batch_with_params({"model": "openai/o3", "reasoning_effort": "high", "thinking": {"type": "enabled"}}, ["a"])
+        body = json.loads(self.server.files[next(iter(self.server.batches.values()))["input_file_id"]].splitlines()[0])["body"]
+        self.assertEqual(body["reasoning_effort"], "high")
+        self.assertNotIn("thinking", body)
+
+    def test_timed_out_batches_are_cancelled(self):
+        """Test that batches still running at the timeout are cancelled and their requests reported as failed."""
+        self.server.polls_before_done = 1000
+        for model in ["openai/gpt-4o-mini", "anthropic/claude-3-5-sonnet-20241022"]:
+            results = self.run_batch(model, ["a"], timeout=0.05)
+            self.assertIsNone(results[0]["content"])
+        self.assertEqual(len(self.server.batches), 2)
+        self.assertTrue(all(batch.get("cancelled") for batch in self.server.batches.values()))
+
+    def test_unsupported_provider(self):
+        """Test that providers without a batch API are rejected up front."""
+        with self.assertRaises(ValueError):
+            self.run_batch("gemini/gemini-1.5-pro", ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
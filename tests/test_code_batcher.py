@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for batching code submissions to Sphere Engine.
+"""
+
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from tools.code.batch_submitter import SphereEngineSubmissionBatcher
+
+
+class FakeSubmission:
+    """Stands in for a SphereEngineCompilersSubmissionFuture."""
+
+    def __init__(self, code, language, version, input_data):
+        self.source = code
+        self.language = language
+        self.version = version
+        self.input = input_data
+
+    def get_until_done(self, pull_interval_ms):
+        if "crash" in self.source:
+            raise RuntimeError("execution failed")
+        return SimpleNamespace(output=self.source.upper())
+
+
+class FakeExecutor:
+    """Records each batch it is given. Snippets containing "reject" fail to submit, and the batch of a
+    snippet containing "slow" is held until ``release`` is set."""
+
+    def __init__(self):
+        self.batches = []
+        self.holding = threading.Event()
+        self.release = threading.Event()
+
+    def batch_execute_async(self, codes, languages, versions, input_data, max_worker):
+        self.batches.append(list(codes))
+        if any("slow" in code for code in codes):
+            self.holding.set()
+            self.release.wait(5)
+        return [
+            FakeSubmission(*submission)
+            for submission in zip(codes, languages, versions, input_data)
+            if "reject" not in submission[0]
+        ]
+
+
+class SubmissionBatcherTests(unittest.TestCase):
+    """Tests for gathering, deduplicating and resolving code submissions."""
+
+    def setUp(self):
+        self.executor = FakeExecutor()
+
+    def make_batcher(self, window_ms):
+        batcher = SphereEngineSubmissionBatcher(self.executor, window_ms=window_ms, pull_interval_ms=1)
+        self.addCleanup(batcher.shutdown)
+        return batcher
+
+    def test_window_batches_and_dedupes(self):
+        """Test that snippets submitted within one window go out as one batch with identical ones sent once."""
+        batcher = self.make_batcher(window_ms=200)
+        slow = batcher.submit("slow", "python")
+        self.assertTrue(self.executor.holding.wait(5))
+        # queued while the first batch is still being submitted
+        futures = [batcher.submit(code, "python") for code in ["a", "b", "a"]]
+        self.executor.release.set()
+
+        self.assertEqual([future.result(timeout=5).output for future in futures], ["A", "B", "A"])
+        self.assertEqual(slow.result(timeout=5).output, "SLOW")
+        self.assertEqual(self.executor.batches, [["slow"], ["a", "b"]])
+        self.assertEqual((batcher.num_requests, batcher.num_submissions, batcher.num_batches), (4, 3, 2))
+
+    def test_lone_submission_skips_window(self):
+        """Test that a snippet with nothing else outstanding is not held for the window."""
+        batcher = self.make_batcher(window_ms=10000)
+        started = time.monotonic()
+        self.assertEqual(batcher.execute("a", "python", timeout=5).output, "A")
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_errors_reach_only_their_callers(self):
+        """Test that a snippet that fails to submit or to execute fails its own callers and no others."""
+        batcher = self.make_batcher(window_ms=200)
+        slow = batcher.submit("slow", "python")
+        self.assertTrue(self.executor.holding.wait(5))
+        ok, rejected, crashed, crashed_again = [batcher.submit(code, "python") for code in ["ok", "reject", "crash", "crash"]]
+        self.executor.release.set()
+
+        self.assertEqual(ok.result(timeout=5).output, "OK")
+        self.assertEqual(slow.result(timeout=5).output, "SLOW")
+        with self.assertRaisesRegex(RuntimeError, "Failed to submit"):
+            rejected.result(timeout=5)
+        for future in [crashed, crashed_again]:
+            with self.assertRaisesRegex(RuntimeError, "execution failed"):
+                future.result(timeout=5)
+
+    def test_shutdown_drains_queue(self):
+        """Test that shutdown still resolves queued snippets and then refuses new ones."""
+        batcher = self.make_batcher(window_ms=10000)
+        slow = batcher.submit("slow", "python")
+        self.assertTrue(self.executor.holding.wait(5))
+        queued = batcher.submit("queued", "python")
+        self.executor.release.set()
+        batcher.shutdown()
+
+        self.assertEqual(slow.result(timeout=0).output, "SLOW")
+        self.assertEqual(queued.result(timeout=0).output, "QUEUED")
+        self.assertFalse(batcher._dispatcher.is_alive())
+        with self.assertRaises(RuntimeError):
+            batcher.submit("late", "python")
+
+
+if __name__ == "__main__":
+    unittest.main()
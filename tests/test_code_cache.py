@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the code execution result cache.
+"""
+
+import os
+import tempfile
+import unittest
+
+from tools.code.result_cache import CodeResultCache, is_deterministic, normalize_source
+
+
+class DeterminismCheckTests(unittest.TestCase):
+    """Tests for the static determinism check."""
+
+    def test_pure_arithmetic_is_deterministic(self):
+        """Test that plain computations are considered cacheable."""
+        code = "import math\nimport numpy as np\nx = [1, 2, 3]\nprint(math.sqrt(sum(x)), np.mean(x))"
+        self.assertTrue(is_deterministic(code))
+
+    def test_time_and_random_are_not_deterministic(self):
+        """Test that time and random usage disable caching."""
+        self.assertFalse(is_deterministic("import time\nprint(time.time())"))
+        self.assertFalse(is_deterministic("from random import randint\nprint(randint(0, 9))"))
+        self.assertFalse(is_deterministic("import numpy as np\nprint(np.random.rand())"))
+        self.assertFalse(is_deterministic("import datetime\nprint(datetime.datetime.now())"))
+
+    def test_random_submodules_are_not_deterministic(self):
+        """Test that randomness reached through a submodule import or an alias disables caching."""
+        self.assertFalse(is_deterministic("from numpy.random import rand\nprint(rand())"))
+        self.assertFalse(is_deterministic("import numpy.random as npr\nprint(npr.rand())"))
+        self.assertFalse(is_deterministic("from numpy import random\nprint(random.rand())"))
+        self.assertFalse(is_deterministic("from scipy import stats\nprint(stats.norm.rvs())"))
+        self.assertFalse(is_deterministic("import scipy.stats as ss\nprint(ss.norm.rvs())"))
+        self.assertFalse(is_deterministic("from numpy import shuffle\nprint(shuffle)"))
+        self.assertTrue(is_deterministic("from numpy import mean\nprint(mean([1, 2]))"))
+
+    def test_io_is_not_deterministic(self):
+        """Test that file and network access disable caching."""
+        self.assertFalse(is_deterministic("print(open('data.txt').read())"))
+        self.assertFalse(is_deterministic("import os\nprint(os.listdir('.'))"))
+        self.assertFalse(is_deterministic("import pandas as pd\nprint(pd.read_csv('x.csv'))"))
+
+    def test_syntax_error_is_not_deterministic(self):
+        """Test that unparsable code is never cached."""
+        self.assertFalse(is_deterministic("print(1"))
+
+    def test_normalize_source(self):
+        """Test that cosmetic whitespace differences normalize away."""
+        self.assertEqual(normalize_source("\nprint(1)   \r\nprint(2)\n\n"), "print(1)\nprint(2)")
+
+
+class CodeResultCacheTests(unittest.TestCase):
+    """Tests for the persistent code result cache."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = CodeResultCache(os.path.join(self.tmp_dir.name, "cache.sqlite"))
+
+    def tearDown(self):
+        self.cache.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        """Test that a stored result is returned for equivalent source."""
+        result = {"result": "6\n", "error": ""}
+        self.cache.set("print(1 + 2 + 3)", "Python 3.x", result, version="python 3.9.5")
+        self.assertEqual(self.cache.get("print(1 + 2 + 3)  \n", "Python 3.x", version="python 3.9.5"), result)
+
+    def test_version_is_part_of_key(self):
+        """Test that a different runtime version misses the cache."""
+        self.cache.set("print(1)", "Python 3.x", {"result": "1\n", "error": ""}, version="python 3.9.5")
+        self.assertIsNone(self.cache.get("print(1)", "Python 3.x", version="python 3.12"))
+
+    def test_nondeterministic_code_is_not_stored(self):
+        """Test that nondeterministic snippets bypass the cache."""
+        code = "import random\nprint(random.random())"
+        self.cache.set(code, "Python 3.x", {"result": "0.5\n", "error": ""})
+        self.assertIsNone(self.cache.get(code, "Python 3.x"))
+        self.assertEqual(len(self.cache.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
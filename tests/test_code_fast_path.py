@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the python_interpreter in-process fast path.
+"""
+
+import unittest
+
+from tools.code.fast_path import FastPathBudgetExceeded, is_fast_path_eligible, run_fast_path
+
+
+class FastPathClassifierTests(unittest.TestCase):
+    """Tests for the AST classifier that routes snippets away from the sandbox."""
+
+    def test_arithmetic_and_statistics_are_eligible(self):
+        """Test that simple math and statistics snippets take the fast path."""
+        self.assertTrue(is_fast_path_eligible("import math\nprint(math.sqrt(16) * 2)"))
+        self.assertTrue(is_fast_path_eligible("import statistics as st\nprint(st.median([3, 1, 2]))"))
+        self.assertTrue(is_fast_path_eligible("x = [1, 2, 3]\nfor v in x:\n    print(v ** 2)"))
+
+    def test_unsafe_snippets_are_not_eligible(self):
+        """Test that imports, definitions and unbounded loops go to the sandbox."""
+        self.assertFalse(is_fast_path_eligible("import os\nprint(os.getcwd())"))
+        self.assertFalse(is_fast_path_eligible("import numpy as np\nprint(np.mean([1, 2]))"))
+        self.assertFalse(is_fast_path_eligible("def f(x):\n    return x\nprint(f(1))"))
+        self.assertFalse(is_fast_path_eligible("while True:\n    pass"))
+        self.assertFalse(is_fast_path_eligible("for i in range(1000000):\n    pass"))
+        self.assertFalse(is_fast_path_eligible("print(().__class__)"))
+        self.assertFalse(is_fast_path_eligible("print(open('x').read())"))
+        self.assertFalse(is_fast_path_eligible("print('{0.__class__}'.format(1))"))
+        self.assertFalse(is_fast_path_eligible("print(2 ** 100000)"))
+        self.assertFalse(is_fast_path_eligible("print(((10 ** 1000) ** 1000) ** 1000)"))
+
+
+class FastPathEvaluatorTests(unittest.TestCase):
+    """Tests for the restricted in-process evaluator."""
+
+    def test_captures_print_output(self):
+        """Test that printed values are returned like sandbox stdout."""
+        output = run_fast_path("import math\nx = [1, 2, 3, 4]\nprint(sum(x) / len(x), math.floor(2.7))\nprint('done')")
+        self.assertEqual(output, "2.5 2\ndone\n")
+
+    def test_step_budget(self):
+        """Test that runaway loops are stopped by the step budget."""
+        with self.assertRaises(FastPathBudgetExceeded):
+            run_fast_path("n = 10 ** 9\nfor i in range(n):\n    pass")
+        with self.assertRaises(FastPathBudgetExceeded):
+            run_fast_path("total = 0\nfor i in range(1000):\n    for j in range(1000):\n        total += j", max_steps=1000)
+
+    def test_expensive_lines_are_contained(self):
+        """Test that single lines that would exhaust memory or hang are stopped in the child process."""
+        snippets = [
+            "print(len([0] * 100000 * 100000))",
+            "x = 'a' * 100000\ny = x * 100000\nprint(len(y))",
+            "x = 'a'\nfor _ in range(60):\n    x = x + x\nprint(len(x))",
+            "x = 10 ** 1000\ny = x ** 1000\nprint(y ** 1000)",
+        ]
+        for code in snippets:
+            with self.subTest(code=code), self.assertRaises(FastPathBudgetExceeded):
+                run_fast_path(code, timeout=3)
+
+    def test_runtime_errors_propagate(self):
+        """Test that runtime errors surface so the caller can fall back to the sandbox."""
+        with self.assertRaises(ZeroDivisionError):
+            run_fast_path("print(1 / 0)")
+
+
+if __name__ == "__main__":
+    unittest.main()
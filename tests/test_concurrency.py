@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the AIMD concurrency controller.
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from model.concurrency import AIMDConcurrencyController
+
+
+class AIMDConcurrencyControllerTests(unittest.TestCase):
+    """Tests for the shared in-flight request limit."""
+
+    def test_additive_increase(self):
+        """Test that successes raise the limit by roughly one per window."""
+        controller = AIMDConcurrencyController("test", initial_limit=4)
+        for _ in range(4):
+            controller.release(controller.acquire())
+        self.assertAlmostEqual(controller.limit, 5.0, delta=0.2)
+
+    def test_multiplicative_decrease_once_per_burst(self):
+        """Test that a burst of 429s from requests started together halves the limit once."""
+        controller = AIMDConcurrencyController("test", initial_limit=8)
+        starts = [controller.acquire() for _ in range(4)]
+        for started in starts:
+            controller.release(started, "rate_limited")
+        self.assertEqual(controller.limit, 4.0)
+        self.assertEqual(controller.num_rate_limited, 4)
+        self.assertEqual(controller.num_decreases, 1)
+
+    def test_errors_do_not_move_limit(self):
+        """Test that non rate limit errors leave the limit untouched."""
+        controller = AIMDConcurrencyController("test", initial_limit=8)
+        controller.release(controller.acquire(), "error")
+        self.assertEqual(controller.limit, 8.0)
+
+    def test_threads_never_exceed_limit(self):
+        """Test that queued threads respect the limit."""
+        controller = AIMDConcurrencyController("test", initial_limit=3, max_limit=3)
+        peak = []
+
+        def worker():
+            for _ in range(10):
+                started = controller.acquire()
+                peak.append(controller.in_flight)
+                time.sleep(0.001)
+                controller.release(started)
+
+        threads = [threading.Thread(target=worker) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(peak), 3)
+        self.assertEqual(controller.in_flight, 0)
+        self.assertEqual(controller.num_successes, 120)
+
+    def test_async_waiters(self):
+        """Test that coroutines share the same queue as threads."""
+        controller = AIMDConcurrencyController("test", initial_limit=2, max_limit=2)
+
+        async def worker():
+            started = await controller.acquire_async()
+            self.assertLessEqual(controller.in_flight, 2)
+            await asyncio.sleep(0.001)
+            controller.release(started)
+
+        async def run():
+            await asyncio.gather(*[worker() for _ in range(20)])
+
+        asyncio.run(run())
+        self.assertEqual(controller.in_flight, 0)
+        self.assertEqual(controller.stats()["num_successes"], 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for multi-endpoint routing and circuit breaking.
+"""
+
+import time
+import unittest
+
+from model.endpoints import Endpoint, EndpointPool, is_endpoint_failure
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def make_pool(n=2, **kwargs):
+    endpoints = [Endpoint(f"http://test-endpoints-{time.monotonic_ns()}-{i}", provider="test") for i in range(n)]
+    return EndpointPool(endpoints, **kwargs)
+
+
+class EndpointPoolTests(unittest.TestCase):
+    """Tests for least-outstanding routing, ejection and failover."""
+
+    def test_error_classification(self):
+        """Test that request errors and rate limits do not count against an endpoint's health."""
+        self.assertTrue(is_endpoint_failure(FakeAPIError(503)))
+        self.assertTrue(is_endpoint_failure(ConnectionError("refused")))
+        self.assertFalse(is_endpoint_failure(FakeAPIError(400)))
+        self.assertFalse(is_endpoint_failure(FakeAPIError(429)))
+
+    def test_least_outstanding(self):
+        """Test that concurrent requests spread across endpoints."""
+        pool = make_pool(3)
+        acquired = [pool.acquire() for _ in range(6)]
+        self.assertEqual([endpoint.outstanding for endpoint in pool.endpoints], [2, 2, 2])
+        pool.release(acquired[0])
+        self.assertIs(pool.acquire(), acquired[0])
+
+    def test_ejection_and_failover(self):
+        """Test that repeated failures eject an endpoint and retries move to a sibling."""
+        pool = make_pool(2, failure_threshold=2, ejection_time=60)
+        bad = pool.endpoints[0]
+        for _ in range(2):
+            endpoint = pool.acquire()
+            while endpoint is not bad:
+                pool.release(endpoint)
+                endpoint = pool.acquire()
+            self.assertTrue(pool.release(bad, FakeAPIError(502)))
+        self.assertEqual(bad.state(time.monotonic()), "open")
+        for _ in range(5):
+            endpoint = pool.acquire()
+            self.assertIsNot(endpoint, bad)
+            pool.release(endpoint)
+
+    def test_half_open_probe(self):
+        """Test that an ejected endpoint gets a single probe once its ejection ends."""
+        pool = make_pool(2, failure_threshold=1, ejection_time=0)
+        bad = pool.endpoints[0]
+        bad.outstanding += 1
+        pool.release(bad, FakeAPIError(500))
+        self.assertEqual(bad.state(time.monotonic()), "half_open")
+        probe = [pool.acquire() for _ in range(3)]
+        self.assertEqual(probe.count(bad), 1)
+        pool.release(bad)
+        self.assertEqual(bad.state(time.monotonic()), "closed")
+
+    def test_request_errors_do_not_fail_over(self):
+        """Test that a bad request is not retried on a sibling without backoff."""
+        pool = make_pool(2)
+        endpoint = pool.acquire()
+        self.assertFalse(pool.release(endpoint, FakeAPIError(400)))
+        self.assertEqual(endpoint.consecutive_failures, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for hedged LLM requests.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+import unittest
+
+from model.hedging import HedgePolicy
+
+
+def warmed_policy(latency=0.01, **kwargs):
+    policy = HedgePolicy("test", min_samples=5, **kwargs)
+    for _ in range(5):
+        policy.call(lambda: time.sleep(latency), "key")
+    return policy
+
+
+class HedgePolicyTests(unittest.TestCase):
+    """Tests for when hedges are sent and which response wins."""
+
+    def test_no_hedge_before_warmup(self):
+        """Test that nothing is hedged until enough latencies are known."""
+        policy = HedgePolicy("test", min_samples=5)
+        self.assertIsNone(policy.hedge_delay("key"))
+        policy.call(lambda: "ok", "key")
+        self.assertEqual(policy.num_hedged, 0)
+
+    def test_hedge_wins_on_straggler(self):
+        """Test that a stalled primary is beaten by its hedge and the loser is handed to on_discard."""
+        policy = warmed_policy(max_extra_fraction=1.0)
+        counter = itertools.count()
+        discarded = []
+        released = threading.Event()
+
+        def request():
+            if next(counter) == 0:
+                released.wait(5)
+                return "slow"
+            return "fast"
+
+        started = time.monotonic()
+        self.assertEqual(policy.call(request, "key", on_discard=discarded.append), "fast")
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(policy.num_hedge_wins, 1)
+        released.set()
+        time.sleep(0.05)
+        self.assertEqual(discarded, ["slow"])
+
+    def test_budget_cap(self):
+        """Test that hedges stop once the extra call fraction is used up."""
+        policy = warmed_policy(max_extra_fraction=0.1)
+        for _ in range(4):
+            policy.call(lambda: time.sleep(0.05) or "ok", "key")
+        # 10% of 9 calls does not cover a single hedge
+        self.assertEqual(policy.num_hedged, 0)
+        self.assertGreaterEqual(policy.num_budget_denied, 1)
+
+    def test_errors_fall_through_to_hedge(self):
+        """Test that a failing primary still lets a successful hedge answer."""
+        policy = warmed_policy(max_extra_fraction=1.0)
+        counter = itertools.count()
+
+        def request():
+            if next(counter) == 0:
+                time.sleep(0.1)
+                raise RuntimeError("primary failed")
+            time.sleep(0.2)
+            return "hedge"
+
+        self.assertEqual(policy.call(request, "key"), "hedge")
+
+    def test_async_loser_is_cancelled(self):
+        """Test that the asyncio path cancels the slower request."""
+        policy = warmed_policy(max_extra_fraction=1.0)
+        counter = itertools.count()
+        cancelled = []
+
+        async def request():
+            if next(counter) == 0:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+            return "fast"
+
+        async def run():
+            result = await policy.acall(request, "key")
+            await asyncio.sleep(0)
+            return result
+
+        self.assertEqual(asyncio.run(run()), "fast")
+        self.assertEqual(cancelled, [True])
+        self.assertEqual(policy.stats()["num_hedge_wins"], 1)
+
+    def test_duplicate_runs_hedge_callable(self):
+        """Test that the duplicate runs the given hedge callable rather than the primary's, on both paths, and that a
+        primary still running when its hedge answers is handed over."""
+        policy = warmed_policy(max_extra_fraction=1.0)
+        released = threading.Event()
+
+        def primary():
+            released.wait(5)
+            return "primary"
+
+        abandoned = []
+        self.assertEqual(policy.call(primary, "key", hedge=lambda: "hedge", on_abandon=abandoned.append), "hedge")
+        self.assertFalse(abandoned[0].done())
+        released.set()
+        self.assertEqual(abandoned[0].result(timeout=5), "primary")
+
+        async def slow():
+            await asyncio.sleep(5)
+            return "primary"
+
+        async def hedge():
+            return "hedge"
+
+        self.assertEqual(asyncio.run(policy.acall(slow, "key", hedge=hedge)), "hedge")
+        self.assertEqual(policy.num_hedge_wins, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
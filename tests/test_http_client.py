@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the shared LLM HTTP client.
+"""
+
+import unittest
+
+from model.http_client import (
+    CONNECTIONS_PER_WORKER,
+    configure_http_clients,
+    connections_for_workers,
+    get_async_http_client,
+    get_http_client,
+    get_http_client_config,
+)
+
+
+class HTTPClientTests(unittest.TestCase):
+    """Tests for sizing and sharing the connection pool."""
+
+    def test_sized_to_workers(self):
+        """Test that the pool gets room for every worker plus a hedge or extra sample each."""
+        self.assertEqual(connections_for_workers(8), 8 * CONNECTIONS_PER_WORKER)
+        self.assertEqual(connections_for_workers(0), CONNECTIONS_PER_WORKER)
+
+    def test_shared_client(self):
+        """Test that every caller gets the same client until the pool is reconfigured."""
+        configure_http_clients(16, timeout=30, connect_timeout=5)
+        client = get_http_client()
+        self.assertIs(get_http_client(), client)
+        self.assertIs(get_async_http_client(), get_async_http_client())
+        self.assertEqual(client.timeout.read, 30)
+        self.assertEqual(client.timeout.connect, 5)
+        self.assertEqual(get_http_client_config()["max_connections"], 16)
+
+        configure_http_clients(4, http2=False)
+        self.assertIsNot(get_http_client(), client)
+        self.assertFalse(get_http_client_config()["http2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the run journal.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from utils.journal import RunJournal
+
+
+def make_step(parent, query, action, answer_found=False):
+    """Stands in for a ReActNode: only the fields the journal reads."""
+    value = lambda v: SimpleNamespace(value=v)
+    return SimpleNamespace(
+        parent=parent,
+        mgr=SimpleNamespace(query=query),
+        thought=value(f"call {action}"),
+        action=value(action),
+        action_input=value('{"q": 1}'),
+        observation=value(f"{action} result"),
+        answer_found=answer_found,
+        journal_id=None,
+    )
+
+
+class RunJournalTests(unittest.TestCase):
+    """Tests for logging steps and recovering unfinished attempts after a restart."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "journal.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_recovers_deepest_unpruned_chain(self):
+        """Test that a restart gets the latest attempt's chain up to its deepest step that was not pruned."""
+        journal = RunJournal(self.path)
+        root = SimpleNamespace(journal_id=journal.log_plan("q", "react", "old plan"))
+        journal.log_step(make_step(root, "q", "lost"))
+
+        root = SimpleNamespace(journal_id=journal.log_plan("q", "react", "plan"))
+        first = make_step(root, "q", "search")
+        journal.log_step(first)
+        second = make_step(first, "q", "calculator")
+        journal.log_step(second)
+        stuck = make_step(second, "q", "broken")
+        journal.log_step(stuck)
+        journal.log_prune(stuck)
+        journal.close()
+        with open(self.path, "a") as f:
+            f.write('{"task": "q", "event": "st')  # cut short by the crash
+
+        journal = RunJournal(self.path)
+        attempt = journal.recover("q", "react")
+        self.assertEqual(attempt["action_plan"], "plan")
+        self.assertEqual(attempt["plan_id"], root.journal_id)
+        self.assertEqual([step["action"] for step in attempt["history"]], ["search", "calculator"])
+        self.assertEqual(attempt["history"][1]["journal_id"], second.journal_id)
+        self.assertIsNone(journal.recover("q", "react"))
+        self.assertGreater(journal.log_plan("other", "react", "plan"), stuck.journal_id)
+
+    def test_native_turns_replace_from_their_offset(self):
+        """Test that a turn logged again after a failed call replaces the turns it overlaps."""
+        journal = RunJournal(self.path)
+        plan_id = journal.log_plan("q", "native", "plan")
+        journal.log_turn("q", plan_id, 0, [{"role": "assistant", "content": "a"}, {"role": "tool", "content": "1"}])
+        journal.log_turn("q", plan_id, 2, [{"role": "assistant", "content": "b"}, {"role": "tool", "content": "2"}])
+        journal.log_turn("q", plan_id, 0, [{"role": "assistant", "content": "c"}, {"role": "tool", "content": "3"}])
+        journal.close()
+
+        journal = RunJournal(self.path)
+        self.assertIsNone(journal.recover("q", "react"))
+        journal = RunJournal(self.path)
+        attempt = journal.recover("q", "native")
+        self.assertEqual([message["content"] for message in attempt["messages"]], ["c", "3"])
+
+    def test_finished_and_compact(self):
+        """Test that finished generations survive a restart and compaction keeps only the given tasks."""
+        journal = RunJournal(self.path)
+        journal.log_plan("done", "react", "plan")
+        journal.log_done("done", {"query": "done", "policy_final_answer": 7})
+        journal.log_plan("pending", "react", "plan")
+        journal.log_plan("saved", "react", "plan")
+        journal.close()
+
+        journal = RunJournal(self.path)
+        self.assertEqual(journal.finished(), {"done": {"query": "done", "policy_final_answer": 7}})
+        self.assertIsNone(journal.recover("done", "react"))
+        journal.compact({"pending"})
+        journal.log_plan("pending", "react", "new plan")
+        journal.close()
+
+        with open(self.path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual({record["task"] for record in records}, {"pending"})
+        self.assertEqual(RunJournal(self.path).recover("pending", "react")["action_plan"], "new plan")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,8 +2,15 @@ import unittest
 import os
 import json
 import sys
+import tempfile
+import threading
+import time
+from unittest import mock
 
-from model.models import LiteLLMWrapper, AFMWrapper
+import litellm
+
+from model.models import LiteLLMWrapper, supports_n
+from model.response_cache import LLMResponseCache
 from utils.keystore import auth_litellm, auth_tools
 
 class TestModelWrappers(unittest.TestCase):
@@ -37,23 +44,18 @@ class TestModelWrappers(unittest.TestCase):
         # Print out the response for manual verification
         print(f"\nLiteLLM GPT-4o Response: {response_text[:100]}...")
     
-    def test_afm_wrapper(self):
-        """Test AFMWrapper with real API."""
-        # Initialize the wrapper
-        wrapper = AFMWrapper("afm-text-074", self.sampling_params)
-        
-        # Generate a response
-        response_text, _ = wrapper.generate(self.sample_messages)
-        
-        # Assert response is not empty
-        self.assertIsNotNone(response_text)
-        self.assertTrue(len(response_text) > 0)
-        
-        # Print out the response for manual verification
-        print(f"\nAFM Response: {response_text[:100]}...")
+    def test_litellm_wrapper_generate_n(self):
+        """Test that several samples come back for one prompt, with and without provider n support."""
+        for model in ["gpt-4o", "anthropic/claude-3-5-sonnet-20241022"]:
+            wrapper = LiteLLMWrapper(model, self.sampling_params)
+            samples = wrapper.generate_n(self.sample_messages, 3)
+
+            self.assertEqual(len(samples), 3)
+            self.assertTrue(all(len(sample) > 0 for sample in samples))
+            print(f"\nLiteLLM {model} samples (n supported: {wrapper.supports_n}): {[sample[:50] for sample in samples]}")
 
     def test_tool_usage(self):
-        """Test tool usage with both wrappers."""
+        """Test tool usage with the LiteLLM wrapper."""
         tool_messages = [
             {"role": "user", "content": "What is the current weather in San Francisco?"}
         ]
@@ -65,29 +67,143 @@ class TestModelWrappers(unittest.TestCase):
             tool_list=["current_weather"]
         )
         
-        # Test with AFM wrapper
-        afm_wrapper = AFMWrapper("afm-text-074", self.sampling_params)
-        afm_response, afm_history = afm_wrapper.generate(
-            tool_messages.copy(), 
-            tool_list=["current_weather"]
-        )
-
-        print(afm_history)
-        
-        # Assert both responses contain tool usage
         print(f"\nLiteLLM Tool Test Response: {litellm_response[:100]}...")
         print(f"LiteLLM tool history has {len(litellm_history)} messages")
         
-        print(f"\nAFM Tool Test Response: {afm_response[:100]}...")
-        print(f"AFM tool history has {len(afm_history)} messages")
-        
         # Check for tool calls in history
         has_litellm_tool_calls = any("tool_calls" in msg if isinstance(msg, dict) else False for msg in litellm_history)
-        has_afm_tool_calls = any("tool_calls" in msg if isinstance(msg, dict) else False for msg in afm_history)
-        
-        # At least one of the models should have made tool calls
-        self.assertTrue(has_litellm_tool_calls or has_afm_tool_calls, 
-                        "Neither model made tool calls")
+        self.assertTrue(has_litellm_tool_calls, "The model made no tool calls")
+
+
+class FakeCompletion:
+    """Stands in for ``litellm.completion``: numbers every choice it returns and records each request's ``n``.
+    With ``max_choices`` it returns at most that many choices, and with ``fail_n`` it rejects requests for n > 1."""
+
+    def __init__(self, max_choices=None, fail_n=False):
+        self.max_choices = max_choices
+        self.fail_n = fail_n
+        self.requests = []
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, messages, tools=None, n=1, **kwargs):
+        with self.lock:
+            self.requests.append(n)
+            if self.fail_n and n > 1:
+                raise ValueError("n is not supported")
+            choices = []
+            for _ in range(min(n, self.max_choices or n)):
+                choices.append({"index": len(choices), "finish_reason": "stop", "message": {"role": "assistant", "content": f"sample {self.count}"}})
+                self.count += 1
+        return litellm.ModelResponse(choices=choices)
+
+
+class OneShotWrapper(LiteLLMWrapper):
+    """Gives up on the first failed request instead of sleeping between retries."""
+
+    max_retries_other = 1
+
+
+class GenerateNTests(unittest.TestCase):
+    """Offline tests for sampling several completions of one prompt."""
+
+    def setUp(self):
+        self.prompt = [{"role": "user", "content": "Next step?"}]
+
+    def make_wrapper(self, completion, n_supported, response_cache=None):
+        with mock.patch.object(litellm, "get_supported_openai_params", return_value=["n"] if n_supported else ["temperature"]):
+            wrapper = OneShotWrapper("fake", {"model": "openai/fake", "temperature": 1}, response_cache=response_cache)
+        patcher = mock.patch.object(litellm, "completion", completion)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return wrapper
+
+    def test_supports_n(self):
+        """Test that n support is read from litellm and a lookup failure counts as unsupported."""
+        with mock.patch.object(litellm, "get_supported_openai_params", return_value=["n", "temperature"]):
+            self.assertTrue(supports_n("openai/gpt-4o"))
+        with mock.patch.object(litellm, "get_supported_openai_params", return_value=None):
+            self.assertFalse(supports_n("anthropic/claude-3-5-sonnet-20241022"))
+        with mock.patch.object(litellm, "get_supported_openai_params", side_effect=ValueError("unknown model")):
+            self.assertFalse(supports_n("unknown/model"))
+
+    def test_one_request_when_n_supported(self):
+        """Test that all samples come from a single request when the provider takes n."""
+        completion = FakeCompletion()
+        samples = self.make_wrapper(completion, n_supported=True).generate_n(self.prompt, 3)
+        self.assertEqual(samples, ["sample 0", "sample 1", "sample 2"])
+        self.assertEqual(completion.requests, [3])
+
+    def test_parallel_requests_without_n(self):
+        """Test that each sample is its own request when the provider does not take n."""
+        completion = FakeCompletion()
+        samples = self.make_wrapper(completion, n_supported=False).generate_n(self.prompt, 3)
+        self.assertEqual(sorted(samples), ["sample 0", "sample 1", "sample 2"])
+        self.assertEqual(completion.requests, [1, 1, 1])
+
+    def test_missing_choices_are_filled(self):
+        """Test that fewer choices than asked for, or a failed n request, are made up with single requests."""
+        completion = FakeCompletion(max_choices=1)
+        samples = self.make_wrapper(completion, n_supported=True).generate_n(self.prompt, 3)
+        self.assertEqual(len(set(samples)), 3)
+        self.assertEqual(completion.requests, [3, 1, 1])
+
+        completion = FakeCompletion(fail_n=True)
+        samples = self.make_wrapper(completion, n_supported=True).generate_n(self.prompt, 2)
+        self.assertEqual(sorted(samples), ["sample 0", "sample 1"])
+        self.assertEqual(completion.requests, [2, 1, 1])
+
+    def test_cached_samples_stay_distinct(self):
+        """Test that a cache replaying sampled responses keeps each of the n samples apart."""
+        with tempfile.TemporaryDirectory() as tmp:
+            response_cache = LLMResponseCache(os.path.join(tmp, "llm.sqlite"), any_temperature=True)
+            completion = FakeCompletion()
+            wrapper = self.make_wrapper(completion, n_supported=False, response_cache=response_cache)
+            samples = wrapper.generate_n(self.prompt, 3)
+            self.assertEqual(sorted(samples), ["sample 0", "sample 1", "sample 2"])
+
+            self.assertEqual(sorted(wrapper.generate_n(self.prompt, 3)), sorted(samples))
+            self.assertEqual(completion.requests, [1, 1, 1])
+
+
+
+class HedgedRequestTests(unittest.TestCase):
+    """Offline tests for the resources a hedged request holds."""
+
+    def test_hedge_takes_own_slot_and_endpoint(self):
+        """Test that the duplicate of a slow call goes to another endpoint under its own concurrency slot, and that
+        the slow call keeps its slot and endpoint until it finishes."""
+        released = threading.Event()
+        api_bases = []
+
+        def completion(messages, tools=None, n=1, api_base=None, **kwargs):
+            api_bases.append(api_base)
+            if len(api_bases) == 1:
+                released.wait(5)
+            return litellm.ModelResponse(choices=[{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": api_base}}])
+
+        sampling_params = {"model": "openai/fake-hedged", "endpoints": [{"api_base": "http://a"}, {"api_base": "http://b"}]}
+        with mock.patch.object(litellm, "get_supported_openai_params", return_value=[]):
+            wrapper = OneShotWrapper(
+                "fake", sampling_params, adaptive_concurrency=True, hedging={"percentile": 50, "max_extra_fraction": 1.0}
+            )
+        for _ in range(wrapper.hedge_policy.min_samples):
+            wrapper.hedge_policy.record_latency(wrapper._hedge_key(), 0.01)
+
+        controller = wrapper.concurrency_controller
+        with mock.patch.object(litellm, "completion", completion):
+            output, _ = wrapper.generate([{"role": "user", "content": "Next step?"}])
+            self.assertEqual(controller.in_flight, 1)
+            self.assertEqual([endpoint.outstanding for endpoint in wrapper.endpoint_pool.endpoints], [1, 0])
+            released.set()
+            time.sleep(0.1)
+
+        self.assertEqual(output, "http://b")
+        self.assertEqual(api_bases, ["http://a", "http://b"])
+        self.assertEqual((controller.num_requests, controller.peak_in_flight, controller.in_flight), (2, 2, 0))
+        self.assertEqual([endpoint.num_requests for endpoint in wrapper.endpoint_pool.endpoints], [1, 1])
+        self.assertEqual([endpoint.outstanding for endpoint in wrapper.endpoint_pool.endpoints], [0, 0])
+
 
 if __name__ == "__main__":
     unittest.main()
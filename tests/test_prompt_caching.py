@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for provider prompt caching markers.
+"""
+
+import unittest
+
+from model.prompt_caching import CACHE_CONTROL, MAX_BREAKPOINTS, apply_cache_control, supports_cache_control, text_blocks
+from model.responses_api import build_request
+
+
+class FakeMessage:
+    """Stands in for a litellm assistant message object."""
+
+    def model_dump(self):
+        return {"role": "assistant", "content": "Thought: ...", "tool_calls": None}
+
+
+def breakpoints(messages):
+    return [
+        i for i, message in enumerate(messages)
+        if isinstance(message["content"], list) and any("cache_control" in block for block in message["content"])
+    ]
+
+
+class PromptCachingTests(unittest.TestCase):
+    """Tests for where cache breakpoints are placed."""
+
+    def test_supported_models(self):
+        """Test that only providers without automatic prefix caching get markers."""
+        self.assertTrue(supports_cache_control("anthropic/claude-sonnet-4-20250514"))
+        self.assertTrue(supports_cache_control("bedrock/us.anthropic.claude-3-7-sonnet-20250219-v1:0"))
+        self.assertFalse(supports_cache_control("openai/gpt-4o"))
+        self.assertFalse(supports_cache_control("gemini/gemini-2.5-pro"))
+
+    def test_single_turn_marks_system_prompt(self):
+        """Test that a ReAct style request caches the system prompt and leaves the input untouched."""
+        messages = [{"role": "system", "content": "instructions"}, {"role": "user", "content": "question"}]
+        marked = apply_cache_control(messages)
+        self.assertEqual(breakpoints(marked), [0])
+        self.assertEqual(marked[0]["content"][0]["text"], "instructions")
+        self.assertEqual(messages[0]["content"], "instructions")
+
+    def test_multi_turn_marks_previous_turn(self):
+        """Test that the turn before the newest one is marked so each step reads the last step's cache."""
+        messages = [
+            {"role": "system", "content": "instructions"},
+            {"role": "user", "content": "question"},
+            FakeMessage(),
+            {"role": "tool", "tool_call_id": "1", "content": "observation"},
+        ]
+        marked = apply_cache_control(messages)
+        self.assertEqual(breakpoints(marked), [0, 2])
+
+    def test_existing_markers_are_kept(self):
+        """Test that builder-placed breakpoints count towards the provider limit."""
+        messages = [{"role": "user", "content": text_blocks("preamble", "sample")} for _ in range(MAX_BREAKPOINTS)]
+        messages.insert(0, {"role": "system", "content": "instructions"})
+        marked = apply_cache_control(messages)
+        self.assertEqual(marked[0]["content"], "instructions")
+        self.assertEqual(marked[1]["content"][0]["cache_control"], CACHE_CONTROL)
+
+    def test_judge_request_keeps_markers(self):
+        """Test that a marked judge prompt is sent as chat messages on the API that serves the model."""
+        messages = [{"role": "user", "content": text_blocks("rubric", "trajectories")}]
+
+        api, kwargs = build_request(messages, {"model": "anthropic/claude-sonnet-4-20250514", "temperature": 0})
+        self.assertEqual(api, "completion")
+        self.assertEqual(kwargs, {
+            "model": "anthropic/claude-sonnet-4-20250514", "temperature": 0, "messages": messages, "thinking": None,
+        })
+        self.assertEqual(kwargs["messages"][0]["content"][0]["cache_control"], CACHE_CONTROL)
+
+        thinking = {"type": "enabled", "budget_tokens": 1024}
+        api, kwargs = build_request(messages, {"model": "anthropic/claude-sonnet-4-20250514", "thinking": thinking})
+        self.assertEqual(kwargs["thinking"], thinking)
+
+        plain = [{"role": "user", "content": "rubric trajectories"}]
+        for model in ("openai/o3", "o1-mini"):
+            api, kwargs = build_request(plain, {"model": model})
+            self.assertEqual(api, "responses")
+            self.assertEqual(kwargs, {"model": model, "input": plain})
+        self.assertEqual(build_request(plain, {"model": "openai/gpt-4o"})[0], "completion")
+
+
+if __name__ == "__main__":
+    unittest.main()
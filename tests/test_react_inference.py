@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for generating ReAct chains with full retries.
+"""
+
+import unittest
+
+from inference.action_plan_cache import configure_action_plan_cache, get_action_plan_cache
+from inference.react_inference import generate, get_retry_report
+
+CALCULATOR_STEP = 'Thought: Add the numbers.\nAction: calculator\nAction Input: {"operation": "3 + 4"}'
+FINISH_STEP = 'Thought: I know the answer.\nAction: finish\nAction Input: {"answer": 7}'
+
+
+class FakeModel:
+    """Answers each prompt with the next of ``outputs``, repeating the last one. An exception fails the call the way
+    LiteLLMWrapper.generate does once its retries run out."""
+
+    model = "fake"
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+
+    def generate(self, prompt, raise_errors=False):
+        output = self.outputs.pop(0) if len(self.outputs) > 1 else self.outputs[0]
+        if isinstance(output, Exception):
+            if raise_errors:
+                raise output
+            return str(output), prompt
+        return output, prompt
+
+
+class ReActGenerateTests(unittest.TestCase):
+    """Tests for resuming a failed chain, reporting its attempts and caching its action plan."""
+
+    def setUp(self):
+        configure_action_plan_cache()
+
+    def run_task(self, outputs, num_full_retries, index):
+        return generate(
+            [{"prompt": f"Resume {index}: what is 3 + 4?", "tools": ["calculator"]}],
+            FakeModel(outputs),
+            num_retries=2,
+            num_full_retries=num_full_retries,
+            max_depth=5,
+            index=index,
+            action_plan="Add the numbers.",
+        )
+
+    def test_resumed_chain_keeps_stuck_step(self):
+        """Test that a stuck chain resumes from its last valid step, which stays on the answering trajectory."""
+        generation, index = self.run_task([CALCULATOR_STEP, "not a step", "not a step", FINISH_STEP], 2, 200)
+
+        self.assertEqual(index, 200)
+        self.assertEqual(generation["policy_answer"], 7)
+        (answered,) = generation["full_message_history"]
+        self.assertTrue(answered["answer_found"])
+        self.assertEqual([step["action"] for step in answered["history"]], ["calculator", "finish"])
+
+        report = get_retry_report()["per_task"]["200"]
+        self.assertEqual(
+            (report["answered"], report["chain_runs"], report["resumed"], report["restarted"]), (True, 2, 1, 0)
+        )
+        self.assertEqual(report["wasted_generations"], 2)
+
+    def test_resumed_chain_backs_off(self):
+        """Test that a step still stuck after being resumed is pruned, and the dead end is reported after the answer."""
+        outputs = [CALCULATOR_STEP] + ["not a step"] * 4 + [FINISH_STEP]
+        generation, _ = self.run_task(outputs, 3, 202)
+
+        self.assertEqual(generation["policy_answer"], 7)
+        answered, dead_end = generation["full_message_history"]
+        self.assertTrue(answered["answer_found"])
+        self.assertEqual([step["action"] for step in answered["history"]], ["finish"])
+        self.assertFalse(dead_end["answer_found"])
+        self.assertEqual([step["action"] for step in dead_end["history"]], ["calculator"])
+        self.assertEqual(get_retry_report()["per_task"]["202"]["resumed"], 2)
+
+    def test_failed_plan_is_not_cached(self):
+        """Test that a plan call that fails is not reused, so the next attempt generates a new plan."""
+        task = {"prompt": "Plan: what is 3 + 4?", "tools": ["calculator"]}
+        model = FakeModel([RuntimeError("overloaded"), "not a step", "not a step", "Add the numbers.", FINISH_STEP])
+        generation, _ = generate([task], model, num_retries=2, num_full_retries=2, max_depth=5, index=201)
+
+        self.assertEqual(generation["policy_answer"], 7)
+        self.assertEqual(generation["action_plan"], "Add the numbers.")
+        plan_cache = get_action_plan_cache()
+        self.assertEqual(plan_cache.get(plan_cache.make_key("fake", task["prompt"], task["tools"])), "Add the numbers.")
+        report = get_retry_report()["per_task"]["201"]
+        self.assertEqual((report["answered"], report["restarted"]), (True, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for streaming tree JSON.
+"""
+
+import io
+import json
+import unittest
+
+from tree.react_json import dump_tree_json, iter_tree_json
+
+
+class FakeNode:
+    """Stands in for a ReActNode: serialized through _json_fields, with its children left as nodes."""
+
+    def __init__(self, value, children=()):
+        self.value = value
+        self.children = list(children)
+
+    def _json_fields(self):
+        return {"value": self.value, "children": self.children, "metadata": {}}
+
+    def to_json(self):
+        return {"value": self.value, "children": [child.to_json() for child in self.children], "metadata": {}}
+
+
+class TreeJsonTests(unittest.TestCase):
+    """Tests for the explicit-stack JSON serializer."""
+
+    def test_matches_json_dumps(self):
+        """Test that the streamed text equals json.dumps of the nested dicts, with and without indent."""
+        tree = FakeNode({"prompt": [{"role": "user", "content": "é\n\"x\""}], 1: None, True: 2.5}, [
+            FakeNode("a", [FakeNode([]), FakeNode({})]),
+            FakeNode(None),
+        ])
+        for indent in [None, 0, 2, 4]:
+            self.assertEqual("".join(iter_tree_json(tree, indent)), json.dumps(tree.to_json(), indent=indent))
+
+    def test_deep_tree(self):
+        """Test that a tree far deeper than the recursion limit streams without error."""
+        node = leaf = FakeNode("leaf")
+        for depth in range(20000):
+            node = FakeNode(depth, [node])
+        buffer = io.StringIO()
+        dump_tree_json(node, buffer)
+        text = buffer.getvalue()
+        self.assertTrue(text.startswith('{"value": 19999, "children": [{"value": 19998'))
+        self.assertEqual(text.count('"value"'), 20001)
+        self.assertIn(json.dumps(leaf.to_json()), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
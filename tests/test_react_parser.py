@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for parsing ReAct steps.
+"""
+
+import json
+import os
+import unittest
+
+from tree.react_parser import ReActParseError, parse_action_input, parse_react_step
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "react_policy_outputs.jsonl")
+
+
+def load_corpus():
+    with open(CORPUS_PATH) as f:
+        return [json.loads(line) for line in f]
+
+
+class ReActParserTests(unittest.TestCase):
+    """Tests for the single-pass ReAct step parser."""
+
+    def test_corpus(self):
+        """Test every policy output in the benchmark corpus parses to its expected step or fails with its expected reason."""
+        for case in load_corpus():
+            with self.subTest(case["id"]):
+                if "expected" in case:
+                    step = parse_react_step(case["output"])
+                    self.assertEqual(
+                        {"thought": step.thought, "action": step.action, "action_input": step.action_input},
+                        case["expected"],
+                    )
+                else:
+                    with self.assertRaises(ReActParseError) as raised:
+                        parse_react_step(case["output"])
+                    self.assertIn(case["error"], raised.exception.reason)
+
+    def test_error_positions(self):
+        """Test that errors point at where parsing failed in the output."""
+        output = 'Thought: Search it.\nAction: google_search\nAction Input: {"query": "Chile", "num": 3 4}'
+        with self.assertRaises(ReActParseError) as raised:
+            parse_react_step(output)
+        self.assertEqual(raised.exception.position, output.index("4}"))
+
+        output = 'Thought: Search it.\nAction: google_search\nAction Input: query'
+        with self.assertRaises(ReActParseError) as raised:
+            parse_react_step(output)
+        self.assertEqual(raised.exception.position, output.index("query"))
+
+    def test_action_input_text(self):
+        """Test that the rendered Action Input is the object alone, on one line, and the end is just past it."""
+        output = 'Action: python_interpreter\nAction Input: {"code": "x = 1\nprint(x)"}\nEnd Action'
+        step = parse_react_step(output)
+        self.assertEqual(step.action_input_text, '{"code": "x = 1 print(x)"}')
+        self.assertEqual(step.action_input, {"code": "x = 1\nprint(x)"})
+        self.assertEqual(output[step.end:], "\nEnd Action")
+        self.assertEqual(parse_action_input(step.action_input_text), ({"code": "x = 1 print(x)"}, len(step.action_input_text)))
+
+
+if __name__ == "__main__":
+    unittest.main()
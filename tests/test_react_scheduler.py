@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for advancing many ReAct trees from one frontier.
+"""
+
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from inference.react_inference import get_retry_report
+from inference.react_scheduler import ReActScheduler
+from tree.react_tree import ReActTreeManager
+
+CALCULATOR_STEP = 'Thought: Add the numbers.\nAction: calculator\nAction Input: {"operation": "3 + 4"}'
+FINISH_STEP = 'Thought: I know the answer.\nAction: finish\nAction Input: {"answer": 7}'
+
+
+class FakeAsyncModel:
+    """Answers each prompt with the next of ``outputs`` (repeating the last one); an exception is raised instead."""
+
+    model = "fake"
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+        self.prompts = []
+
+    async def agenerate(self, prompt, raise_errors=False):
+        await asyncio.sleep(0)
+        self.prompts.append(prompt)
+        output = self.outputs.pop(0) if len(self.outputs) > 1 else self.outputs[0]
+        if isinstance(output, Exception):
+            raise output
+        return output, prompt
+
+
+def run_tasks(scheduler, tasks):
+    async def main():
+        await scheduler.start()
+        try:
+            return await asyncio.gather(*[
+                scheduler.generate({"prompt": prompt, "tools": ["calculator"]}, index, "Add the numbers.")
+                for prompt, index in tasks
+            ])
+        finally:
+            await scheduler.stop()
+    return asyncio.run(main())
+
+
+class ReActSchedulerTests(unittest.TestCase):
+    """Tests for the shared frontier, task completion and step retries."""
+
+    def test_deeper_nodes_first(self):
+        """Test that the frontier serves deeper nodes first and breaks ties by arrival order."""
+        scheduler = ReActScheduler(FakeAsyncModel([FINISH_STEP]), num_retries=1, max_depth=5)
+        scheduler.frontier = asyncio.PriorityQueue()
+        tree = ReActTreeManager("What is 3 + 4?", [])
+        scheduler._pending[id(tree)] = [0, None]
+
+        nodes = [SimpleNamespace(name=name, depth=depth) for name, depth in [("a", 1), ("b", 0), ("c", 2), ("d", 1)]]
+        for node in nodes:
+            scheduler._push(node, tree, 0)
+
+        order = [scheduler.frontier.get_nowait()[2].name for _ in nodes]
+        self.assertEqual(order, ["c", "a", "d", "b"])
+        self.assertEqual(scheduler._pending[id(tree)][0], 4)
+
+    def test_tasks_complete_through_pending(self):
+        """Test that each task returns once none of its nodes is queued or running, and leaves nothing behind."""
+        model = FakeAsyncModel([CALCULATOR_STEP, CALCULATOR_STEP, FINISH_STEP])
+        results = run_tasks(ReActScheduler(model, num_retries=2, max_depth=5, max_in_flight=1), [("What is 3 + 4?", 0)])
+        generation, index = results[0]
+
+        self.assertEqual(index, 0)
+        self.assertEqual(generation["policy_answer"], 7)
+        self.assertEqual(len(model.prompts), 3)
+
+        scheduler = ReActScheduler(FakeAsyncModel([FINISH_STEP]), num_retries=2, max_depth=5, max_in_flight=2)
+        results = run_tasks(scheduler, [(f"Task {i}: what is 3 + 4?", i) for i in range(5)])
+        self.assertEqual([index for _, index in results], list(range(5)))
+        self.assertTrue(all(generation["policy_answer"] == 7 for generation, _ in results))
+        self.assertEqual(scheduler._pending, {})
+        self.assertTrue(all(worker.done() for worker in scheduler._workers))
+
+    def test_failed_step_is_retried(self):
+        """Test that a step that raises is queued again instead of ending its branch."""
+        model = FakeAsyncModel([RuntimeError("connection reset"), FINISH_STEP])
+        scheduler = ReActScheduler(model, num_retries=2, max_depth=5)
+        generation, _ = run_tasks(scheduler, [("Retry: what is 3 + 4?", 100)])[0]
+
+        self.assertEqual(generation["policy_answer"], 7)
+        self.assertEqual(scheduler.num_step_errors, 1)
+        self.assertEqual(len(model.prompts), 2)
+
+    def test_stuck_chain_resumes(self):
+        """Test that a chain whose step ran out of retries resumes from its last valid step on the next full retry."""
+        model = FakeAsyncModel([CALCULATOR_STEP, "not a step", "not a step", FINISH_STEP])
+        scheduler = ReActScheduler(model, num_retries=2, max_depth=5, num_full_retries=2)
+        generation, _ = run_tasks(scheduler, [("Resume: what is 3 + 4?", 101)])[0]
+
+        self.assertEqual(generation["policy_answer"], 7)
+        self.assertEqual([step["action"] for step in generation["full_message_history"][0]["history"]], ["calculator", "finish"])
+        report = get_retry_report()["per_task"]["101"]
+        self.assertEqual((report["answered"], report["resumed"], report["restarted"]), (True, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
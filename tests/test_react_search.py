@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for searching a tree of ReAct steps.
+"""
+
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from inference.react_inference import dedupe_sampled_next_nodes
+from inference.react_search import ReActTreeSearch, ToolResultCache
+from tree.react_tree import ReActTreeManager
+
+
+def finish_step(answer):
+    return f'Thought: I know the answer.\nAction: finish\nAction Input: {{"answer": {answer}}}'
+
+
+class FakeModel:
+    """Returns the given samples for every prompt and counts the requests."""
+
+    model = "fake"
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.requests = 0
+
+    def generate_n(self, prompt, n):
+        self.requests += 1
+        return self.samples[:n]
+
+
+class ToolResultCacheTests(unittest.TestCase):
+    """Tests for sharing tool calls between sibling steps."""
+
+    def test_concurrent_identical_calls_run_once(self):
+        """Test that identical calls made at the same time run the tool once and all get its result."""
+        cache = ToolResultCache()
+        calls = []
+
+        def tool(args):
+            calls.append(args)
+            time.sleep(0.05)
+            return f"result {args['q']}"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.call("search", {"q": "x"}, tool))) for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["result x"] * 4)
+        self.assertEqual(cache.num_shared, 3)
+
+    def test_failed_calls_are_retried(self):
+        """Test that a failed call is not cached."""
+        cache = ToolResultCache()
+        outcomes = [RuntimeError("timeout"), "ok"]
+
+        def tool(args):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with self.assertRaises(RuntimeError):
+            cache.call("search", {"q": "x"}, tool)
+        self.assertEqual(cache.call("search", {"q": "x"}, tool), "ok")
+
+
+class ReActTreeSearchTests(unittest.TestCase):
+    """Tests for scoring sampled steps and picking the best trajectory."""
+
+    def test_majority_answer_wins(self):
+        """Test that the answer most samples agree on is chosen, and duplicate siblings are pruned."""
+        model = FakeModel([finish_step(8), finish_step(7), finish_step(7), finish_step(7)])
+        tree = ReActTreeManager("What is 3 + 4?", [])
+        tree.add_action_plan("Answer directly.")
+
+        best = ReActTreeSearch(model, num_retries=1, max_depth=3, width=4, beam_size=1).run(tree)
+
+        self.assertEqual(model.requests, 1)
+        self.assertEqual(tree.policy_final_answer, 7)
+        self.assertIs(tree.best_leaf, best)
+        self.assertAlmostEqual(best.llm_score, 0.75)
+        self.assertEqual(tree.root.N, 4)
+        self.assertEqual(sum(child.pruned for child in tree.root.children), 2)
+        self.assertIn("best_trajectory", tree.get_all_flattened_history()[0])
+
+    def test_budget_limits_samples(self):
+        """Test that no more steps are sampled than the budget allows."""
+        model = FakeModel(["not a step"] * 4)
+        tree = ReActTreeManager("What is 3 + 4?", [])
+        tree.add_action_plan("Answer directly.")
+
+        ReActTreeSearch(model, num_retries=10, max_depth=3, width=4, beam_size=1, budget=6).run(tree)
+
+        self.assertEqual(tree.root.N, 6)
+        self.assertIsNone(tree.policy_final_answer)
+
+    def test_failed_round_spends_one_retry(self):
+        """Test that a round whose samples all fail spends one of the node's retries, not one per sample."""
+        model = FakeModel(["not a step"] * 4)
+        tree = ReActTreeManager("What is 3 + 4?", [])
+        tree.add_action_plan("Answer directly.")
+
+        ReActTreeSearch(model, num_retries=3, max_depth=3, width=4, beam_size=1).run(tree)
+
+        self.assertEqual(model.requests, 3)
+        self.assertEqual(tree.root.num_retries, 3)
+        self.assertEqual(len(tree.root.errors), 12)
+
+
+class DedupeSampledNextNodesTests(unittest.TestCase):
+    """Tests for queueing the results of sampling several steps per node."""
+
+    def test_failed_samples_retry_parent_once(self):
+        """Test that a parent is queued again only if all its samples failed, and then only once."""
+        expanded, failed = SimpleNamespace(children=[]), SimpleNamespace(children=[])
+        child = SimpleNamespace(children=[])
+        num_children = [len(expanded.children), len(failed.children)]
+        expanded.children.append(child)
+
+        # post_process returns a valid sample's child and queues the parent of each failed sample
+        next_nodes = dedupe_sampled_next_nodes([expanded, failed], num_children, [child, expanded, failed, expanded, failed])
+
+        self.assertEqual([id(node) for node in next_nodes], [id(child), id(failed)])
+
+
+if __name__ == "__main__":
+    unittest.main()
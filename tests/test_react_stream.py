@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for incremental parsing of streamed ReAct steps.
+"""
+
+import unittest
+
+from tree.react_stream import ReActStreamParser
+
+STEP = (
+    'Thought: I should run some code.\n'
+    'Action: python_interpreter\n'
+    'Action Input: {"code": "d = {\\"a\\": 1}\nprint(\\"}\\")"}\n'
+)
+TRAILER = 'End Action\nObservation: made up by the model\nThought: more tokens we do not need'
+
+
+def feed_in_chunks(text, size):
+    """Feed ``text`` in chunks of ``size`` and return the parser and how many characters it read."""
+    parser = ReActStreamParser()
+    for start in range(0, len(text), size):
+        if parser.feed(text[start:start + size]):
+            return parser, start + size
+    return parser, len(text)
+
+
+class ReActStreamParserTests(unittest.TestCase):
+    """Tests for detecting a complete Action Input while the step is still streaming."""
+
+    def test_stops_after_action_input(self):
+        """Test that the step is complete as soon as the JSON closes, for any chunking."""
+        for size in [1, 2, 5, 13, 1000]:
+            parser, read = feed_in_chunks(STEP + TRAILER, size)
+            self.assertTrue(parser.complete)
+            self.assertEqual(parser.step, STEP.rstrip("\n"))
+            self.assertLessEqual(read, len(STEP) + size)
+
+    def test_braces_and_markers_inside_strings(self):
+        """Test that braces, escaped quotes and End Action inside string values do not end the step."""
+        text = 'Thought: t\nAction: finish\nAction Input: {"answer": "x} End Action {\\"y\\""}'
+        parser, _ = feed_in_chunks(text + "\nEnd Action", 3)
+        self.assertEqual(parser.step, text)
+
+    def test_incomplete_step(self):
+        """Test that a step cut off mid-JSON is not complete and keeps all its text."""
+        text = 'Thought: t\nAction: search\nAction Input: {"query": {"q": "a"}'
+        parser, _ = feed_in_chunks(text, 4)
+        self.assertFalse(parser.complete)
+        self.assertEqual(parser.step, text)
+
+    def test_end_action_without_json(self):
+        """Test that End Action still completes a step whose Action Input is not a JSON object."""
+        parser, _ = feed_in_chunks("Thought: t\nAction: finish\nAction Input: 42\nEnd Action\nmore", 2)
+        self.assertTrue(parser.complete)
+        self.assertEqual(parser.step, "Thought: t\nAction: finish\nAction Input: 42\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
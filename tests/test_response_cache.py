@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the persistent LLM response cache.
+"""
+
+import os
+import tempfile
+import unittest
+
+from model.response_cache import LLMResponseCache
+from utils.disk_cache import DiskCache
+
+
+class FakeMessage:
+    """Stands in for a litellm message object."""
+
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+        self.tool_calls = None
+
+    def model_dump(self):
+        return {"role": self.role, "content": self.content, "tool_calls": self.tool_calls}
+
+
+class LLMResponseCacheTests(unittest.TestCase):
+    """Tests for keying, temperature gating and eviction."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "llm.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_message_objects_match_dicts(self):
+        """Test that message objects and plain dicts produce the same key."""
+        cache = LLMResponseCache(self.path)
+        params = {"model": "openai/gpt-4o", "temperature": 0}
+        as_dicts = [{"role": "user", "content": "hi"}]
+        as_objects = [FakeMessage("user", "hi")]
+        self.assertEqual(cache.make_key(as_dicts, params), cache.make_key(as_objects, params))
+
+        cache.set(as_objects, params, {"content": "hello"})
+        self.assertEqual(cache.get(as_dicts, params), {"content": "hello"})
+
+    def test_key_depends_on_request(self):
+        """Test that the model, tools and sampling params all change the key."""
+        cache = LLMResponseCache(self.path)
+        messages = [{"role": "user", "content": "hi"}]
+        params = {"model": "openai/gpt-4o", "temperature": 0}
+        key = cache.make_key(messages, params)
+        self.assertNotEqual(key, cache.make_key(messages, {**params, "model": "openai/o3"}))
+        self.assertNotEqual(key, cache.make_key(messages, {**params, "max_tokens": 10}))
+        self.assertNotEqual(key, cache.make_key(messages, params, tools=[{"type": "function"}]))
+
+    def test_temperature_gating(self):
+        """Test that sampled requests are only cached when explicitly allowed."""
+        messages = [{"role": "user", "content": "hi"}]
+        params = {"model": "openai/gpt-4o", "temperature": 0.7}
+
+        cache = LLMResponseCache(self.path)
+        cache.set(messages, params, "sampled")
+        self.assertIsNone(cache.get(messages, params))
+
+        cache = LLMResponseCache(self.path, any_temperature=True)
+        cache.set(messages, params, "sampled")
+        self.assertEqual(cache.get(messages, params), "sampled")
+
+    def test_lru_eviction(self):
+        """Test that the store stays near its size budget and keeps recently read entries."""
+        store = DiskCache(self.path, max_size_bytes=10000)
+        store.set("keep", "x" * 98)
+        for i in range(1000):
+            if i % 32 == 0:
+                store.get("keep")
+            store.set(f"key-{i}", "x" * 98)
+        self.assertLessEqual(store.size_bytes(), 10000 + DiskCache.EVICTION_CHECK_INTERVAL * 100)
+        self.assertIn("keep", store)
+        self.assertGreater(store.evictions, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for the shared LLM retry policy.
+"""
+
+import time
+import unittest
+
+from model.retry_policy import RetryPolicy, get_provider_cooldown, is_rate_limit_error, provider_of, retry_after_seconds
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, message="rate limited", headers=None):
+        super().__init__(message)
+        self.response = FakeResponse(headers or {})
+
+
+class RetryAfterTests(unittest.TestCase):
+    """Tests for reading server wait hints."""
+
+    def test_retry_after_header(self):
+        """Test that Retry-After and Retry-After-Ms are honored."""
+        self.assertEqual(retry_after_seconds(FakeRateLimitError(headers={"Retry-After": "7"})), 7.0)
+        self.assertEqual(retry_after_seconds(FakeRateLimitError(headers={"retry-after-ms": "1500"})), 1.5)
+
+    def test_openai_reset_headers(self):
+        """Test that only the exhausted OpenAI limit's reset time is used."""
+        headers = {
+            "x-ratelimit-remaining-requests": "10",
+            "x-ratelimit-reset-requests": "1s",
+            "x-ratelimit-remaining-tokens": "0",
+            "x-ratelimit-reset-tokens": "6m0s",
+        }
+        self.assertEqual(retry_after_seconds(FakeRateLimitError(headers=headers)), 360.0)
+
+    def test_message_hint(self):
+        """Test that a wait time in the error message is used as a fallback."""
+        error = FakeRateLimitError("Rate limit reached. Please try again in 20s.")
+        self.assertEqual(retry_after_seconds(error), 20.0)
+
+    def test_no_hint(self):
+        """Test that errors without a hint return None."""
+        self.assertIsNone(retry_after_seconds(FakeRateLimitError()))
+
+
+class RetryPolicyTests(unittest.TestCase):
+    """Tests for retry bookkeeping and provider cooldowns."""
+
+    def test_helpers(self):
+        """Test rate limit detection and provider extraction."""
+        self.assertTrue(is_rate_limit_error(FakeRateLimitError()))
+        self.assertFalse(is_rate_limit_error(ValueError("bad request")))
+        self.assertEqual(provider_of("anthropic/claude-opus-4-20250514"), "anthropic")
+
+    def test_hint_sets_provider_cooldown(self):
+        """Test that a server hint pauses every caller of the provider."""
+        policy = RetryPolicy("test-provider-cooldown", max_delay=5)
+        other = RetryPolicy("test-provider-cooldown")
+        state = policy.new_state()
+        delay = policy.next_delay(FakeRateLimitError(headers={"retry-after": "2"}), state)
+        self.assertGreaterEqual(delay, 2.0)
+        self.assertGreater(other.cooldown.remaining(), 1.5)
+
+    def test_sleep_waits_on_given_cooldown(self):
+        """Test that a sleep with an endpoint's cooldown waits that one out instead of the provider's."""
+        policy = RetryPolicy("test-provider-endpoint-sleep")
+        endpoint_cooldown = get_provider_cooldown("test-provider-endpoint-sleep@http://a")
+        endpoint_cooldown.extend(0.2)
+        policy.cooldown.extend(60)
+
+        started = time.monotonic()
+        policy.sleep(0, endpoint_cooldown)
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_gives_up(self):
+        """Test that retries stop after the configured number of failures."""
+        policy = RetryPolicy("test-provider-give-up", max_retries_other=2, other_delay=0)
+        state = policy.new_state()
+        self.assertEqual(policy.next_delay(ValueError("boom"), state), 0)
+        self.assertIsNone(policy.next_delay(ValueError("boom"), state))
+        self.assertEqual(str(state["error"]), "boom")
+
+    def test_backoff_is_capped(self):
+        """Test that exponential backoff never exceeds the cap plus jitter."""
+        policy = RetryPolicy("test-provider-cap", base_delay=15, max_delay=60)
+        self.assertLessEqual(policy.backoff_delay(14), 90)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for per-call token, latency and cost accounting.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from model.usage import STAGE_ACTION_PLAN, STAGE_REACT_STEP, UsageTracker, extract_usage, usage_scope
+
+
+def completion(prompt_tokens, completion_tokens, reasoning_tokens=0, cached_tokens=0):
+    return {
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "completion_tokens_details": {"reasoning_tokens": reasoning_tokens},
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+    }
+
+
+class UsageTrackerTests(unittest.TestCase):
+    """Tests for usage extraction and aggregation."""
+
+    def test_extract_usage(self):
+        """Test chat completions, responses API and anthropic style usage blocks."""
+        self.assertEqual(
+            extract_usage(completion(100, 20, reasoning_tokens=5, cached_tokens=64)),
+            {"prompt_tokens": 100, "completion_tokens": 20, "reasoning_tokens": 5, "cached_tokens": 64, "cache_write_tokens": 0},
+        )
+        responses_api = {"usage": {"input_tokens": 10, "output_tokens": 3, "output_tokens_details": {"reasoning_tokens": 2}}}
+        self.assertEqual(extract_usage(responses_api)["reasoning_tokens"], 2)
+        anthropic = {"usage": {"prompt_tokens": 50, "completion_tokens": 1, "cache_read_input_tokens": 40}}
+        self.assertEqual(extract_usage(anthropic)["cached_tokens"], 40)
+        self.assertEqual(extract_usage(None)["prompt_tokens"], 0)
+
+    def test_aggregates_per_task_and_stage(self):
+        """Test that calls are attributed to the task and stage in scope."""
+        tracker = UsageTracker()
+        with usage_scope(task=0):
+            with usage_scope(stage=STAGE_ACTION_PLAN):
+                tracker.record("m", completion(100, 10), latency=1.0)
+            with usage_scope(stage=STAGE_REACT_STEP):
+                tracker.record("m", completion(200, 20, cached_tokens=100), latency=2.0, retries=1)
+                tracker.record("m", completion(200, 20), latency=0.0, cache_hit=True)
+        with usage_scope(task=1, stage=STAGE_REACT_STEP):
+            tracker.record("m", latency=3.0, retries=2, error=RuntimeError("boom"))
+
+        summary = tracker.summary()
+        self.assertEqual(summary["run"]["calls"], 4)
+        self.assertEqual(summary["run"]["prompt_tokens"], 300)
+        self.assertEqual(summary["run"]["cache_hits"], 1)
+        self.assertEqual(summary["run"]["failed_calls"], 1)
+        self.assertEqual(summary["run"]["retries"], 3)
+        self.assertEqual(summary["per_stage"][STAGE_REACT_STEP]["calls"], 3)
+        self.assertEqual(summary["per_task"]["0"]["per_stage"][STAGE_ACTION_PLAN]["completion_tokens"], 10)
+        self.assertAlmostEqual(summary["per_task"]["0"]["cached_token_rate"], 100 / 300, places=3)
+
+    def test_scope_is_per_thread_and_coroutine(self):
+        """Test that concurrent tasks do not see each other's scope."""
+        tracker = UsageTracker()
+
+        def work(i):
+            with usage_scope(task=i, stage=STAGE_REACT_STEP):
+                tracker.record("m", completion(i, 0))
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(work, range(32)))
+
+        async def awork(i):
+            with usage_scope(task=100 + i):
+                await asyncio.sleep(0)
+                tracker.record("m", completion(100 + i, 0))
+
+        async def run():
+            await asyncio.gather(*[awork(i) for i in range(8)])
+
+        asyncio.run(run())
+        for call in tracker.calls:
+            self.assertEqual(call["task"], call["prompt_tokens"])
+
+    def test_save(self):
+        """Test that the summary and the per-call log are written to the output dir."""
+        tracker = UsageTracker()
+        tracker.record("m", completion(1, 1))
+        with tempfile.TemporaryDirectory() as tmp:
+            tracker.save(tmp, prefix="llm_grader_")
+            with open(os.path.join(tmp, "llm_grader_usage.json")) as f:
+                self.assertEqual(json.load(f)["run"]["calls"], 1)
+            with open(os.path.join(tmp, "llm_grader_usage_calls.jsonl")) as f:
+                self.assertEqual(len(f.readlines()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,3 +3,4 @@ from .code_executor import (
     SphereEngineCompilerResult,
     SphereEngineCompilersSubmissionFuture,
 )
+from .batch_submitter import SphereEngineSubmissionBatcher
@@ -0,0 +1,199 @@
+import logging
+import queue
+import threading
+import time
+import typing as t
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from tools.code.code_executor import (
+    SphereEngineCodeExecutor,
+    SphereEngineCompilerResult,
+    SphereEngineCompilersSubmissionFuture,
+)
+
+logger = logging.getLogger(__name__)
+
+SubmissionKey = t.Tuple[str, str, t.Optional[str], t.Optional[str]]
+
+
+class _PendingSubmission:
+    def __init__(self, code: str, language: str, version: t.Optional[str], input_data: t.Optional[str]):
+        self.key: SubmissionKey = (code, language, version, input_data)
+        self.future: Future = Future()
+
+
+class SphereEngineSubmissionBatcher:
+    """Aggregates code submissions from concurrent callers into Sphere Engine batches.
+
+    Callers from any thread hand in a snippet and get back a ``concurrent.futures.Future``. A
+    dispatcher thread gathers everything submitted within ``window_ms`` (up to ``max_batch_size``
+    snippets), submits the batch through ``batch_execute_async`` and resolves each caller's future
+    as soon as its own submission finishes executing. Identical snippets submitted within the same
+    window share a single submission. A snippet submitted while no other caller has one outstanding
+    is sent right away, since there is nobody to batch it with.
+    """
+
+    def __init__(
+        self,
+        executor: SphereEngineCodeExecutor,
+        window_ms: int = 50,
+        max_batch_size: int = 32,
+        pull_interval_ms: int = 250,
+        max_worker: int = 32,
+    ):
+        self.executor = executor
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self.pull_interval_ms = pull_interval_ms
+        self.max_worker = max_worker
+
+        # None tells the dispatcher to stop
+        self._queue: "queue.Queue[t.Optional[_PendingSubmission]]" = queue.Queue()
+        self._poll_pool = ThreadPoolExecutor(max_workers=max_worker)
+        self._dispatcher: t.Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        # submissions whose futures are not resolved yet, including those still queued
+        self._outstanding = 0
+        self._outstanding_lock = threading.Lock()
+
+        # stats
+        self.num_requests = 0
+        self.num_submissions = 0
+        self.num_batches = 0
+
+    def _ensure_started(self):
+        if self._dispatcher is not None:
+            return
+        with self._start_lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(
+                    target=self._dispatch_loop, name="sphere-engine-batcher", daemon=True
+                )
+                self._dispatcher.start()
+
+    def submit(
+        self,
+        code: str,
+        language: str,
+        version: t.Optional[str] = None,
+        input_data: t.Optional[str] = None,
+    ) -> Future:
+        with self._start_lock:
+            if self._closed:
+                raise RuntimeError("Cannot submit code after the batcher has been shut down.")
+        self._ensure_started()
+        pending = _PendingSubmission(code, language, version, input_data)
+        with self._outstanding_lock:
+            self._outstanding += 1
+        pending.future.add_done_callback(self._on_done)
+        self._queue.put(pending)
+        return pending.future
+
+    def _on_done(self, future: Future):
+        with self._outstanding_lock:
+            self._outstanding -= 1
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting snippets. Those already submitted are still sent and resolved."""
+        with self._start_lock:
+            if self._closed:
+                return
+            self._closed = True
+            dispatcher = self._dispatcher
+        if dispatcher is None:
+            self._poll_pool.shutdown(wait=wait)
+            return
+        # the dispatcher sends what is queued, then shuts the poll pool down
+        self._queue.put(None)
+        if wait:
+            dispatcher.join()
+            self._poll_pool.shutdown(wait=True)
+
+    def execute(
+        self,
+        code: str,
+        language: str,
+        version: t.Optional[str] = None,
+        input_data: t.Optional[str] = None,
+        timeout: t.Optional[float] = None,
+    ) -> SphereEngineCompilerResult:
+        """Blocking counterpart of ``submit`` with the same return type as ``execute_sync``."""
+        return self.submit(code, language, version, input_data).result(timeout=timeout)
+
+    def _collect_batch(self) -> t.Tuple[t.List[_PendingSubmission], bool]:
+        """The next batch to submit and whether ``shutdown`` was called while collecting it."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        with self._outstanding_lock:
+            alone = self._outstanding == 1
+        deadline = time.monotonic() + (0 if alone else self.window_ms / 1000)
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                pending = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                return batch, True
+            batch.append(pending)
+        return batch, False
+
+    def _dispatch_loop(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect_batch()
+            if not batch:
+                continue
+            try:
+                self._submit_batch(batch)
+            except Exception as e:
+                logger.exception("Error encountered while submitting code batch: ")
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+        self._poll_pool.shutdown(wait=False)
+
+    def _submit_batch(self, batch: t.List[_PendingSubmission]):
+        waiting: t.Dict[SubmissionKey, t.List[Future]] = {}
+        for pending in batch:
+            waiting.setdefault(pending.key, []).append(pending.future)
+
+        keys = list(waiting.keys())
+        self.num_requests += len(batch)
+        self.num_submissions += len(keys)
+        self.num_batches += 1
+        logger.debug(f"Submitting batch of {len(keys)} snippets for {len(batch)} callers.")
+
+        submissions = self.executor.batch_execute_async(
+            codes=[key[0] for key in keys],
+            languages=[key[1] for key in keys],
+            versions=[key[2] for key in keys],
+            input_data=[key[3] for key in keys],
+            max_worker=min(self.max_worker, len(keys)),
+        )
+
+        # batch_execute_async returns submissions in completion order and drops failed ones
+        for submission in submissions:
+            key = (submission.source, submission.language, submission.version, submission.input)
+            futures = waiting.pop(key, None)
+            if futures is None:
+                continue
+            self._poll_pool.submit(self._resolve, submission, futures)
+
+        for key, futures in waiting.items():
+            error = RuntimeError(f"Failed to submit code to Sphere Engine ({key[1]} - {key[2]}).")
+            for future in futures:
+                future.set_exception(error)
+
+    def _resolve(self, submission: SphereEngineCompilersSubmissionFuture, futures: t.List[Future]):
+        try:
+            result = submission.get_until_done(self.pull_interval_ms)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future in futures:
+            future.set_result(result)
@@ -0,0 +1,310 @@
+import ast
+import builtins
+import json
+import math
+import os
+import statistics
+import string
+import subprocess
+import sys
+import typing as t
+
+MAX_LOOP_ITERATIONS = 10_000
+MAX_LOOP_NESTING = 2
+MAX_STEPS = 100_000
+MAX_EXPONENT = 1_000
+MAX_REPEAT_OPERAND = 100_000
+# a single line (a huge repetition or power) can outgrow the step budget, so snippets run in a child
+# process capped in memory, CPU and wall time
+MAX_MEMORY_BYTES = 512 * 1024 * 1024
+MAX_CPU_SECONDS = 5
+TIMEOUT_SECONDS = 10
+
+ALLOWED_MODULES = {"math": math, "statistics": statistics}
+
+# added after python 3.9, the sandbox runtime, so they must keep failing there
+UNAVAILABLE_IN_RUNTIME = {"cbrt", "exp2", "sumprod", "correlation", "covariance", "linear_regression"}
+
+ALLOWED_BUILTINS = {
+    "abs", "all", "any", "bool", "chr", "dict", "divmod", "enumerate", "filter", "float",
+    "format", "int", "isinstance", "len", "list", "map", "max", "min", "ord", "print", "range",
+    "reversed", "round", "set", "sorted", "str", "sum", "tuple", "zip",
+    "True", "False", "None",
+}
+
+# methods on the values a snippet can build: lists, dicts, strings and numbers
+ALLOWED_METHODS = {
+    "append", "extend", "insert", "pop", "remove", "index", "count", "sort", "reverse", "copy",
+    "keys", "values", "items", "get", "update", "setdefault",
+    "join", "split", "strip", "lstrip", "rstrip", "lower", "upper", "title", "capitalize",
+    "replace", "format", "startswith", "endswith", "zfill", "ljust", "rjust", "center",
+    "is_integer", "real", "imag", "add", "union", "intersection", "difference",
+}
+
+ALLOWED_NODES = (
+    ast.Module, ast.Expr, ast.Assign, ast.AugAssign, ast.AnnAssign, ast.If, ast.For, ast.Pass,
+    ast.Break, ast.Continue, ast.Import, ast.ImportFrom, ast.alias,
+    ast.Name, ast.Load, ast.Store, ast.Constant, ast.Attribute, ast.Subscript, ast.Slice,
+    ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call, ast.keyword,
+    ast.List, ast.Tuple, ast.Dict, ast.Set, ast.Starred,
+    ast.ListComp, ast.DictComp, ast.SetComp, ast.GeneratorExp, ast.comprehension, ast.Lambda,
+    ast.arguments, ast.arg, ast.JoinedStr, ast.FormattedValue,
+    ast.operator, ast.unaryop, ast.boolop, ast.cmpop, ast.expr_context,
+)
+
+
+class FastPathBudgetExceeded(Exception):
+    pass
+
+
+def _is_large_constant(node: ast.AST, limit: int) -> bool:
+    return (
+        isinstance(node, ast.Constant)
+        and isinstance(node.value, (int, float))
+        and not isinstance(node.value, bool)
+        and abs(node.value) > limit
+    )
+
+
+def _is_plain_format_string(node: ast.AST) -> bool:
+    """``str.format`` is only allowed on literals whose fields cannot reach attributes or items."""
+    if not (isinstance(node, ast.Constant) and isinstance(node.value, str)):
+        return False
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(node.value) if field]
+    except ValueError:
+        return False
+    return not any("." in field or "[" in field for field in fields)
+
+
+def _range_is_bounded(call: ast.Call) -> bool:
+    """A literal ``range(...)`` must stay under the loop bound; non-literal ranges are checked at runtime."""
+    if not all(isinstance(arg, ast.Constant) and isinstance(arg.value, int) for arg in call.args):
+        return True
+    try:
+        return len(range(*[arg.value for arg in call.args])) <= MAX_LOOP_ITERATIONS
+    except (TypeError, ValueError):
+        return False
+
+
+class _FastPathClassifier(ast.NodeVisitor):
+    def __init__(self):
+        self.safe = True
+        self.loop_depth = 0
+        self.module_aliases: t.Set[str] = set()
+
+    def reject(self):
+        self.safe = False
+
+    def generic_visit(self, node):
+        if not self.safe:
+            return
+        if not isinstance(node, ALLOWED_NODES):
+            self.reject()
+            return
+        super().generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            if alias.name not in ALLOWED_MODULES:
+                self.reject()
+                return
+            self.module_aliases.add(alias.asname or alias.name)
+
+    def visit_ImportFrom(self, node):
+        if node.level or node.module not in ALLOWED_MODULES:
+            self.reject()
+            return
+        module = ALLOWED_MODULES[node.module]
+        for alias in node.names:
+            if (
+                alias.name == "*"
+                or alias.name.startswith("_")
+                or alias.name in UNAVAILABLE_IN_RUNTIME
+                or not hasattr(module, alias.name)
+            ):
+                self.reject()
+                return
+
+    def visit_Name(self, node):
+        if node.id.startswith("_"):
+            self.reject()
+            return
+        # shadowing or reading builtins outside the whitelist (open, exec, __import__, ...)
+        if hasattr(builtins, node.id) and node.id not in ALLOWED_BUILTINS:
+            self.reject()
+
+    def visit_Attribute(self, node):
+        if node.attr.startswith("_"):
+            self.reject()
+            return
+        if isinstance(node.value, ast.Name) and node.value.id in self.module_aliases:
+            if node.attr in UNAVAILABLE_IN_RUNTIME:
+                self.reject()
+            return
+        if node.attr == "format" and not _is_plain_format_string(node.value):
+            self.reject()
+            return
+        if node.attr not in ALLOWED_METHODS:
+            self.reject()
+            return
+        self.generic_visit(node)
+
+    def visit_For(self, node):
+        self.loop_depth += 1
+        if self.loop_depth > MAX_LOOP_NESTING or node.orelse:
+            self.reject()
+        self.generic_visit(node)
+        self.loop_depth -= 1
+
+    def visit_Call(self, node):
+        if isinstance(node.func, ast.Name) and node.func.id == "range" and not _range_is_bounded(node):
+            self.reject()
+            return
+        self.generic_visit(node)
+
+    def _check_operands(self, op: ast.operator, left: ast.AST, right: ast.AST) -> bool:
+        if isinstance(op, ast.Pow) and not (
+            isinstance(right, ast.Constant)
+            and isinstance(right.value, (int, float))
+            and abs(right.value) <= MAX_EXPONENT
+        ):
+            return False
+        # a tower of small powers is still a huge number; other growth is bounded by the child process
+        if isinstance(op, ast.Pow) and isinstance(left, ast.BinOp) and isinstance(left.op, ast.Pow):
+            return False
+        if isinstance(op, (ast.Mult, ast.LShift)) and (
+            _is_large_constant(left, MAX_REPEAT_OPERAND) or _is_large_constant(right, MAX_REPEAT_OPERAND)
+        ):
+            return False
+        return True
+
+    def visit_BinOp(self, node):
+        if not self._check_operands(node.op, node.left, node.right):
+            self.reject()
+            return
+        self.generic_visit(node)
+
+    def visit_AugAssign(self, node):
+        if not self._check_operands(node.op, node.target, node.value):
+            self.reject()
+            return
+        self.generic_visit(node)
+
+
+def is_fast_path_eligible(code: str) -> bool:
+    """Classify whether a snippet is simple enough to run in-process instead of in the sandbox.
+
+    Eligible snippets only use whitelisted builtins plus the ``math`` and ``statistics`` modules,
+    contain no function or class definitions, ``while`` loops or private attribute access, and
+    nest at most ``MAX_LOOP_NESTING`` bounded ``for`` loops.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return False
+    classifier = _FastPathClassifier()
+    classifier.visit(tree)
+    return classifier.safe
+
+
+def _bounded_range(*args):
+    r = range(*args)
+    if len(r) > MAX_LOOP_ITERATIONS:
+        raise FastPathBudgetExceeded(f"range of length {len(r)} exceeds the fast path bound")
+    return r
+
+
+def _restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name not in ALLOWED_MODULES:
+        raise ImportError(f"Module {name} is not available on the fast path")
+    return ALLOWED_MODULES[name]
+
+
+def _run_in_process(code: str, max_steps: int) -> str:
+    output: t.List[str] = []
+
+    def _print(*args, sep=" ", end="\n", **kwargs):
+        output.append((" " if sep is None else sep).join(str(arg) for arg in args) + ("\n" if end is None else end))
+
+    safe_builtins = {name: getattr(builtins, name) for name in ALLOWED_BUILTINS if hasattr(builtins, name)}
+    safe_builtins.update({"print": _print, "range": _bounded_range, "__import__": _restricted_import})
+    namespace = {"__builtins__": safe_builtins, "__name__": "__main__"}
+
+    steps = 0
+
+    def _tracer(frame, event, arg):
+        nonlocal steps
+        if event == "line":
+            steps += 1
+            if steps > max_steps:
+                raise FastPathBudgetExceeded(f"Fast path step budget of {max_steps} exceeded")
+        return _tracer
+
+    compiled = compile(code, "<fast_path>", "exec")
+    previous_tracer = sys.gettrace()
+    sys.settrace(_tracer)
+    try:
+        exec(compiled, namespace)
+    finally:
+        sys.settrace(previous_tracer)
+
+    return "".join(output)
+
+
+def _child_main():
+    """Entry point of the child process: run the snippet from stdin under rlimits and report as JSON."""
+    try:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_AS, (MAX_MEMORY_BYTES, MAX_MEMORY_BYTES))
+        resource.setrlimit(resource.RLIMIT_CPU, (MAX_CPU_SECONDS, MAX_CPU_SECONDS))
+    except (ImportError, ValueError, OSError):
+        # no rlimits on this platform, the parent's wall clock timeout still applies
+        pass
+    request = json.loads(sys.stdin.read())
+    try:
+        report = {"output": _run_in_process(request["code"], request["max_steps"])}
+    except BaseException as e:
+        report = {"error": type(e).__name__, "message": str(e)}
+    sys.stdout.write(json.dumps(report))
+
+
+def run_fast_path(code: str, max_steps: int = MAX_STEPS, timeout: float = TIMEOUT_SECONDS) -> str:
+    """Run an eligible snippet in a restricted namespace and return what it printed.
+
+    Every executed line counts against ``max_steps``. The snippet runs in a child interpreter that is
+    limited to ``MAX_MEMORY_BYTES`` and ``MAX_CPU_SECONDS`` and killed after ``timeout`` seconds, so one
+    expensive line cannot exhaust the memory of the run or hang it. Exceeding any budget raises
+    ``FastPathBudgetExceeded`` and a runtime error is re-raised with its builtin type. Either propagates to
+    the caller, which is expected to fall back to the sandbox so that error output stays identical to a
+    real execution.
+    """
+    try:
+        completed = subprocess.run(
+            [sys.executable, "-I", os.path.abspath(__file__)],
+            input=json.dumps({"code": code, "max_steps": max_steps}),
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        raise FastPathBudgetExceeded(f"Fast path timeout of {timeout}s exceeded")
+    try:
+        report = json.loads(completed.stdout)
+    except ValueError:
+        # killed by a limit before it could report
+        raise FastPathBudgetExceeded(f"Fast path process exited with code {completed.returncode}")
+
+    if "output" in report:
+        return report["output"]
+    if report["error"] in ("FastPathBudgetExceeded", "MemoryError"):
+        raise FastPathBudgetExceeded(report["message"] or report["error"])
+    error_type = getattr(builtins, report["error"], None)
+    if not (isinstance(error_type, type) and issubclass(error_type, Exception)):
+        error_type = RuntimeError
+    raise error_type(report["message"])
+
+
+if __name__ == "__main__":
+    _child_main()
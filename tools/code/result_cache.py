@@ -0,0 +1,162 @@
+import ast
+import hashlib
+import json
+import logging
+import os
+import typing as t
+
+from utils.disk_cache import DiskCache
+from utils.keystore import get_from_env
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CODE_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "toolcomp", "code_results.sqlite"
+)
+
+# modules whose use makes the output depend on wall-clock time, randomness or the outside world
+NONDETERMINISTIC_MODULES = {
+    "time", "datetime", "random", "secrets", "uuid", "os", "sys", "io", "pathlib", "shutil",
+    "glob", "tempfile", "socket", "subprocess", "threading", "multiprocessing", "asyncio",
+    "requests", "urllib", "http", "ftplib", "smtplib", "sqlite3", "pickle", "shelve",
+    "platform", "getpass", "signal", "ctypes", "importlib", "builtins", "gc", "resource",
+    # submodules of otherwise deterministic libraries
+    "numpy.random", "scipy.stats",
+}
+
+# builtins that read from or write to the outside world, or execute arbitrary code
+NONDETERMINISTIC_BUILTINS = {
+    "open", "input", "exec", "eval", "compile", "__import__", "globals", "locals", "vars",
+    "breakpoint", "id", "hash", "memoryview",
+    # iteration order of str sets depends on PYTHONHASHSEED and so differs between processes
+    "set", "frozenset",
+}
+
+# attribute names that pull in time, randomness or I/O through third party libraries (numpy, pandas, scipy)
+NONDETERMINISTIC_ATTRIBUTES = {
+    "random", "now", "today", "utcnow", "time", "perf_counter", "monotonic", "urandom",
+    "default_rng", "seed", "shuffle", "permutation", "choice", "sample", "rvs",
+    "read_csv", "read_json", "read_excel", "read_html", "read_parquet", "read_sql", "read_table",
+    "to_csv", "to_json", "to_excel", "to_parquet", "to_pickle", "load", "save", "savetxt",
+    "loadtxt", "genfromtxt", "fromfile", "tofile", "environ", "getenv", "system", "popen",
+}
+
+
+def normalize_source(code: str) -> str:
+    """Normalize whitespace so cosmetically different snippets share a cache entry.
+
+    Only trailing whitespace, line endings and leading/trailing blank lines are touched so that
+    line numbers in tracebacks stay identical to the original snippet.
+    """
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def _is_nondeterministic_module(name: t.Optional[str]) -> bool:
+    """Whether a dotted module path is, or is inside, one of ``NONDETERMINISTIC_MODULES``."""
+    parts = (name or "").split(".")
+    return any(".".join(parts[:i]) in NONDETERMINISTIC_MODULES for i in range(1, len(parts) + 1))
+
+
+def is_deterministic(code: str) -> bool:
+    """Static check that a snippet does not depend on time, randomness or I/O.
+
+    The check is conservative: anything that fails to parse or touches a suspicious module,
+    builtin or attribute is treated as non-deterministic and is never cached.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return False
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            if any(_is_nondeterministic_module(alias.name) for alias in node.names):
+                return False
+        elif isinstance(node, ast.ImportFrom):
+            if node.level or _is_nondeterministic_module(node.module):
+                return False
+            # the imported names may be submodules (from scipy import stats) or suspicious functions
+            for alias in node.names:
+                if (
+                    _is_nondeterministic_module(f"{node.module}.{alias.name}")
+                    or alias.name in NONDETERMINISTIC_ATTRIBUTES
+                    or alias.name in NONDETERMINISTIC_BUILTINS
+                ):
+                    return False
+        elif isinstance(node, (ast.Set, ast.SetComp)):
+            return False
+        elif isinstance(node, ast.Name):
+            if node.id in NONDETERMINISTIC_BUILTINS or node.id in NONDETERMINISTIC_MODULES:
+                return False
+        elif isinstance(node, ast.Attribute):
+            if node.attr in NONDETERMINISTIC_ATTRIBUTES or node.attr.startswith("__"):
+                return False
+    return True
+
+
+class CodeResultCache:
+    """Persistent cache of code execution results for deterministic snippets.
+
+    Entries are keyed by the normalized source, the language and runtime version, and the stdin
+    passed to the program, so upgrading the runtime never serves a stale result.
+    """
+
+    def __init__(self, path: str = DEFAULT_CODE_CACHE_PATH):
+        self.cache = DiskCache(path)
+
+    def make_key(
+        self,
+        code: str,
+        language: str,
+        version: t.Optional[str] = None,
+        input_data: t.Optional[str] = None,
+    ) -> str:
+        payload = json.dumps(
+            {
+                "source": normalize_source(code),
+                "language": language,
+                "version": version,
+                "input": input_data,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(
+        self,
+        code: str,
+        language: str,
+        version: t.Optional[str] = None,
+        input_data: t.Optional[str] = None,
+    ) -> t.Optional[t.Dict[str, str]]:
+        if not is_deterministic(code):
+            return None
+        return self.cache.get(self.make_key(code, language, version, input_data))
+
+    def set(
+        self,
+        code: str,
+        language: str,
+        result: t.Dict[str, str],
+        version: t.Optional[str] = None,
+        input_data: t.Optional[str] = None,
+    ):
+        if not is_deterministic(code):
+            return
+        if not all(isinstance(value, str) for value in result.values()):
+            # raw bytes from very large or undecodable streams are not worth persisting
+            return
+        self.cache.set(self.make_key(code, language, version, input_data), result)
+
+
+def load_code_result_cache() -> t.Optional[CodeResultCache]:
+    """Build the process-wide code result cache, honoring TOOLCOMP_CODE_CACHE* env vars."""
+    if get_from_env("TOOLCOMP_DISABLE_CODE_CACHE"):
+        return None
+    path = get_from_env("TOOLCOMP_CODE_CACHE_PATH", DEFAULT_CODE_CACHE_PATH)
+    try:
+        return CodeResultCache(path)
+    except Exception:
+        logger.exception(f"Failed to open code result cache at {path}. Continuing without cache.")
+        return None
@@ -1,7 +1,28 @@
 from tools.tool_base_class import ToolBaseClass
-from tools.code import SphereEngineCodeExecutor
+from tools.code import SphereEngineCodeExecutor, SphereEngineSubmissionBatcher
+from tools.code.constants import SphereEngineSubmissionStatus
+from tools.code.fast_path import is_fast_path_eligible, run_fast_path
+from tools.code.result_cache import load_code_result_cache
+from utils.keystore import get_from_env
+
+PYTHON_LANGUAGE = 'Python 3.x'
+PYTHON_VERSION = 'python 3.9.5'
+
+# only final states that are a pure function of the source are worth remembering
+CACHEABLE_STATUSES = {
+    SphereEngineSubmissionStatus.success,
+    SphereEngineSubmissionStatus.runtime_error,
+    SphereEngineSubmissionStatus.compilation_error,
+}
 
 code_executor = SphereEngineCodeExecutor(verbose=False)
+use_fast_path = not get_from_env("TOOLCOMP_DISABLE_CODE_FAST_PATH")
+code_result_cache = load_code_result_cache()
+
+# gathers snippets from concurrent trajectories into batched submissions
+code_submission_batcher = (
+    None if get_from_env("TOOLCOMP_DISABLE_CODE_BATCHING") else SphereEngineSubmissionBatcher(code_executor)
+)
 
 class PythonInterpreter(ToolBaseClass):
     def __init__(self):
@@ -41,8 +62,31 @@ class PythonInterpreter(ToolBaseClass):
         if not self.validate(args):
             return {"error": "Invalid input.", "result": ""}
 
-        executed = code_executor.execute_sync(
-            code, 'Python 3.x', version='python 3.9.5'
-        )
-        
-        return {"result": executed.output, "error": executed.cmpinfo if executed.cmpinfo else ""}
+        if use_fast_path and is_fast_path_eligible(code):
+            try:
+                return {"result": run_fast_path(code), "error": ""}
+            except Exception:
+                # budget exceeded or a runtime error: let the sandbox produce the real output
+                pass
+
+        if code_result_cache is not None:
+            cached = code_result_cache.get(code, PYTHON_LANGUAGE, version=PYTHON_VERSION)
+            if cached is not None:
+                return cached
+
+        executed = None
+        if code_submission_batcher is not None:
+            try:
+                executed = code_submission_batcher.execute(code, PYTHON_LANGUAGE, version=PYTHON_VERSION)
+            except Exception:
+                executed = None
+        if executed is None:
+            executed = code_executor.execute_sync(
+                code, PYTHON_LANGUAGE, version=PYTHON_VERSION
+            )
+        result = {"result": executed.output, "error": executed.cmpinfo if executed.cmpinfo else ""}
+
+        if code_result_cache is not None and executed.status in CACHEABLE_STATUSES:
+            code_result_cache.set(code, PYTHON_LANGUAGE, result, version=PYTHON_VERSION)
+
+        return result
@@ -0,0 +1,58 @@
+import json
+from typing import IO, Any, Iterator, Optional
+
+_END = object()
+
+
+def _newline(level: int, indent: Optional[int]) -> str:
+    return "" if indent is None else "\n" + " " * (indent * level)
+
+
+def _key(key: Any) -> str:
+    # json turns non-string keys into their JSON text (1 -> "1", True -> "true")
+    return json.dumps(key if isinstance(key, str) else json.dumps(key))
+
+
+def _open(value: Any, stack: list, level: int, indent: Optional[int]) -> str:
+    """Start writing ``value``: containers push a frame and return their opening bracket, scalars return their text."""
+    if hasattr(value, "_json_fields"):
+        value = value._json_fields()
+    if isinstance(value, dict):
+        stack.append([iter(value.items()), "}", level, True])
+        return "{"
+    if isinstance(value, (list, tuple)):
+        stack.append([((None, item) for item in value), "]", level, True])
+        return "["
+    return json.dumps(value)
+
+
+def iter_tree_json(value: Any, indent: Optional[int] = None) -> Iterator[str]:
+    """Yield the JSON text of ``value`` piece by piece, equal to ``json.dumps(value, indent=indent)``.
+
+    Objects with a ``_json_fields`` method (ReActNode, ReActTreeManager) are expanded when they are reached,
+    into a dict whose nested nodes are expanded in turn. Nodes are walked with an explicit stack, so memory and
+    stack use grow with the depth of the tree, not its size, and deep trees cannot hit the recursion limit.
+    """
+    item_separator = ", " if indent is None else ","
+    stack = []
+    yield _open(value, stack, 0, indent)
+    while stack:
+        frame = stack[-1]
+        items, closer, level, first = frame
+        item = next(items, _END)
+        if item is _END:
+            stack.pop()
+            yield closer if first else _newline(level, indent) + closer
+            continue
+        frame[3] = False
+        key, child = item
+        prefix = ("" if first else item_separator) + _newline(level + 1, indent)
+        if closer == "}":
+            prefix += _key(key) + ": "
+        yield prefix + _open(child, stack, level + 1, indent)
+
+
+def dump_tree_json(value: Any, fp: IO[str], indent: Optional[int] = None):
+    """Stream the JSON of ``value`` to ``fp``, see iter_tree_json."""
+    for chunk in iter_tree_json(value, indent):
+        fp.write(chunk)
@@ -0,0 +1,123 @@
+import ast
+import json
+import re
+from typing import Any, Dict, Tuple
+
+# "Thought:" is optional since the prompt may already end with it; the Action Input may be fenced as code
+_STEP_HEADER = re.compile(
+    r"\s*(?:Thought:)?(?P<thought>.*?)Action:(?P<action>.*?)Action Input:[ \t\r\n]*(?:```(?:json|python)?[ \t\r\n]*)?",
+    re.DOTALL,
+)
+_DECODER = json.JSONDecoder(strict=False)
+_QUOTES = "\"'"
+
+
+class ReActParseError(ValueError):
+    """A policy output that is not a valid ReAct step, with the position in the output where parsing failed."""
+
+    def __init__(self, reason: str, position: int, raw_string: str):
+        super().__init__(f"Invalid raw string at position {position}: {reason}. Got: {raw_string}")
+        self.reason = reason
+        self.position = position
+
+
+class ParsedStep:
+    """One ReAct step: its thought, action and parsed Action Input, plus the input's text as rendered in the history."""
+
+    __slots__ = ("thought", "action", "action_input", "action_input_text", "end")
+
+    def __init__(self, thought: str, action: str, action_input: Dict[str, Any], action_input_text: str, end: int):
+        self.thought = thought
+        self.action = action
+        self.action_input = action_input
+        self.action_input_text = action_input_text
+        # position in the output just past the Action Input; anything after it is ignored
+        self.end = end
+
+    def __repr__(self):
+        return f"ParsedStep(thought={self.thought!r}, action={self.action!r}, action_input={self.action_input!r})"
+
+
+def _object_end(text: str, start: int) -> int:
+    """Position just past the brace matching the one at ``start``, skipping quoted strings, or -1 if it never closes."""
+    depth = 0
+    quote = None
+    escaped = False
+    for position in range(start, len(text)):
+        char = text[position]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in _QUOTES:
+            quote = char
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return position + 1
+    return -1
+
+
+def parse_action_input(text: str, start: int = 0) -> Tuple[Dict[str, Any], int]:
+    """
+    Parse the Action Input object that starts at ``text[start]`` and return it with the position just past it.
+
+    Strings may hold raw newlines (as python_interpreter code usually does). An object that is not valid JSON
+    but is a Python literal, e.g. single-quoted strings or ``True``, is accepted as well.
+
+    Raises:
+        ReActParseError: If there is no object at ``start`` or it does not parse.
+    """
+    if not text.startswith("{", start):
+        raise ReActParseError("'Action Input:' must be followed by a JSON object", start, text)
+    try:
+        args, end = _DECODER.raw_decode(text, start)
+        return args, end
+    except json.JSONDecodeError as e:
+        error = e
+
+    end = _object_end(text, start)
+    if end != -1:
+        try:
+            args = ast.literal_eval(text[start:end])
+        except (SyntaxError, ValueError, MemoryError, RecursionError):
+            args = None
+        if isinstance(args, dict):
+            return args, end
+    raise ReActParseError(f"Action Input is not valid JSON ({error.msg})", error.pos, text)
+
+
+def parse_react_step(raw_string: str) -> ParsedStep:
+    """
+    Parse a policy output into a ReAct step in one pass: the header up to the Action Input is matched by a
+    single compiled pattern, then the Action Input object is decoded in place. A trailing ``End Action`` and
+    anything generated after the object (such as a made-up Observation) are ignored.
+
+    Raises:
+        ReActParseError: With the reason and the position in ``raw_string`` where parsing failed.
+    """
+    match = _STEP_HEADER.match(raw_string)
+    if match is None:
+        action_idx = raw_string.find("Action:")
+        if action_idx == -1:
+            raise ReActParseError(
+                "please include 'Action:' after generating your thought step", len(raw_string), raw_string
+            )
+        raise ReActParseError(
+            "please include 'Action Input:' after generating your action step", len(raw_string), raw_string
+        )
+
+    thought = match.group("thought").strip().replace("\n", " ")
+    action = match.group("action").strip().replace("\n", " ")
+    if not action:
+        raise ReActParseError("'Action:' is empty", match.start("action"), raw_string)
+
+    start = match.end()
+    action_input, end = parse_action_input(raw_string, start)
+    action_input_text = raw_string[start:end].replace("\n", " ")
+    return ParsedStep(thought, action, action_input, action_input_text, end)
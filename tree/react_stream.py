@@ -0,0 +1,83 @@
+from typing import Optional
+
+ACTION_INPUT_MARKER = "Action Input:"
+END_ACTION_MARKER = "End Action"
+
+
+class ReActStreamParser:
+    """Watch a streamed ReAct step and report when it is complete.
+
+    A step is complete once its ``Action Input`` JSON object has closed, or once ``End Action`` appears.
+    The text is scanned once in total: each ``feed`` only looks at what it adds (plus a marker's worth
+    of overlap), keeping brace depth and string state between calls.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.complete = False
+        self.end: Optional[int] = None
+
+        self._scanned = 0
+        self._input_start: Optional[int] = None
+        self._json_start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, delta: str) -> bool:
+        """Add streamed text and return whether the step is complete."""
+        if self.complete or not delta:
+            return self.complete
+        self.text += delta
+
+        end_action = self.text.find(END_ACTION_MARKER, max(0, self._scanned - len(END_ACTION_MARKER)))
+        if self._input_start is None:
+            index = self.text.find(ACTION_INPUT_MARKER, max(0, self._scanned - len(ACTION_INPUT_MARKER)))
+            if index != -1:
+                self._input_start = index + len(ACTION_INPUT_MARKER)
+                self._scanned = self._input_start
+        if self._input_start is not None:
+            self._scan_json()
+        # an "End Action" inside the Action Input JSON is part of a string value
+        if not self.complete and end_action != -1 and (self._json_start is None or end_action < self._json_start):
+            self.complete = True
+            self.end = end_action
+        if self._input_start is None:
+            self._scanned = len(self.text)
+        return self.complete
+
+    def _scan_json(self):
+        text = self.text
+        position = self._scanned
+        if self._json_start is None:
+            position = text.find("{", position)
+            if position == -1:
+                self._scanned = len(text)
+                return
+            self._json_start = position
+
+        for position in range(position, len(text)):
+            char = text[position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.complete = True
+                    self.end = position + 1
+                    break
+        self._scanned = len(text)
+
+    @property
+    def step(self) -> str:
+        """The step up to the end of its Action Input, without anything generated after it."""
+        return self.text[: self.end] if self.complete else self.text
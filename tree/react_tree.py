@@ -1,9 +1,12 @@
 # Lightweight implementation of tree node for generating ReAct tool chains
 import json
-from typing import Dict, List, Optional, Type
+import sys
+from typing import IO, Dict, List, Optional, Type
 
 from termcolor import colored
 from tools.helper import get_all_tools_mapping
+from tree.react_json import dump_tree_json
+from tree.react_parser import parse_action_input, parse_react_step
 import re
 
 class ReActTreeManager:
@@ -31,15 +34,28 @@ class ReActTreeManager:
         self.policy_final_answer: Optional[str] = None
         self.critic_final_answer: Optional[str] = None
         self.full_retries: int = 0
+        # leaf of the highest scoring trajectory, set by tree search
+        self.best_leaf: Optional[ReActNode] = None
 
         self.better_action_plan: Optional[List[str]] = None
         self.raw_pairwise_judge_output: Optional[List[str]] = None
         self.pairwise_judge_prompt: Optional[List[str]] = None
 
     def to_json(self):
+        json = self._json_fields()
+        json["generations"] = self.root.to_json()
+        json["rewrite_generations"] = self.rewrite_root.to_json()
+        return json
+
+    def write_json(self, fp: IO[str], indent: Optional[int] = None):
+        """Stream ``to_json()`` to ``fp`` one node at a time, using memory proportional to the depth of the trees."""
+        dump_tree_json(self, fp, indent)
+
+    def _json_fields(self):
+        """``to_json`` with the pseudo-roots left as nodes, for the serializers to expand."""
         json = {
-            "generations": self.root.to_json(),
-            "rewrite_generations": self.rewrite_root.to_json(),
+            "generations": self.root,
+            "rewrite_generations": self.rewrite_root,
             "generation_status": self.generation_status,
             "query": self.query,
             "tools_available": [tool for tool in self.tools_available],
@@ -77,10 +93,11 @@ class ReActTreeManager:
         
         full_generations = []
 
-        leaves = self.root.get_all_leaves()
         generations = []
         policy_answer = self.policy_final_answer
         
+        # the answering chain first, then open chains, then the dead ends a resumed chain pruned (see find_resume_node)
+        leaves = sorted(self.root.iter_leaves(), key=lambda leaf: (not leaf.answer_found, leaf.pruned))
         for leaf in leaves:
             history = leaf.generate_history_json()
             generations.append({
@@ -97,6 +114,14 @@ class ReActTreeManager:
             "action_plan": self.action_plan,
             "full_message_history": generations,
         }
+        if self.best_leaf is not None:
+            flattened_info["best_trajectory"] = {
+                "history": self.best_leaf.generate_history_json(),
+                "answer_found": self.best_leaf.answer_found,
+                "final_answer": self.best_leaf.final_answer,
+                "depth": self.best_leaf.depth,
+                "score": self.best_leaf.Q,
+            }
         full_generations.append(flattened_info)
         return full_generations
 
@@ -224,7 +249,73 @@ class ReActTreeManager:
         return prm
 
 
+# judge and search fields, set on few nodes, so they live in a side record allocated on first write
+_EXTRA_DEFAULTS = {
+    # judge rewrites
+    "thought_label": None,
+    "action_label": None,
+    "action_input_label": None,
+    "ready_to_judge": False,
+    "judge_reasoning": None,
+    "better_child": None,
+    "raw_pairwise_judge_output": None,
+    "pairwise_judge_prompt": None,
+    # gt labels
+    "judge_prompt": None,
+    "raw_judge_output": None,
+    "thought_gt": None,
+    "action_gt": None,
+    "action_input_gt": None,
+    # search metadata
+    "expanded": False,
+    "N": 0,
+    "Q": 0,
+    "llm_score": 0,
+    # chain retries, see inference/react_inference.find_resume_node
+    "resumed": False,
+}
+
+
+class _NodeExtras:
+
+    __slots__ = tuple(_EXTRA_DEFAULTS)
+
+    def __init__(self):
+        for name, default in _EXTRA_DEFAULTS.items():
+            setattr(self, name, default)
+
+
+def _extra_field(name):
+    default = _EXTRA_DEFAULTS[name]
+
+    def get(node):
+        return default if node._extras is None else getattr(node._extras, name)
+
+    def set(node, value):
+        if node._extras is None:
+            node._extras = _NodeExtras()
+        setattr(node._extras, name, value)
+
+    return property(get, set)
+
+
 class ReActNode:
+    """One ReAct step and its place in the tree.
+
+    Trees for a whole run stay in memory, so nodes are slotted and only allocate what they use: metadata,
+    errors and children are created on first write (reads of an empty one return an empty tuple), and the
+    judge and search fields in ``_EXTRA_DEFAULTS`` live in a side record. Append through ``add_child``,
+    ``update_errors`` and ``update_judge_errors``.
+    """
+
+    __slots__ = (
+        "thought", "action", "action_input", "observation",
+        "rewrite_node", "parent", "_children", "mgr",
+        "messages", "_step_text", "prompt",
+        "answer_found", "final_answer", "pruned", "pruned_reason",
+        "_metadata", "num_retries", "num_total_chain_retries", "num_judge_retries", "depth",
+        "_errors", "_rewrite_errors", "is_pseudo_root", "_extras", "journal_id",
+    )
 
     def __init__(
         self, thought, action, action_input, observation, is_psuedo_root: bool = False
@@ -238,27 +329,19 @@ class ReActNode:
 
         # judge rewrites
         self.rewrite_node: Optional[Type[ReActNode]] = None
-        self.thought_label: Optional[str] = None
-        self.action_label: Optional[str] = None
-        self.action_input_label: Optional[str] = None
-        self.ready_to_judge: bool = False
-        self.judge_reasoning: Optional[str] = None
-        
-        self.better_child: Optional[int] = None
-        self.raw_pairwise_judge_output: Optional[str] = None
-        self.pairwise_judge_prompt: Optional[str] = None
-
-        # gt labels
-        self.judge_prompt: Optional[str] = None
-        self.raw_judge_output: Optional[str] = None
-        self.thought_gt: Optional[str] = None
-        self.action_gt: Optional[str] = None
-        self.action_input_gt: Optional[str] = None
-
 
         # pointers
         self.parent: Optional[Type[ReActNode]] = None
-        self.children: List[Type[ReActNode]] = []
+        self._children: Optional[List[Type[ReActNode]]] = None
+
+        # this step's multi-turn messages, or the opening messages on the pseudo-root (not serialized)
+        self.messages: Optional[List[Dict]] = None
+
+        # this step as rendered in the History prompt (not serialized)
+        self._step_text: Optional[str] = None
+
+        # prompt that generated this step, serialized as metadata["prompt"]; see add_metadata
+        self.prompt: Optional[List[Dict]] = None
 
         # if this node is a terminal node where the final answer is found
         self.answer_found: bool = False
@@ -269,25 +352,41 @@ class ReActNode:
         self.pruned_reason: str = ""
 
         # metadata
-        self.metadata: Dict[str, str] = (
-            {}
-        )  # generic place to capture additional ad-hoc metrics/metadata
+        self._metadata: Optional[Dict[str, str]] = None  # generic place to capture additional ad-hoc metrics/metadata
         self.num_retries: int = 0
         self.num_total_chain_retries: int = 0
         self.num_judge_retries: int = 0
         self.depth: int = 0
-        self.errors: List[str] = []
-        self.rewrite_errors: List[str] = []
+        self._errors: Optional[List[str]] = None
+        self._rewrite_errors: Optional[List[str]] = None
 
         # pseudo-root node
         # we want a pseudo-root node to be able to store the root nodes of the tree
         self.is_pseudo_root = is_psuedo_root
 
-        # search metadata
-        self.expanded = False
-        self.N = 0
-        self.Q = 0
-        self.llm_score = 0
+        # judge and search fields, see _EXTRA_DEFAULTS
+        self._extras: Optional[_NodeExtras] = None
+
+        # id of this step in the run journal (of the attempt's plan, for the pseudo-root), see utils.journal
+        self.journal_id: Optional[int] = None
+
+    @property
+    def children(self):
+        return self._children if self._children is not None else ()
+
+    @property
+    def errors(self):
+        return self._errors if self._errors is not None else ()
+
+    @property
+    def rewrite_errors(self):
+        return self._rewrite_errors if self._rewrite_errors is not None else ()
+
+    @property
+    def metadata(self) -> Dict[str, str]:
+        if self._metadata is None:
+            self._metadata = {}
+        return self._metadata
 
     def _inherit_as_child(self, node):
         node._set_depth(self.depth + 1)
@@ -297,7 +396,9 @@ class ReActNode:
     def add_child(self, node):
         node.parent = self
         self._inherit_as_child(node)
-        self.children.append(node)
+        if self._children is None:
+            self._children = []
+        self._children.append(node)
         # potentially add ready_to_judge = true
 
     def add_rewrite_node(self, node):
@@ -305,6 +406,12 @@ class ReActNode:
         node._set_mgr(self.mgr)
         node.depth = self.depth
         node.parent = self.parent
+        self._invalidate_prompt_caches()
+
+    def _invalidate_prompt_caches(self):
+        """Drop the cached renderings of this node's (now rewritten) step; descendants only cache their own."""
+        self._step_text = None
+        self.messages = None
 
     def _set_mgr(self, mgr):
         self.mgr = mgr
@@ -312,14 +419,20 @@ class ReActNode:
     def _set_depth(self, depth):
         self.depth = depth
 
-    def update_errors(self, error: str):
-        self.num_retries += 1
+    def update_errors(self, error: str, count_retry: bool = True):
+        """Record a generation from this node that was not a valid step; ``count_retry`` spends one of its retries."""
+        if count_retry:
+            self.num_retries += 1
         self.num_total_chain_retries += 1
-        self.errors.append(error)
+        if self._errors is None:
+            self._errors = []
+        self._errors.append(error)
     
     def update_judge_errors(self, error: str):
         self.num_judge_retries += 1
-        self.rewrite_errors.append(error)
+        if self._rewrite_errors is None:
+            self._rewrite_errors = []
+        self._rewrite_errors.append(error)
 
     def print(self, should_print: bool = False):
         if self.rewrite_node is not None:
@@ -337,27 +450,37 @@ class ReActNode:
         return val
 
     def generate_history(self, should_print: bool = False):
-        val = ""
-        curr = self
-        while not curr.is_pseudo_root:
-            val = curr.print(should_print) + "\n\n" + val
-            curr = curr.parent
-        return val
+        if should_print:
+            return "".join(node.print(should_print) + "\n\n" for node in self._get_chain())
+
+        # each node renders only its own step, once, and the chain is joined per prompt; caching whole
+        # prefixes per node would hold O(depth^2) text for a chain
+        return "".join(node._rendered_step() for node in self._get_chain())
+
+    def _rendered_step(self):
+        if self._step_text is None:
+            self._step_text = self.print() + "\n\n"
+        return self._step_text
     
     def generate_history_json(self):
+        return [
+            {
+                "thought": node.thought.value,
+                "action": node.action.value,
+                "action_input": node.action_input.value,
+                "observation": node.observation.value,
+            }
+            for node in self._get_chain()
+        ]
+
+    def _get_chain(self):
+        """The steps from the first one below the pseudo-root down to this node."""
+        chain = []
         curr = self
-        history = []
         while not curr.is_pseudo_root:
-            full_json = curr.to_json()
-            react_json = {
-                "thought": full_json["thought"],
-                "action": full_json["action"],
-                "action_input": full_json["action_input"],
-                "observation": full_json["observation"],
-            }
-            history = [react_json] + history
+            chain.append(curr)
             curr = curr.parent
-        return history
+        return chain[::-1]
 
     def get_all_ancestors(self):
         ancestors = []
@@ -374,19 +497,45 @@ class ReActNode:
             return self.parent.get_root_node()
 
     def add_metadata(self, key, value):
-        self.metadata[key] = value
+        if key == "prompt":
+            self.prompt = _intern_prompt(value)
+        else:
+            self.metadata[key] = value
+
+    def _metadata_json(self) -> Dict:
+        metadata = {} if self.prompt is None else {"prompt": self.prompt}
+        metadata.update(self._metadata or {})
+        return metadata
 
     def update_judge_labels(self, labels):
         self.thought_label, self.action_label, self.action_input_label = labels
 
     def to_json(self):
+        # expanded top-down with an explicit stack, so deep trees do not hit the recursion limit
+        json = self._json_fields()
+        stack = [json]
+        while stack:
+            fields = stack.pop()
+            fields["children"] = [child._json_fields() for child in fields["children"]]
+            stack.extend(fields["children"])
+            if fields["rewrite_node"] is not None:
+                fields["rewrite_node"] = fields["rewrite_node"]._json_fields()
+                stack.append(fields["rewrite_node"])
+        return json
+
+    def write_json(self, fp: IO[str], indent: Optional[int] = None):
+        """Stream ``to_json()`` to ``fp`` one node at a time, using memory proportional to the depth of the tree."""
+        dump_tree_json(self, fp, indent)
+
+    def _json_fields(self):
+        """This node's ``to_json`` fields, with its children and rewrite node left as nodes."""
         if self.is_pseudo_root:
             return {
-                "children": [child.to_json() for child in self.children],
-                "metadata": self.metadata,
+                "children": list(self.children),
+                "metadata": self._metadata_json(),
                 "num_retries": self.num_retries,
-                "errors": self.errors,
-                "rewrite_node": self.rewrite_node.to_json() if self.rewrite_node is not None else None,
+                "errors": list(self.errors),
+                "rewrite_node": self.rewrite_node,
                 "depth": self.depth,
                 "better_child": self.better_child,
                 "raw_pairwise_judge_output": self.raw_pairwise_judge_output,
@@ -410,13 +559,13 @@ class ReActNode:
                 "action_gt": self.action_gt,
                 "action_input_gt": self.action_input_gt,
                 "judge_reasoning": self.judge_reasoning,
-                "children": [child.to_json() for child in self.children],
-                "rewrite_node": self.rewrite_node.to_json() if self.rewrite_node is not None else None,
-                "metadata": self.metadata,
+                "children": list(self.children),
+                "rewrite_node": self.rewrite_node,
+                "metadata": self._metadata_json(),
                 "num_retries": self.num_retries,
                 "depth": self.depth,
-                "errors": self.errors,
-                "rewrite_errors": self.rewrite_errors,
+                "errors": list(self.errors),
+                "rewrite_errors": list(self.rewrite_errors),
                 "final_answer": self.observation.value if self.answer_found else None,
                 "final_answer_found": self.answer_found,
                 "pruned": self.pruned,
@@ -424,27 +573,53 @@ class ReActNode:
             }
 
     def get_all_leaves(self):
-        leaves = []
-        if not self.children:
-            leaves.append(self)
-            if self.rewrite_node is not None:
-                leaves.extend(self.rewrite_node.get_all_leaves())
-        else:
-            for child in self.children:
-                leaves.extend(child.get_all_leaves())
-        return leaves
+        return list(self.iter_leaves())
+
+    def iter_leaves(self):
+        """Yield the leaves below this node in depth-first order, each followed by the leaves of its rewrite node."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if not node.children:
+                yield node
+                if node.rewrite_node is not None:
+                    stack.append(node.rewrite_node)
+            else:
+                stack.extend(reversed(node.children))
     
     def prune(self, reason: str):
         self.pruned = True
         self.pruned_reason = reason
 
 
+for _name in _EXTRA_DEFAULTS:
+    setattr(ReActNode, _name, _extra_field(_name))
+
+
+def _intern_prompt(prompt):
+    """Share equal message contents between stored prompts. The system message (instructions and tool specs) is
+    rendered afresh for every step, so without this each node would hold its own copy of it."""
+    if isinstance(prompt, list):
+        for message in prompt:
+            if isinstance(message, dict) and type(message.get("content")) is str:
+                message["content"] = sys.intern(message["content"])
+    return prompt
+
+
 class ReActStep:
 
+    __slots__ = ("node_type", "value", "_step_metadata")
+
     def __init__(self, node_type=None, value=None):
         self.node_type = node_type  # "Thought", "Action", "Action Input", "Observation"
         self.value = value  # The string value of the node
-        self.step_metadata = {}
+        self._step_metadata = None
+
+    @property
+    def step_metadata(self):
+        if self._step_metadata is None:
+            self._step_metadata = {}
+        return self._step_metadata
 
     def print(self, should_print=False):
         color_converter = {
@@ -479,50 +654,18 @@ class ReActStep:
         self.step_metadata[key] = value
 
 
-def process_policy_output(raw_string, historical_date=None):
+def process_policy_output(raw_string, historical_date=None, tool_results=None):
+    """Parse a policy output into a ReActNode and run its action. Raises ReActParseError (a ValueError) for
+    outputs that are not a valid step, see parse_react_step."""
 
-    raw_string = raw_string.strip()
-    # find the first "Thought:"
-    thought_idx = raw_string.find("Thought:")
-    action_idx = raw_string.find("Action:")
-    action_input_idx = raw_string.find("Action Input:")
-    end_action_idx = raw_string.find("End Action")
-
-    if thought_idx == -1:
-        raise ValueError(f"Invalid raw string: please begin with 'Thought:'. Got: {raw_string}")
-    
-    if action_idx == -1:
-        raise ValueError(f"Invalid raw string: please include 'Action:' after generating your thought step. Got: {raw_string}")
-    
-    if action_input_idx == -1:
-        raise ValueError(f"Invalid raw string: please include 'Action Input:' after generating your action step. Got: {raw_string}")
-    
-    if end_action_idx == -1:
-        raise ValueError(f"Invalid raw string: please include 'End Action' in a new line after generating your action input step. Got: {raw_string}")
-
-
-    thought_string = raw_string[thought_idx + len("Thought:") : action_idx].strip().replace("\n", " ")
-    action_string = raw_string[action_idx + len("Action:") : action_input_idx].strip().replace("\n", " ")
-    action_input_string = raw_string[action_input_idx + len("Action Input:") : end_action_idx].strip().replace("\n", " ")
-
-    nodes = [
-        ReActStep("Thought", thought_string),
-        ReActStep("Action", action_string),
-        ReActStep("Action Input", action_input_string.strip('```').strip('json').strip('python')),
-    ]
-
-    # check node is not None
-    for node in nodes:
-        if node is None:
-            raise ValueError(f"Invalid raw string: {raw_string} with nodes list: {nodes}")
-
-    thought_node = nodes[0]
-    action_node = nodes[1]
-    action_input_node = nodes[2]
+    step = parse_react_step(raw_string)
+    thought_node = ReActStep("Thought", step.thought)
+    action_node = ReActStep("Action", step.action)
+    action_input_node = ReActStep("Action Input", step.action_input_text)
 
     try:
         observation_step, found_answer = get_observation_step(
-            action_node, action_input_node, historical_date
+            action_node, action_input_node, historical_date, tool_results, args=step.action_input
         )
     except Exception as e:
         raise ValueError(f"Error in getting observation step: {str(e)} with action: {action_node.value} and action input: {action_input_node.value}")
@@ -550,15 +693,15 @@ def extract_labels(labels_string):
     labels = [d['thought'], d['action'], d['action_input']]
     return labels
 
-def get_observation_step(action_node, action_input_node, historical_date=None):
-    if type(action_input_node.value) == str:
-        if "python_interpreter" in action_node.value:    
-            args = json.loads(action_input_node.value.replace('\n', '~!`>!~'))
-            args["code"] = args["code"].replace('~!`>!~', '\n')
-        else:
-            args = json.loads(action_input_node.value)
-    else:
+def get_observation_step(action_node, action_input_node, historical_date=None, tool_results=None, args=None):
+    """Run the step's tool, or read the answer of a ``finish`` step. Calls go through ``tool_results`` if given,
+    which lets steps with the same action share one call (see ToolResultCache). ``args`` is the Action Input
+    already parsed by the caller, otherwise it is parsed from ``action_input_node``."""
+    if args is None:
         args = action_input_node.value
+        if type(args) == str:
+            # raw newlines in strings (e.g. python_interpreter code) are kept, see parse_action_input
+            args, _ = parse_action_input(args.strip())
     found_answer = False
 
     if action_node.value == "finish":
@@ -570,7 +713,7 @@ def get_observation_step(action_node, action_input_node, historical_date=None):
         tool = tool_map[action_node.value]
         if historical_date:
             args["historical_date"] = historical_date
-        result = tool.call(args)
+        result = tool.call(args) if tool_results is None else tool_results.call(action_node.value, args, tool.call)
         observation_node = ReActStep("Observation", result)
 
     return observation_node, found_answer
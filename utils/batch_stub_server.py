@@ -0,0 +1,230 @@
+"""Local stand-in for the OpenAI Batch and Anthropic Message Batches APIs.
+
+Batches are answered in process by a ``responder`` (by default it echoes the last user message), so
+``--batch_mode`` can be exercised end to end without provider credentials:
+
+    python -m utils.batch_stub_server --port 8765
+    OPENAI_BATCH_API_BASE=http://127.0.0.1:8765/v1 python main.py ... --batch_mode
+"""
+
+import argparse
+import email.parser
+import email.policy
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, list):
+        return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return content or ""
+
+
+def echo_responder(request: Dict[str, Any]) -> Optional[str]:
+    """Answer with the text of the last user message; returning None makes the request fail."""
+    user_messages = [message for message in request.get("messages", []) if message.get("role") == "user"]
+    return _content_text(user_messages[-1]["content"]) if user_messages else ""
+
+
+def _usage(request: Dict[str, Any], text: str) -> Dict[str, int]:
+    prompt = sum(len(_content_text(message.get("content")).split()) for message in request.get("messages", []))
+    return {"prompt_tokens": prompt, "completion_tokens": len(text.split())}
+
+
+class BatchStubServer(ThreadingHTTPServer):
+    """Each batch reports itself as in progress for ``polls_before_done`` status checks, then as finished."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, responder: Callable[[Dict[str, Any]], Optional[str]] = echo_responder, polls_before_done: int = 1):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.responder = responder
+        self.polls_before_done = polls_before_done
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self) -> "BatchStubServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _poll(self, batch: Dict[str, Any]) -> bool:
+        """Count one status check and return whether the batch has finished."""
+        with self.lock:
+            batch["polls"] += 1
+            return batch["polls"] > self.polls_before_done
+
+    def run_openai(self, lines: List[str]) -> Dict[str, Optional[str]]:
+        outputs, errors = [], []
+        for line in lines:
+            row = json.loads(line)
+            text = self.responder(row["body"])
+            if text is None:
+                errors.append({
+                    "id": f"batch_req_{uuid.uuid4().hex}",
+                    "custom_id": row["custom_id"],
+                    "response": {"status_code": 400, "body": {"error": {"message": "rejected by stub"}}},
+                    "error": None,
+                })
+                continue
+            outputs.append({
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": row["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "object": "chat.completion",
+                        "model": row["body"]["model"],
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                        "usage": _usage(row["body"], text),
+                    },
+                },
+                "error": None,
+            })
+        ids = {}
+        for name, rows in [("output_file_id", outputs), ("error_file_id", errors)]:
+            if rows:
+                ids[name] = f"file-{uuid.uuid4().hex}"
+                self.files[ids[name]] = "\n".join(json.dumps(row) for row in rows).encode("utf-8")
+            else:
+                ids[name] = None
+        return ids
+
+    def run_anthropic(self, requests: List[Dict[str, Any]]) -> bytes:
+        rows = []
+        for request in requests:
+            params = request["params"]
+            text = self.responder(params)
+            if text is None:
+                result = {"type": "errored", "error": {"type": "invalid_request_error", "message": "rejected by stub"}}
+            else:
+                usage = _usage(params, text)
+                result = {
+                    "type": "succeeded",
+                    "message": {
+                        "type": "message",
+                        "role": "assistant",
+                        "model": params["model"],
+                        "content": [{"type": "text", "text": text}],
+                        "stop_reason": "end_turn",
+                        "usage": {"input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"]},
+                    },
+                }
+            rows.append({"custom_id": request["custom_id"], "result": result})
+        return "\n".join(json.dumps(row) for row in rows).encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: BatchStubServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, payload: Any, status: int = 200):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream" if isinstance(payload, bytes) else "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        server = self.server
+        if self.path == "/v1/files":
+            header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8")
+            message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + self._body())
+            upload = next(part for part in message.iter_parts() if part.get_param("name", header="content-disposition") == "file")
+            file_id = f"file-{uuid.uuid4().hex}"
+            server.files[file_id] = upload.get_payload(decode=True)
+            self._send({"id": file_id, "object": "file", "bytes": len(server.files[file_id]), "created_at": 0,
+                        "filename": upload.get_filename(), "purpose": "batch", "status": "processed"})
+        elif self.path == "/v1/batches":
+            request = json.loads(self._body())
+            lines = [line for line in server.files[request["input_file_id"]].decode("utf-8").splitlines() if line.strip()]
+            batch = {"id": f"batch_{uuid.uuid4().hex}", "object": "batch", "endpoint": request["endpoint"],
+                     "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                     "created_at": 0, "polls": 0, "result": server.run_openai(lines), "count": len(lines)}
+            server.batches[batch["id"]] = batch
+            self._send(self._openai_batch(batch, done=False))
+        elif self.path.endswith("/cancel"):
+            parts = self.path.strip("/").split("/")
+            batch = server.batches.get(parts[-2])
+            if batch is None:
+                self._send({"error": {"message": f"unknown batch {parts[-2]}"}}, status=404)
+                return
+            batch["cancelled"] = True
+            if parts[1] == "batches":
+                self._send({**self._openai_batch(batch, done=False), "status": "cancelling"})
+            else:
+                self._send({**self._anthropic_batch(batch, done=False), "processing_status": "canceling"})
+        elif self.path == "/v1/messages/batches":
+            requests = json.loads(self._body())["requests"]
+            batch = {"id": f"msgbatch_{uuid.uuid4().hex}", "polls": 0, "results": server.run_anthropic(requests)}
+            server.batches[batch["id"]] = batch
+            self._send(self._anthropic_batch(batch, done=False))
+        else:
+            self._send({"error": {"message": f"unknown path {self.path}"}}, status=404)
+
+    def do_GET(self):
+        server = self.server
+        parts = self.path.strip("/").split("/")
+        if parts[:2] == ["v1", "batches"] and len(parts) == 3 and parts[2] in server.batches:
+            batch = server.batches[parts[2]]
+            self._send(self._openai_batch(batch, server._poll(batch)))
+        elif parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content" and parts[2] in server.files:
+            self._send(server.files[parts[2]])
+        elif parts[:3] == ["v1", "messages", "batches"] and len(parts) >= 4 and parts[3] in server.batches:
+            batch = server.batches[parts[3]]
+            if len(parts) == 5 and parts[4] == "results":
+                self._send(batch["results"])
+            else:
+                self._send(self._anthropic_batch(batch, server._poll(batch)))
+        else:
+            self._send({"error": {"message": f"unknown path {self.path}"}}, status=404)
+
+    @staticmethod
+    def _openai_batch(batch: Dict[str, Any], done: bool) -> Dict[str, Any]:
+        payload = {key: value for key, value in batch.items() if key not in {"polls", "result", "count", "cancelled"}}
+        payload["status"] = "completed" if done else "in_progress"
+        payload["request_counts"] = {"total": batch["count"], "completed": batch["count"] if done else 0, "failed": 0}
+        if done:
+            payload.update(batch["result"])
+        return payload
+
+    def _anthropic_batch(self, batch: Dict[str, Any], done: bool) -> Dict[str, Any]:
+        host = f"http://127.0.0.1:{self.server.server_address[1]}"
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if done else "in_progress",
+            "results_url": f"{host}/v1/messages/batches/{batch['id']}/results" if done else None,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for provider batch APIs")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = BatchStubServer(args.port)
+    print(f"Batch stub server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,101 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+
+class DiskCache:
+    """Thread-safe persistent key/value store backed by a single sqlite file.
+
+    Values are stored as JSON, so anything written must be JSON serializable.
+    The same file can be shared between threads and between processes. If ``max_size_bytes`` is
+    set, least recently used entries are evicted once the stored values grow past it.
+    """
+
+    # how many writes to batch between checks of the total size
+    EVICTION_CHECK_INTERVAL = 64
+
+    def __init__(self, path: str, max_size_bytes: Optional[int] = None):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self._writes_since_check = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, "
+            "value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        serialized = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, serialized, len(serialized), time.time()),
+            )
+            self._conn.commit()
+            self._writes_since_check += 1
+            if self.max_size_bytes is not None and self._writes_since_check >= self.EVICTION_CHECK_INTERVAL:
+                self._writes_since_check = 0
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is under 90% of its size budget."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_size_bytes:
+            return
+        target = int(self.max_size_bytes * 0.9)
+        freed = 0
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM cache ORDER BY accessed ASC"):
+            if total - freed <= target:
+                break
+            evicted.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM cache WHERE key = ?", evicted)
+        self._conn.commit()
+        self.evictions += len(evicted)
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM cache WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
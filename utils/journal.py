@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+from model.response_cache import to_jsonable
+
+
+class RunJournal:
+    """Append-only log of every completed ReAct step and native tool turn in a run, for resuming after a crash.
+
+    Records are JSON lines tagged with their task's prompt. A ``plan`` record starts an attempt. ReAct ``step``
+    records point at their parent step (or at the plan, for the first step), and ``prune`` records mark steps a
+    retry gave up on. Native ``turn`` records hold an assistant message with its tool results. A ``done``
+    record holds the task's finished generation. On restart, ``recover`` returns the latest attempt of an
+    unfinished task so it continues from its last completed step, and ``finished`` returns generations that
+    completed but were not yet saved. Lines are flushed as they are written, so a killed process loses at most
+    the step in progress.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._records: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._next_id = 0
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last line may be cut short by the crash
+                        continue
+                    self._records[record["task"]].append(record)
+                    self._next_id = max(self._next_id, record.get("id", -1) + 1)
+
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+
+    def _write(self, record: Dict[str, Any], with_id: bool = False) -> Optional[int]:
+        with self._lock:
+            if with_id:
+                record["id"] = self._next_id
+                self._next_id += 1
+            self._file.write(json.dumps(record, default=str) + "\n")
+            self._file.flush()
+            return record.get("id")
+
+    def log_plan(self, task: str, mode: str, action_plan: Optional[str]) -> int:
+        """Start a new attempt at ``task`` and return its id."""
+        return self._write({"task": task, "event": "plan", "mode": mode, "action_plan": action_plan}, with_id=True)
+
+    def log_step(self, node):
+        """Log a ReAct step whose parent is journaled and remember the step's id on the node."""
+        parent_id = node.parent.journal_id
+        if parent_id is None:
+            return
+        node.journal_id = self._write({
+            "task": node.mgr.query,
+            "event": "step",
+            "parent": parent_id,
+            "thought": node.thought.value,
+            "action": node.action.value,
+            "action_input": node.action_input.value,
+            "observation": node.observation.value,
+            "answer_found": node.answer_found,
+        }, with_id=True)
+
+    def log_prune(self, node):
+        if node.journal_id is not None:
+            self._write({"task": node.mgr.query, "event": "prune", "node": node.journal_id})
+
+    def log_turn(self, task: str, plan_id: int, offset: int, messages: List[Any]):
+        """Log a native tool turn, which starts ``offset`` messages after the attempt's prompt."""
+        self._write({"task": task, "event": "turn", "plan": plan_id, "offset": offset, "messages": to_jsonable(messages)})
+
+    def log_done(self, task: str, generation: Dict[str, Any]):
+        self._write({"task": task, "event": "done", "generation": generation})
+
+    def finished(self) -> Dict[str, Dict[str, Any]]:
+        """Generations of tasks that completed in an earlier run, by prompt."""
+        done = {}
+        for task, records in self._records.items():
+            for record in records:
+                if record["event"] == "done":
+                    done[task] = record["generation"]
+        return done
+
+    def recover(self, task: str, mode: str) -> Optional[Dict[str, Any]]:
+        """
+        The latest attempt at ``task`` from an earlier run if it was made in ``mode`` ("react" or "native"), or
+        None. Each task is recovered at most once.
+
+        Returns the attempt's ``mode``, ``plan_id`` and ``action_plan``. ReAct attempts also get ``history``: the
+        steps from the first one down to the deepest step that was neither pruned nor an answer, each with its
+        ``journal_id``. Native attempts also get ``messages``: the completed tool turns after the prompt.
+        """
+        records = self._records.pop(task, None)
+        if not records:
+            return None
+        plans = [record for record in records if record["event"] == "plan"]
+        if not plans or any(record["event"] == "done" for record in records):
+            return None
+        plan = plans[-1]
+        if plan["mode"] != mode:
+            return None
+        attempt = {"mode": plan["mode"], "plan_id": plan["id"], "action_plan": plan["action_plan"]}
+
+        if plan["mode"] == "native":
+            messages = []
+            for record in records:
+                if record["event"] == "turn" and record["plan"] == plan["id"]:
+                    # a turn logged again after a failed call replaces everything from its offset on
+                    messages = messages[: record["offset"]] + record["messages"]
+            attempt["messages"] = messages
+            return attempt
+
+        steps = {record["id"]: record for record in records if record["event"] == "step"}
+        pruned = {record["node"] for record in records if record["event"] == "prune"}
+        depths = {plan["id"]: 0}
+        deepest = None
+        # parents are always logged before their children
+        for record in steps.values():
+            if record["parent"] not in depths:
+                continue
+            depths[record["id"]] = depths[record["parent"]] + 1
+            if record["id"] in pruned or record["answer_found"]:
+                continue
+            if deepest is None or depths[record["id"]] > depths[deepest]:
+                deepest = record["id"]
+
+        history = []
+        step_id = deepest
+        while step_id is not None and step_id != plan["id"]:
+            if step_id in pruned:
+                # an ancestor was pruned after this step was logged
+                history = []
+            record = steps[step_id]
+            history.append({
+                "thought": record["thought"],
+                "action": record["action"],
+                "action_input": record["action_input"],
+                "observation": record["observation"],
+                "journal_id": record["id"],
+            })
+            step_id = record["parent"]
+        attempt["history"] = history[::-1]
+        return attempt
+
+    def compact(self, keep: Set[str]):
+        """Rewrite the journal with only the records of the tasks in ``keep``."""
+        with self._lock:
+            for task in list(self._records):
+                if task not in keep:
+                    del self._records[task]
+            self._file.close()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                for records in self._records.values():
+                    for record in records:
+                        f.write(json.dumps(record, default=str) + "\n")
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+_journal: Optional[RunJournal] = None
+_journal_lock = threading.Lock()
+
+
+def configure_journal(path: Optional[str]) -> Optional[RunJournal]:
+    """Open the process-wide journal at ``path``, or disable journaling if ``path`` is None."""
+    global _journal
+    with _journal_lock:
+        if _journal is not None:
+            _journal.close()
+        _journal = RunJournal(path) if path else None
+        return _journal
+
+
+def get_journal() -> Optional[RunJournal]:
+    with _journal_lock:
+        return _journal
@@ -2,7 +2,7 @@ import json
 import os
 import uuid
 import warnings
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 # Load environment variables from a local .env file if present
 try:
@@ -58,6 +58,22 @@ def auth_litellm():
 
     return litellm_key, api_base
 
+def get_litellm_endpoints() -> List[Tuple[str, Optional[str]]]:
+    """Read a pool of LiteLLM proxies from LITE_LLM_API_BASES (comma separated).
+
+    LITE_LLM_API_KEYS may give one key per base in the same order, or a single key shared by all;
+    without it LITE_LLM_API_KEY is used.
+    """
+    bases = [base.strip() for base in (get_from_env("LITE_LLM_API_BASES") or "").split(",") if base.strip()]
+    keys = [key.strip() for key in (get_from_env("LITE_LLM_API_KEYS") or "").split(",") if key.strip()]
+    if not keys:
+        keys = [get_from_env("LITE_LLM_API_KEY")]
+    if len(keys) == 1:
+        keys = keys * len(bases)
+    if len(keys) != len(bases):
+        raise ValueError(f"LITE_LLM_API_KEYS has {len(keys)} keys for {len(bases)} LITE_LLM_API_BASES")
+    return list(zip(bases, keys))
+
 def auth_tools():
     """Populate tool-specific API keys from env/.env.
 